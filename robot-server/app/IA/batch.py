@@ -0,0 +1,305 @@
+# app/IA/batch.py
+"""
+Análisis por lotes de grabaciones (vídeos o carpetas de frames) con los
+mismos analizadores que en vivo.
+
+- Cada fuente se trocea por rango de tiempo (--shard-s) y los trozos se
+  reparten en un pool de procesos (--jobs, por defecto todos los núcleos).
+- Cada proceso construye sus analizadores una sola vez (initializer) y
+  OpenCV va a un hilo: el paralelismo lo dan los procesos. El arranque del
+  pool (spawn + carga de modelos) se mide aparte (`startup_s`): `wall_s` y
+  los fps empiezan con todos los procesos ya listos.
+- Dentro de un trozo, un hilo lector decodifica por delante del análisis
+  con una cola acotada (--prefetch): la memoria no crece con el vídeo.
+- Salida columnar: .npz (siempre) o .parquet (si hay pyarrow). Una fila por
+  frame analizado: fuente, frame, t_s, color, score_<color>, n_faces; las
+  cajas van concatenadas en `face_boxes` con `face_starts` (como las vueltas
+  de `lidar --record`).
+
+    python -m app.IA.batch patrulla/*.mp4 frames_dir/ --out res.npz --kinds color,face
+    python -m app.IA.batch clip.mp4 --hsv hsv.json --roi 100,80,120,90 --step 3 --json
+"""
+import argparse, json, os, queue, sys, threading, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import pyarrow as pa, pyarrow.parquet as pq
+    _PARQUET_OK = True
+except Exception:
+    _PARQUET_OK = False
+
+IMAGE_EXT = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+KINDS = ("color", "face")
+
+# ---------------- fuentes y trozos ----------------
+def _list_frames(path: str) -> List[str]:
+    return sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_EXT))
+
+def _probe(path: str, dir_fps: float) -> Tuple[str, int, float]:
+    """(tipo, nº de frames, fps). nº = -1 si el contenedor no lo declara."""
+    if os.path.isdir(path):
+        return "dir", len(_list_frames(path)), dir_fps
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"no se puede abrir {path}")
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+    cap.release()
+    return "video", (n if n > 0 else -1), (fps if fps > 0 else dir_fps)
+
+def plan_shards(sources: List[str], shard_s: float, dir_fps: float) -> List[tuple]:
+    """Tareas (src, ruta, tipo, fps, frame_ini, frame_fin); fin = -1 → hasta el final."""
+    tasks = []
+    for si, path in enumerate(sources):
+        kind, n, fps = _probe(path, dir_fps)
+        if n < 0:
+            tasks.append((si, path, kind, fps, 0, -1))     # sin longitud conocida: un solo trozo
+            continue
+        size = max(1, int(round(shard_s * fps)))
+        for a in range(0, n, size):
+            tasks.append((si, path, kind, fps, a, min(n, a + size)))
+    return tasks
+
+def _reader(task: tuple, step: int, q: "queue.Queue", stop: threading.Event, stats: dict) -> None:
+    """Decodifica [ini, fin) y encola (índice, frame); None marca el final."""
+    _, path, kind, _, a, b = task
+    t0 = time.perf_counter()
+    try:
+        if kind == "dir":
+            for i, f in enumerate(_list_frames(path)[a:b], a):
+                if stop.is_set():
+                    break
+                if i % step == 0:
+                    frame = cv2.imread(f, cv2.IMREAD_COLOR)
+                    if frame is not None:
+                        q.put((i, frame))
+            return
+        cap = cv2.VideoCapture(path)
+        try:
+            if a:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, a)
+            i = a
+            while (b < 0 or i < b) and not stop.is_set():
+                # los frames saltados por --step solo se demultiplexan (grab), no se decodifican
+                if i % step == 0:
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                    q.put((i, frame))
+                elif not cap.grab():
+                    break
+                i += 1
+        finally:
+            cap.release()
+    finally:
+        stats["decode_s"] = time.perf_counter() - t0
+        q.put(None)
+
+# ---------------- worker (un proceso del pool) ----------------
+_ANALYZERS: Dict[str, object] = {}
+_WARM = None          # Barrier compartido: cada proceso atiende exactamente un _warm()
+
+def _init_worker(kinds: Tuple[str, ...], hsv_path: Optional[str], roi: Optional[Tuple[int, int, int, int]],
+                 warm=None) -> None:
+    global _WARM
+    _WARM = warm
+    cv2.setNumThreads(1)
+    for k in kinds:
+        if k == "color":
+            from .color_recognition import ColorRecognizer, load_hsv_config
+            ranges = load_hsv_config(hsv_path) if hsv_path else None
+            _ANALYZERS[k] = ColorRecognizer(hsv_ranges=ranges, roi=roi)
+        elif k == "face":
+            from .face_recognition import FaceDetector
+            _ANALYZERS[k] = FaceDetector()
+
+def _warm() -> int:
+    # bloquea hasta que todos los procesos del pool están inicializados
+    if _WARM is not None:
+        _WARM.wait(120)
+    return os.getpid()
+
+def _run_shard(task: tuple, step: int, prefetch: int) -> dict:
+    si, _, _, fps, a, _ = task
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+    rstats: dict = {}
+    rd = threading.Thread(target=_reader, args=(task, step, q, stop, rstats), daemon=True)
+    cpu0, w0 = time.process_time(), time.perf_counter()
+    rd.start()
+    color, face = _ANALYZERS.get("color"), _ANALYZERS.get("face")
+    idx: List[int] = []
+    labels: List[Optional[str]] = []
+    scores: List[Dict[str, int]] = []
+    boxes: List[List[Tuple[int, int, int, int]]] = []
+    analyze_s = {k: 0.0 for k in _ANALYZERS}
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                break
+            i, frame = item
+            idx.append(i)
+            if color is not None:
+                t0 = time.perf_counter()
+                res = color.process_frame(frame)
+                analyze_s["color"] += time.perf_counter() - t0
+                labels.append(res.color)
+                scores.append(res.scores)
+            if face is not None:
+                t0 = time.perf_counter()
+                boxes.append(face.process_frame(frame, draw=False).faces)
+                analyze_s["face"] += time.perf_counter() - t0
+    finally:
+        stop.set()
+        while rd.is_alive():            # desbloquea al lector si quedó esperando sitio en la cola
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                rd.join(0.05)
+    return {"src": si, "start": a, "fps": fps, "frame": idx, "color": labels, "scores": scores,
+            "faces": boxes, "pid": os.getpid(), "wall_s": time.perf_counter() - w0,
+            "cpu_s": time.process_time() - cpu0, "decode_s": rstats.get("decode_s", 0.0),
+            "analyze_s": analyze_s}
+
+# ---------------- salida columnar ----------------
+def to_columns(parts: List[dict], kinds: Tuple[str, ...], colors: List[str]) -> Dict[str, np.ndarray]:
+    parts = sorted(parts, key=lambda p: (p["src"], p["start"]))
+    src = np.concatenate([np.full(len(p["frame"]), p["src"], np.int32) for p in parts] or [np.zeros(0, np.int32)])
+    frame = np.concatenate([np.asarray(p["frame"], np.int64) for p in parts] or [np.zeros(0, np.int64)])
+    fps = np.concatenate([np.full(len(p["frame"]), p["fps"]) for p in parts] or [np.zeros(0)])
+    cols: Dict[str, np.ndarray] = {"source": src, "frame": frame.astype(np.int32),
+                                   "t_s": (frame / np.maximum(fps, 1e-6)).astype(np.float64)}
+    if "color" in kinds:
+        code = {c: i for i, c in enumerate(colors)}
+        cols["color"] = np.array([code.get(c, -1) if c else -1 for p in parts for c in p["color"]], np.int8)
+        for c in colors:
+            cols[f"score_{c}"] = np.array([s.get(c, 0) for p in parts for s in p["scores"]], np.int32)
+    if "face" in kinds:
+        faces = [f for p in parts for f in p["faces"]]
+        counts = np.array([len(f) for f in faces], np.int32)
+        cols["n_faces"] = counts
+        cols["face_starts"] = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64) if len(counts) else np.zeros(0, np.int64)
+        cols["face_boxes"] = np.array([b for f in faces for b in f], np.int32).reshape(-1, 4)
+    return cols
+
+def write_output(path: str, cols: Dict[str, np.ndarray], sources: List[str], colors: List[str]) -> None:
+    if path.endswith(".parquet"):
+        if not _PARQUET_OK:
+            raise SystemExit("salida .parquet requiere pyarrow (o usa .npz)")
+        table = {k: v for k, v in cols.items() if k not in ("face_starts", "face_boxes")}
+        table["source"] = [sources[i] for i in cols["source"]]
+        if "color" in cols:
+            table["color"] = [colors[i] if i >= 0 else None for i in cols["color"]]
+        if "face_boxes" in cols:
+            b, s = cols["face_boxes"].tolist(), cols["face_starts"]
+            table["face_boxes"] = [b[s[i]:s[i] + n] for i, n in enumerate(cols["n_faces"])]
+        pq.write_table(pa.table(table), path)
+        return
+    np.savez_compressed(path, sources=np.array(sources), colors=np.array(colors), **cols)
+
+# ---------------- CLI ----------------
+def _parse_roi(s: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+    if not s:
+        return None
+    x, y, w, h = (int(v) for v in s.split(","))
+    return x, y, w, h
+
+def run(sources: List[str], out: str, kinds: Tuple[str, ...] = ("color",), jobs: int = 0,
+        shard_s: float = 30.0, step: int = 1, prefetch: int = 8, dir_fps: float = 10.0,
+        hsv: Optional[str] = None, roi: Optional[Tuple[int, int, int, int]] = None,
+        progress: bool = True) -> dict:
+    step = max(1, step)
+    tasks = plan_shards(sources, shard_s, dir_fps)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(tasks)))   # sin procesos ociosos
+    colors: List[str] = []
+    if "color" in kinds:
+        from .color_recognition import DEFAULT_HSV_RANGES, load_hsv_config
+        colors = list((load_hsv_config(hsv) if hsv else DEFAULT_HSV_RANGES).keys())
+    parts: List[dict] = []
+    # spawn: igual que los analizadores en vivo (MediaPipe no sobrevive a fork)
+    ctx = get_context("spawn")
+    s0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx, initializer=_init_worker,
+                             initargs=(kinds, hsv, roi, ctx.Barrier(jobs))) as ex:
+        for f in [ex.submit(_warm) for _ in range(jobs)]:
+            f.result()
+        w0 = time.perf_counter()
+        startup = w0 - s0
+        futs = [ex.submit(_run_shard, t, step, prefetch) for t in tasks]
+        for n, f in enumerate(as_completed(futs), 1):
+            parts.append(f.result())
+            if progress:
+                print(f"\r[batch] trozos {n}/{len(tasks)}", end="", file=sys.stderr, flush=True)
+    wall = time.perf_counter() - w0
+    if progress:
+        print(file=sys.stderr)
+    cols = to_columns(parts, kinds, colors)
+    write_output(out, cols, sources, colors)
+    frames = int(len(cols["frame"]))
+    workers: Dict[int, dict] = {}
+    for p in parts:
+        w = workers.setdefault(p["pid"], {"shards": 0, "frames": 0, "cpu_s": 0.0, "decode_s": 0.0,
+                                          **{f"{k}_s": 0.0 for k in kinds}})
+        w["shards"] += 1
+        w["frames"] += len(p["frame"])
+        w["cpu_s"] += p["cpu_s"]
+        w["decode_s"] += p["decode_s"]
+        for k, v in p["analyze_s"].items():
+            w[f"{k}_s"] += v
+    busy = sum(w["cpu_s"] for w in workers.values())
+    return {
+        "out": out, "sources": len(sources), "shards": len(tasks), "jobs": jobs, "frames": frames,
+        "startup_s": round(startup, 3), "wall_s": round(wall, 3), "fps": round(frames / wall, 2) if wall else None,
+        # por núcleo: sobre los procesos lanzados y sobre la CPU realmente consumida
+        "fps_per_core": round(frames / wall / jobs, 2) if wall else None,
+        "fps_per_cpu_s": round(frames / busy, 2) if busy else None,
+        "workers": [{"pid": pid, **{k: round(v, 3) if isinstance(v, float) else v for k, v in w.items()}}
+                    for pid, w in sorted(workers.items())],
+    }
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Analiza vídeos o carpetas de frames en paralelo")
+    ap.add_argument("sources", nargs="+", help="ficheros de vídeo o carpetas con imágenes")
+    ap.add_argument("--out", default="batch.npz", help=".npz o .parquet (requiere pyarrow)")
+    ap.add_argument("--kinds", default="color", help="analizadores, separados por comas: color,face")
+    ap.add_argument("--jobs", type=int, default=0, help="procesos (0 = todos los núcleos)")
+    ap.add_argument("--shard-s", type=float, default=30.0, help="segundos de vídeo por trozo")
+    ap.add_argument("--step", type=int, default=1, help="analiza 1 de cada N frames")
+    ap.add_argument("--prefetch", type=int, default=8, help="frames decodificados por delante (por proceso)")
+    ap.add_argument("--dir-fps", type=float, default=10.0, help="fps supuestos para carpetas de frames")
+    ap.add_argument("--hsv", help="JSON de rangos HSV (formato de save_hsv_config)")
+    ap.add_argument("--roi", help="x,y,w,h para el color (por defecto, el 25%% central)")
+    ap.add_argument("--json", action="store_true", help="informe en JSON por stdout")
+    a = ap.parse_args(argv)
+    kinds = tuple(k.strip() for k in a.kinds.split(",") if k.strip())
+    bad = [k for k in kinds if k not in KINDS]
+    if bad or not kinds:
+        ap.error(f"--kinds: {', '.join(bad) or 'vacío'} (válidos: {', '.join(KINDS)})")
+    if a.out.endswith(".parquet") and not _PARQUET_OK:
+        ap.error("salida .parquet requiere pyarrow (o usa .npz)")
+    for s in a.sources:
+        if not os.path.exists(s):
+            ap.error(f"no existe: {s}")
+    rep = run(a.sources, a.out, kinds, a.jobs, a.shard_s, a.step, a.prefetch, a.dir_fps,
+              a.hsv, _parse_roi(a.roi), progress=not a.json)
+    if a.json:
+        print(json.dumps(rep, indent=2))
+    else:
+        print(f"{rep['frames']} frames en {rep['wall_s']} s con {rep['jobs']} procesos ({rep['shards']} trozos, "
+              f"arranque {rep['startup_s']} s)")
+        print(f"  {rep['fps']} fps total · {rep['fps_per_core']} fps/núcleo · {rep['fps_per_cpu_s']} frames/s de CPU")
+        for w in rep["workers"]:
+            an = " ".join(f"{k}={w[f'{k}_s']}s" for k in kinds)
+            print(f"  pid {w['pid']}: {w['shards']} trozos, {w['frames']} frames, "
+                  f"cpu={w['cpu_s']}s decode={w['decode_s']}s {an}")
+        print(f"  → {rep['out']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -149,6 +149,106 @@ class ColorRecognizer:
 
         return DetectResult(color=best_color, mask=full_mask, frame=frame, scores=scores)
 
+    def color_map(self, frame_bgr: np.ndarray, colors: Optional[List[str]] = None,
+                  max_side: Optional[int] = None) -> "ColorMap":
+        """
+        Máscaras de todos los colores sobre el frame completo (una sola vez) y su
+        imagen integral: luego cualquier ROI o celda se puntúa en O(1).
+        max_side: reduce el frame antes (lado mayor <= max_side) para abaratar la morfología.
+        """
+        h, w = frame_bgr.shape[:2]
+        scale = 1.0
+        if max_side and max(h, w) > max_side:
+            scale = max_side / float(max(h, w))
+            frame_bgr = cv2.resize(frame_bgr, (max(1, int(w * scale)), max(1, int(h * scale))),
+                                   interpolation=cv2.INTER_AREA)
+        hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
+        colors = colors or list(self.hsv_ranges.keys())
+        integrals = {}
+        for color in colors:
+            mask = self._mask_for_color(hsv, color)
+            # 0/255 → 0/1: la integral cuenta píxeles directamente
+            integrals[color] = cv2.integral(cv2.threshold(mask, 0, 1, cv2.THRESH_BINARY)[1], sdepth=cv2.CV_32S)
+        return ColorMap(colors=colors, integrals=integrals, size=(w, h), scale=scale)
+
+# ----------------------------
+# Mapa espacial de color (imágenes integrales)
+# ----------------------------
+@dataclass
+class ColorMap:
+    colors: List[str]
+    integrals: Dict[str, np.ndarray]   # (h'+1, w'+1) int32 por color, sobre el frame (quizá reducido)
+    size: Tuple[int, int]               # (w, h) del frame original: las ROI van en sus píxeles
+    scale: float = 1.0
+
+    def _box(self, roi: Tuple[int,int,int,int]) -> Tuple[int,int,int,int]:
+        ih, iw = next(iter(self.integrals.values())).shape
+        x, y, w, h = roi
+        s = self.scale
+        x0 = min(max(int(round(x * s)), 0), iw - 1)
+        y0 = min(max(int(round(y * s)), 0), ih - 1)
+        x1 = min(max(int(round((x + w) * s)), x0), iw - 1)
+        y1 = min(max(int(round((y + h) * s)), y0), ih - 1)
+        return x0, y0, x1, y1
+
+    def count(self, color: str, roi: Tuple[int,int,int,int]) -> int:
+        """Píxeles del color en la ROI (x, y, w, h), en píxeles del frame original. O(1)."""
+        x0, y0, x1, y1 = self._box(roi)
+        ii = self.integrals[color]
+        n = int(ii[y1, x1]) - int(ii[y0, x1]) - int(ii[y1, x0]) + int(ii[y0, x0])
+        return int(round(n / (self.scale * self.scale)))
+
+    def fraction(self, color: str, roi: Tuple[int,int,int,int]) -> float:
+        x0, y0, x1, y1 = self._box(roi)
+        area = (x1 - x0) * (y1 - y0)
+        if area <= 0:
+            return 0.0
+        ii = self.integrals[color]
+        return (int(ii[y1, x1]) - int(ii[y0, x1]) - int(ii[y1, x0]) + int(ii[y0, x0])) / area
+
+    def scores(self, roi: Tuple[int,int,int,int]) -> Dict[str, int]:
+        """Como DetectResult.scores, para una ROI cualquiera."""
+        return {c: self.count(c, roi) for c in self.colors}
+
+    def query(self, rois: List[Tuple[int,int,int,int]]) -> Dict[str, np.ndarray]:
+        """Fracción de cada color en N ROIs a la vez (vectorizado): {color: array (N,)}."""
+        ih, iw = next(iter(self.integrals.values())).shape
+        r = np.asarray(rois, dtype=np.float64).reshape(-1, 4) * self.scale
+        x0 = np.clip(np.rint(r[:, 0]), 0, iw - 1).astype(np.intp)
+        y0 = np.clip(np.rint(r[:, 1]), 0, ih - 1).astype(np.intp)
+        x1 = np.clip(np.rint(r[:, 0] + r[:, 2]), x0, iw - 1).astype(np.intp)
+        y1 = np.clip(np.rint(r[:, 1] + r[:, 3]), y0, ih - 1).astype(np.intp)
+        area = np.maximum((x1 - x0) * (y1 - y0), 1)
+        out = {}
+        for c in self.colors:
+            ii = self.integrals[c]
+            out[c] = (ii[y1, x1] - ii[y0, x1] - ii[y1, x0] + ii[y0, x0]) / area
+        return out
+
+    def heatmap(self, cols: int = 16, rows: int = 12) -> Dict[str, np.ndarray]:
+        """Fracción (0..1) de cada celda de una rejilla rows x cols cubierta por cada color."""
+        ih, iw = next(iter(self.integrals.values())).shape
+        xs = np.linspace(0, iw - 1, cols + 1).round().astype(np.intp)
+        ys = np.linspace(0, ih - 1, rows + 1).round().astype(np.intp)
+        area = np.maximum(np.outer(np.diff(ys), np.diff(xs)), 1).astype(np.float32)
+        out = {}
+        for c in self.colors:
+            g = self.integrals[c][np.ix_(ys, xs)]            # esquinas de todas las celdas de una vez
+            out[c] = (g[1:, 1:] - g[:-1, 1:] - g[1:, :-1] + g[:-1, :-1]) / area
+        return out
+
+    def summary(self, cols: int = 16, rows: int = 12) -> dict:
+        """Resultado compacto para el bus: % por celda (0..100) y la celda máxima por color."""
+        heat = self.heatmap(cols, rows)
+        peak = {}
+        for c, m in heat.items():
+            r, k = np.unravel_index(int(np.argmax(m)), m.shape)
+            peak[c] = {"col": int(k), "row": int(r), "pct": round(float(m[r, k]) * 100, 1)}
+        w, h = self.size
+        return {"grid": [cols, rows], "size": [w, h],
+                "heat": {c: np.rint(m * 100).astype(np.uint8).tolist() for c, m in heat.items()},
+                "peak": peak, "scores": self.scores((0, 0, w, h))}
+
 # ----------------------------
 # Helper funcional sencillo
 # ----------------------------
@@ -0,0 +1,181 @@
+# app/IA/workers.py
+"""
+Analizadores en procesos separados. Cada proceso se adjunta al FrameRing,
+procesa el último frame disponible (latest-wins, vista sin copia) y devuelve
+un resultado pequeño (dict) por una multiprocessing.Queue acotada. Un hilo
+del proceso web drena la cola y publica en el Bus como `vision/<kind>`.
+
+Si el análisis dura más que una vuelta del anillo (CAMERA_SHM_SLOTS frames),
+el escritor pisa el slot y el resultado se descarta (overrun, contado en
+`vision_overruns`). Tras VISION_COPY_AFTER overruns seguidos el analizador
+pasa a trabajar sobre una copia del frame (`read_copy`): cuesta una copia por
+análisis, pero un analizador lento sigue publicando.
+"""
+import multiprocessing as mp
+import os, queue, threading, time
+from typing import Dict, Iterable, Optional
+
+from ..core.metrics import Histogram
+
+KINDS = ("color", "face", "heatmap")
+# streams de SensorHistory que se alinean con el instante de captura de cada resultado
+FUSE = ("depth_front_m", "setpoint", "command")
+FUSE_TOL_S = 0.5
+COPY_AFTER = int(os.getenv("VISION_COPY_AFTER", "3"))
+
+def _make_analyzer(kind: str):
+    """Devuelve fn(frame) -> dict; los imports pesados ocurren en el hijo."""
+    if kind == "color":
+        from .color_recognition import ColorRecognizer
+        recog = ColorRecognizer()
+
+        def run(frame):
+            res = recog.process_frame(frame)
+            return {"color": res.color, "scores": res.scores}
+        return run
+    if kind == "heatmap":
+        # vision/heatmap: % de cada color por celda (HEATMAP_GRID, p. ej. 16x12)
+        from .color_recognition import ColorRecognizer
+        recog = ColorRecognizer()
+        cols, rows = (int(v) for v in os.getenv("HEATMAP_GRID", "16x12").lower().split("x"))
+        max_side = int(os.getenv("HEATMAP_MAX_SIDE", "320"))
+
+        def run(frame):
+            return recog.color_map(frame, max_side=max_side).summary(cols, rows)
+        return run
+    if kind == "face":
+        from .face_recognition import FaceDetector
+        det = FaceDetector()
+
+        def run(frame):
+            res = det.process_frame(frame, draw=False)
+            return {"faces": [list(b) for b in res.faces]}
+        return run
+    raise ValueError(f"Analizador desconocido: {kind}")
+
+def analyzer_main(kind: str, ring_name: str, out_q, stop_evt, fps: float = 10.0) -> None:
+    from ..sensors.frame_ring import FrameRing
+
+    ring = FrameRing.attach(ring_name)
+    run = _make_analyzer(kind)
+    period = 1.0 / max(fps, 0.1)
+    seq, overruns, streak, copy = 0, 0, 0, False
+    try:
+        while not stop_evt.is_set():
+            t0 = time.monotonic()
+            ref = ring.read_copy(seq, timeout=0.5) if copy else ring.wait_next(seq, timeout=0.5)
+            if ref is None:
+                continue
+            seq = ref.seq
+            try:
+                data = run(ref.frame)
+            except Exception as e:
+                data = {"error": str(e)}
+            if not copy and not ref.valid():
+                # el escritor pisó el slot durante el análisis: el resultado no vale
+                overruns += 1
+                streak += 1
+                copy = streak >= COPY_AFTER
+                try:
+                    out_q.put_nowait((kind, {"overrun": overruns, "copy": copy}))
+                except queue.Full:
+                    pass
+                if copy:
+                    print(f"[WARN] vision/{kind}: análisis más lento que una vuelta del anillo; "
+                          f"se analiza una copia del frame")
+                continue
+            streak = 0
+            data.update(seq=ref.seq, ts=ref.ts, proc_ms=round((time.monotonic() - t0) * 1000, 2))
+            try:
+                out_q.put_nowait((kind, data))
+            except queue.Full:
+                pass                # el consumidor va atrasado: se pierde este resultado
+            rest = period - (time.monotonic() - t0)
+            if rest > 0:
+                time.sleep(rest)
+    finally:
+        ring.close()
+
+class VisionHub:
+    """Lanza un proceso por analizador y publica sus resultados en el Bus."""
+    def __init__(self, ring_name: str, kinds: Iterable[str], bus=None, fps: float = 10.0):
+        self.ring_name = ring_name
+        self.kinds = [k for k in kinds if k]
+        for k in self.kinds:
+            if k not in KINDS:
+                raise ValueError(f"Analizador desconocido: {k}")
+        self.bus = bus
+        self.history = None             # SensorHistory (inyectado por main)
+        self.fps = fps
+        self._ctx = mp.get_context("spawn")
+        self._q = self._ctx.Queue(maxsize=8 * max(1, len(self.kinds)))
+        self._stop = self._ctx.Event()
+        self._procs = []
+        self._thread: Optional[threading.Thread] = None
+        self._last: Dict[str, dict] = {}
+        self.proc_ms: Dict[str, Histogram] = {k: Histogram() for k in self.kinds}
+        self.overruns: Dict[str, int] = {k: 0 for k in self.kinds}    # resultados descartados por slot pisado
+        self.copying: Dict[str, bool] = {k: False for k in self.kinds}
+        # captura (ts del anillo, monotonic común) → resultado publicado en el bus
+        self.latency_ms = Histogram((5, 10, 20, 33, 50, 66, 100, 150, 200, 300, 500, 1000, 2000))
+
+    def start(self) -> "VisionHub":
+        for k in self.kinds:
+            p = self._ctx.Process(target=analyzer_main, args=(k, self.ring_name, self._q, self._stop, self.fps),
+                                  name=f"hexamind-{k}", daemon=True)
+            p.start()
+            self._procs.append(p)
+        self._thread = threading.Thread(target=self._drain, name="vision-drain", daemon=True)
+        self._thread.start()
+        return self
+
+    def _drain(self):
+        while not self._stop.is_set():
+            try:
+                kind, data = self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if "overrun" in data:
+                self.overruns[kind], self.copying[kind] = data["overrun"], data["copy"]
+                continue
+            if self.history is not None and "ts" in data:
+                self._fuse(kind, data)
+            self._last[kind] = data
+            if "proc_ms" in data:
+                self.proc_ms[kind].observe(data["proc_ms"])
+                self.latency_ms.observe((time.monotonic() - data["ts"]) * 1000.0)
+            if self.bus is not None:
+                self.bus.publish_threadsafe(f"vision/{kind}", data)
+
+    def _fuse(self, kind: str, data: dict) -> None:
+        # profundidad y velocidad en el instante de captura del frame analizado, no las actuales
+        h = self.history
+        h.record(f"vision/{kind}", data, data["ts"])
+        fused = h.fuse(data["ts"], FUSE, tol=FUSE_TOL_S)
+        data["at_capture"] = {n: s.value for n, s in fused.items() if s is not None}
+
+    def last(self, kind: str) -> Optional[dict]:
+        return self._last.get(kind)
+
+    def collect_metrics(self, m) -> None:
+        for k, h in self.proc_ms.items():
+            m.histogram("analyzer", h, "Tiempo de cada analizador", analyzer=k, where="worker")
+            m.counter("vision_overruns", self.overruns[k],
+                      "Resultados descartados porque el escritor pisó el slot durante el análisis", analyzer=k)
+            m.gauge("vision_copy_mode", int(self.copying[k]), "Analizador trabajando sobre copia del frame",
+                    analyzer=k)
+        m.histogram("capture_to_send", self.latency_ms, "Latencia captura → envío", path="vision_bus")
+        m.gauge("vision_workers_alive", sum(p.is_alive() for p in self._procs), "Procesos de análisis vivos")
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self._procs.clear()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
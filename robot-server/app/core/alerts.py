@@ -1,24 +1,290 @@
 # app/core/alerts.py
-import asyncio, time
-from .bus import Bus
-
-async def alerts_loop(bus: Bus):
-    low_fps_since = None
-    while True:
-        tel = await bus.last("telemetry") or {}
-        fps = tel.get("fps", 0)
-        now = time.time()
-
-        if fps < 5:
-            low_fps_since = low_fps_since or now
-            if now - low_fps_since > 3:  # 3s con FPS bajo
-                await bus.publish("alert", {
-                    "code": "LOW_FPS",
-                    "level": "warn",
-                    "message": f"FPS bajo: {fps}",
-                    "ts": now
-                })
+"""
+Motor de reglas de alertas dirigido por eventos.
+
+Cada regla observa un campo de un tópico del Bus y se evalúa solo cuando ese
+tópico se publica (sin bucles de sondeo). Soporta umbral, duración mínima
+(`for_s`), histéresis (`clear`), tasa de cambio (`kind="rate"`, unidades/s) y
+deduplicación: se publica en `alert` únicamente al activar (`state="raise"`)
+y al despejar (`state="clear"`).
+
+Si el campo llega ausente o no numérico, el dato se considera obsoleto: se
+descarta la duración pendiente, las reglas de tasa reinician su referencia y
+una alerta activa se despeja con `stale=true` (sin dato no se puede afirmar
+que la condición siga; p. ej. OBSTACLE_NEAR al perder la profundidad).
+
+Duraciones y tasas usan time.monotonic(); el `ts` publicado es de pared.
+
+Las reglas se cargan de JSON (ALERT_RULES, por defecto config/alerts.json):
+    [{"code": "LOW_FPS", "topic": "telemetry", "field": "fps", "op": "<",
+      "threshold": 5, "clear": 8, "for_s": 3, "level": "warn",
+      "message": "FPS bajo: {value}"}]
+y se validan al cargar (op/kind conocidos, umbrales numéricos, `code` único y
+`clear` del lado de despeje de `threshold`): una configuración mala falla al
+arrancar con un ValueError que nombra la regla. Si aun así una regla lanza al
+evaluarse, se cuenta en `errors` y el motor sigue con las demás.
+"""
+import asyncio, json, os, time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from .bus import Bus, CLOSE
+
+RULES_PATH = os.getenv("ALERT_RULES", os.path.join(os.path.dirname(__file__), "..", "..", "config", "alerts.json"))
+
+_OPS = {
+    "<":  lambda v, t: v < t,
+    "<=": lambda v, t: v <= t,
+    ">":  lambda v, t: v > t,
+    ">=": lambda v, t: v >= t,
+}
+# lado contrario para la histéresis: "<" activa por debajo, despeja por encima
+_CLEAR_OPS = {"<": ">=", "<=": ">", ">": "<=", ">=": "<"}
+
+@dataclass
+class Rule:
+    code: str
+    topic: str
+    field: str                         # clave del payload; admite "a.b" para anidados
+    op: str = "<"
+    threshold: float = 0.0
+    clear: Optional[float] = None      # umbral de despeje (histéresis); None = threshold
+    for_s: float = 0.0                 # la condición debe mantenerse este tiempo
+    kind: str = "threshold"            # "threshold" | "rate"
+    level: str = "warn"
+    message: str = "{code}: {value}"
+
+    def __post_init__(self):
+        if self.op not in _OPS:
+            raise ValueError(f"Regla {self.code}: op inválido {self.op!r} (válidos: {', '.join(_OPS)})")
+        if self.kind not in ("threshold", "rate"):
+            raise ValueError(f"Regla {self.code}: kind inválido {self.kind!r} (threshold | rate)")
+        try:
+            self.threshold = float(self.threshold)
+            self.clear = None if self.clear is None else float(self.clear)
+            self.for_s = float(self.for_s)
+        except (TypeError, ValueError):
+            raise ValueError(f"Regla {self.code}: threshold, clear y for_s deben ser numéricos") from None
+        # "<" activa por debajo de threshold y despeja por encima de clear: clear >= threshold
+        # (al revés para ">"); si no, despejaría con la condición aún activa y oscilaría
+        if self.clear is not None and (self.clear < self.threshold if self.op in ("<", "<=")
+                                       else self.clear > self.threshold):
+            side = ">=" if self.op in ("<", "<=") else "<="
+            raise ValueError(f"Regla {self.code}: con op {self.op!r}, clear ({self.clear}) "
+                             f"debe ser {side} threshold ({self.threshold})")
+        try:
+            self.message.format(code=self.code, value=0.0)
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Regla {self.code}: message inválido ({e!r}); usa {{code}} y {{value}}") from None
+
+@dataclass
+class RuleState:
+    active: bool = False
+    pending_since: Optional[float] = None
+    last_value: Optional[float] = None
+    last_metric: Optional[float] = None   # valor comparado (la tasa en kind="rate")
+    last_input: Any = None
+    last_ts: Optional[float] = None
+    evaluations: int = 0
+    skipped: int = 0
+    raises: int = 0
+    clears: int = 0
+    eval_us_total: float = 0.0
+    errors: int = 0
+    _timer: Any = field(default=None, repr=False)
+
+DEFAULT_RULES = [
+    Rule(code="LOW_FPS", topic="telemetry", field="fps", op="<", threshold=5, clear=8,
+         for_s=3, level="warn", message="FPS bajo: {value}"),
+]
+
+def validate_rules(rules: List[Rule]) -> List[Rule]:
+    """El código identifica el estado de cada regla: no puede repetirse."""
+    seen = set()
+    for r in rules:
+        if r.code in seen:
+            raise ValueError(f"Regla {r.code}: código duplicado")
+        seen.add(r.code)
+    return rules
+
+def load_rules(path: Optional[str] = RULES_PATH) -> List[Rule]:
+    if not path or not os.path.exists(path):
+        return list(DEFAULT_RULES)
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError(f"{path}: se esperaba una lista de reglas")
+    rules = []
+    for i, r in enumerate(data):
+        if not isinstance(r, dict):
+            raise ValueError(f"{path}: la regla #{i} no es un objeto")
+        try:
+            rules.append(Rule(**r))
+        except TypeError as e:            # falta un campo obligatorio o sobra uno desconocido
+            raise ValueError(f"{path}: regla #{i} ({r.get('code', '?')}): {e}") from None
+    return validate_rules(rules)
+
+def _get_field(data: Any, path: str) -> Any:
+    for key in path.split("."):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+class AlertEngine:
+    def __init__(self, bus: Bus, rules: Optional[List[Rule]] = None):
+        self.bus = bus
+        self.rules = validate_rules(list(rules if rules is not None else load_rules()))
+        self.state: Dict[str, RuleState] = {r.code: RuleState() for r in self.rules}
+        self._by_topic: Dict[str, List[Rule]] = {}
+        for r in self.rules:
+            self._by_topic.setdefault(r.topic, []).append(r)
+        self._sub = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._sub = self.bus.subscribe(list(self._by_topic), maxsize=256)
+        try:
+            while True:
+                topic, data = await self._sub.get()
+                if topic == CLOSE:
+                    return
+                for rule in self._by_topic.get(topic, ()):
+                    try:
+                        self.evaluate(rule, data)
+                    except Exception as e:
+                        # una regla rota no debe apagar el resto de alertas
+                        st = self.state[rule.code]
+                        st.errors += 1
+                        if st.errors == 1:
+                            print(f"[WARN] alerta {rule.code}: {type(e).__name__}: {e}")
+        finally:
+            self._sub.close()
+            for st in self.state.values():
+                if st._timer is not None:
+                    st._timer.cancel()
+
+    # ------- evaluación incremental -------
+    def evaluate(self, rule: Rule, data: Any, now: Optional[float] = None) -> None:
+        st = self.state[rule.code]
+        raw = _get_field(data, rule.field)
+        if rule.kind == "threshold" and raw == st.last_input and st.pending_since is None:
+            st.skipped += 1      # valor estable y sin duración pendiente: nada que hacer
+            return
+        t0 = time.perf_counter()
+        now = time.monotonic() if now is None else now
+        st.evaluations += 1
+        st.last_input = raw
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            self._stale(rule, st)
+            st.eval_us_total += (time.perf_counter() - t0) * 1e6
+            return
+        if rule.kind == "rate":
+            prev, prev_ts = st.last_value, st.last_ts
+            st.last_value, st.last_ts = value, now
+            if prev is None or prev_ts is None or now <= prev_ts:
+                return
+            metric = (value - prev) / (now - prev_ts)
+        else:
+            st.last_value, st.last_ts = value, now
+            metric = value
+        st.last_metric = metric
+
+        if not st.active:
+            if _OPS[rule.op](metric, rule.threshold):
+                if rule.for_s <= 0:
+                    self._raise(rule, st, metric)
+                elif st.pending_since is None:
+                    st.pending_since = now
+                    self._arm_timer(rule, st)
+                elif now - st.pending_since >= rule.for_s:
+                    self._raise(rule, st, metric)
+            else:
+                self._cancel_pending(st)
+        else:
+            clear_at = rule.threshold if rule.clear is None else rule.clear
+            if _OPS[_CLEAR_OPS[rule.op]](metric, clear_at):
+                self._clear(rule, st, metric)
+        st.eval_us_total += (time.perf_counter() - t0) * 1e6
+
+    def _arm_timer(self, rule: Rule, st: RuleState) -> None:
+        # si el tópico deja de publicarse con la condición activa, el timer la confirma
+        if self._loop is not None:
+            st._timer = self._loop.call_later(rule.for_s, self._on_timer, rule)
+
+    def _on_timer(self, rule: Rule) -> None:
+        st = self.state[rule.code]
+        st._timer = None
+        if not st.active and st.pending_since is not None:
+            self._raise(rule, st, st.last_metric)
+
+    def _stale(self, rule: Rule, st: RuleState) -> None:
+        self._cancel_pending(st)
+        st.last_value = st.last_ts = st.last_metric = None
+        if st.active:
+            self._clear(rule, st, None, stale=True)
+
+    def _cancel_pending(self, st: RuleState) -> None:
+        st.pending_since = None
+        if st._timer is not None:
+            st._timer.cancel()
+            st._timer = None
+
+    def _emit(self, rule: Rule, state: str, value: Optional[float], stale: bool = False) -> None:
+        shown = value if value is None else round(value, 3)
+        if state == "raise":
+            msg = rule.message.format(code=rule.code, value=shown)
+        elif stale:
+            msg = f"{rule.code} sin dato ({rule.topic}.{rule.field})"
         else:
-            low_fps_since = None
+            msg = f"{rule.code} normalizado: {shown}"
+        self.bus.publish_nowait("alert", {
+            "code": rule.code,
+            "level": rule.level if state == "raise" else "info",
+            "state": state,
+            "message": msg,
+            "value": value,
+            "stale": stale,
+            "ts": time.time(),
+        })
+
+    def _raise(self, rule: Rule, st: RuleState, value) -> None:
+        self._cancel_pending(st)
+        st.active = True
+        st.raises += 1
+        self._emit(rule, "raise", value)
+
+    def _clear(self, rule: Rule, st: RuleState, value, stale: bool = False) -> None:
+        st.active = False
+        st.clears += 1
+        self._emit(rule, "clear", value, stale)
+
+    # ------- introspección -------
+    def active(self) -> List[str]:
+        return [code for code, st in self.state.items() if st.active]
+
+    def stats(self) -> List[dict]:
+        out = []
+        for r in self.rules:
+            st = self.state[r.code]
+            out.append({
+                "rule": asdict(r),
+                "active": st.active,
+                "pending_s": round(time.monotonic() - st.pending_since, 3) if st.pending_since is not None else None,
+                "last_value": st.last_value,
+                "last_metric": st.last_metric,
+                "evaluations": st.evaluations,
+                "skipped": st.skipped,
+                "raises": st.raises,
+                "clears": st.clears,
+                "errors": st.errors,
+                "eval_us_mean": round(st.eval_us_total / st.evaluations, 2) if st.evaluations else 0.0,
+            })
+        return out
 
-        await asyncio.sleep(0.25)
+async def alerts_loop(bus: Bus, engine: Optional[AlertEngine] = None):
+    """Compatibilidad: arranca el motor con las reglas de configuración."""
+    await (engine or AlertEngine(bus)).run()
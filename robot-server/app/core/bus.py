@@ -1,43 +1,203 @@
 # app/core/bus.py
 import asyncio
-from collections import defaultdict
-from typing import Any, Dict, Iterable, Tuple
+from collections import deque
+from fnmatch import fnmatchcase
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+# Políticas de cola por tópico (por suscriptor)
+DROP_OLDEST = "drop_oldest"   # cola acotada; si está llena descarta el más antiguo
+LATEST = "latest"             # solo el último valor pendiente por tópico (coalescing)
+
+CLOSE = "__CLOSE__"
+_PENDING = object()           # marcador en la cola para tópicos LATEST
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """'*' = todo; 'motion/*' = prefijo; otros comodines → fnmatch; si no, exacto."""
+    if pattern == "*" or pattern == topic:
+        return True
+    if pattern.endswith("*") and not any(c in pattern[:-1] for c in "*?["):
+        return topic.startswith(pattern[:-1])
+    if any(c in pattern for c in "*?["):
+        return fnmatchcase(topic, pattern)
+    return False
 
 class Subscriber:
-    def __init__(self, queues: Iterable[asyncio.Queue]):
-        self._queues = list(queues)
+    """
+    Cola propia por suscriptor (fan-out real): cada mensaje publicado llega a
+    todos los suscriptores cuyo patrón coincide. `get()` espera sobre un único
+    asyncio.Event, sin crear tareas por llamada.
+    """
+    def __init__(self, bus: "Bus", patterns: Iterable[str], maxsize: int = 100,
+                 policies: Optional[Dict[str, str]] = None, event: Optional[asyncio.Event] = None):
+        self._bus = bus
+        self.patterns: Tuple[str, ...] = tuple(patterns)
+        self.maxsize = max(1, int(maxsize))
+        self._policies = dict(policies or {})
+        self._policy_cache: Dict[str, str] = {}
+        self._q: Deque[Tuple[str, Any]] = deque()
+        self._latest: Dict[str, Any] = {}
+        self._event = event or asyncio.Event()   # compartible con otras fuentes del consumidor
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
 
-    async def get(self) -> Tuple[str, Any]:
-        tasks = [asyncio.create_task(q.get()) for q in self._queues]
-        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-        for p in pending:
-            p.cancel()
-        topic, data = list(done)[0].result()
+    # ------- lado publicador (lo llama el Bus) -------
+    def matches(self, topic: str) -> bool:
+        return any(topic_matches(p, topic) for p in self.patterns)
+
+    def policy(self, topic: str) -> str:
+        pol = self._policy_cache.get(topic)
+        if pol is None:
+            pol = DROP_OLDEST
+            for pattern, p in self._policies.items():
+                if topic_matches(pattern, topic):
+                    pol = p
+                    break
+            self._policy_cache[topic] = pol
+        return pol
+
+    def _push(self, topic: str, data: Any) -> None:
+        self.received += 1
+        if self.policy(topic) == LATEST:
+            if topic in self._latest:
+                # ya hay uno pendiente: se sobrescribe sin ocupar otra posición
+                self._latest[topic] = data
+                self.dropped += 1
+                c = self._bus.coalesced
+                c[topic] = c.get(topic, 0) + 1
+                return
+            self._latest[topic] = data
+            data = _PENDING
+        if len(self._q) >= self.maxsize:
+            old_topic, old = self._q.popleft()
+            if old is _PENDING:
+                self._latest.pop(old_topic, None)
+            self.dropped += 1
+            d = self._bus.overflow
+            d[old_topic] = d.get(old_topic, 0) + 1
+        self._q.append((topic, data))
+        self._event.set()
+
+    # ------- lado consumidor -------
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def qsize(self) -> int:
+        return len(self._q)
+
+    def get_nowait(self) -> Optional[Tuple[str, Any]]:
+        if not self._q:
+            return None
+        topic, data = self._q.popleft()
+        if data is _PENDING:
+            data = self._latest.pop(topic)
         return topic, data
 
+    async def get(self) -> Tuple[str, Any]:
+        while not self._q:
+            if self._closed:
+                return CLOSE, None
+            self._event.clear()
+            await self._event.wait()
+        return self.get_nowait()
+
     def close(self):
-        for q in self._queues:
-            try:
-                q.put_nowait(("__CLOSE__", None))
-            except Exception:
-                pass
+        if self._closed:
+            return
+        self._closed = True
+        self._bus._unsubscribe(self)
+        self._event.set()
 
 class Bus:
-    def __init__(self, maxsize:int=100):
-        self._topics = defaultdict(lambda: asyncio.Queue(maxsize=maxsize))
-        self._last = {}
-    async def publish(self, topic, data):
+    def __init__(self, maxsize: int = 100):
+        self._maxsize = maxsize
+        self._subs: List[Subscriber] = []
+        self._routes: Dict[str, Tuple[Subscriber, ...]] = {}   # tópico → suscriptores (caché)
+        self._last: Dict[str, Any] = {}
+        self._ver: Dict[str, int] = {}
+        # descartes por tópico (todos los suscriptores): LATEST que pisa un pendiente
+        # (por diseño) y cola DROP_OLDEST llena (consumidor lento)
+        self.coalesced: Dict[str, int] = {}
+        self.overflow: Dict[str, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Loop donde viven los suscriptores (necesario para publish_threadsafe)."""
+        self._loop = loop
+
+    def subscribe(self, topics: Iterable[str], maxsize: Optional[int] = None,
+                  policies: Optional[Dict[str, str]] = None,
+                  event: Optional[asyncio.Event] = None) -> Subscriber:
+        """
+        topics: nombres exactos o patrones ('*', 'motion/*', 'sensor.?').
+        policies: patrón → DROP_OLDEST | LATEST (por defecto DROP_OLDEST).
+        event: evento a señalar en cada entrega (por defecto uno propio).
+        """
+        if isinstance(topics, str):
+            topics = [topics]
+        sub = Subscriber(self, topics, maxsize or self._maxsize, policies, event)
+        self._subs.append(sub)
+        self._routes.clear()
+        return sub
+
+    def _unsubscribe(self, sub: Subscriber) -> None:
+        try:
+            self._subs.remove(sub)
+        except ValueError:
+            return
+        self._routes.clear()
+
+    def _route(self, topic: str) -> Tuple[Subscriber, ...]:
+        subs = self._routes.get(topic)
+        if subs is None:
+            subs = tuple(s for s in self._subs if s.matches(topic))
+            self._routes[topic] = subs
+        return subs
+
+    def publish_nowait(self, topic: str, data: Any) -> int:
+        """Publica sin ceder el loop; devuelve a cuántos suscriptores llegó."""
         self._last[topic] = data
-        q = self._topics[topic]
-        # si la cola está llena, descarta el más antiguo (coalescing tipo drop-oldest)
-        if q.full():
-            try:
-                q.get_nowait()
-            except asyncio.QueueEmpty:
-                pass
-        await q.put((topic, data))
+        self._ver[topic] = self._ver.get(topic, 0) + 1
+        subs = self._route(topic)
+        for s in subs:
+            s._push(topic, data)
+        return len(subs)
+
+    async def publish(self, topic: str, data: Any) -> int:
+        return self.publish_nowait(topic, data)
+
+    def publish_threadsafe(self, topic: str, data: Any) -> None:
+        """Para hilos fuera del loop (captura, LiDAR, control...): agenda la publicación."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self.publish_nowait, topic, data)
+
+    def last(self, topic: str, default: Any = None) -> Any:
+        return self._last.get(topic, default)
+
+    def version(self, topic: str) -> int:
+        """Número de publicaciones del tópico (identifica el valor de `last`)."""
+        return self._ver.get(topic, 0)
+
+    def subscriber_count(self) -> int:
+        return len(self._subs)
+
+    def collect_metrics(self, m) -> None:
+        m.gauge("bus_subscribers", len(self._subs), "Suscriptores del bus")
+        for t, n in list(self._ver.items()):
+            m.counter("bus_published", n, "Publicaciones por tópico", topic=t)
+        for t, n in list(self.coalesced.items()):
+            m.counter("bus_coalesced", n, "Mensajes LATEST pisados antes de entregarse", topic=t)
+        for t, n in list(self.overflow.items()):
+            m.counter("bus_dropped", n, "Mensajes descartados por cola llena (DROP_OLDEST)", topic=t)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._subs), "published": dict(self._ver),
+                "coalesced": dict(self.coalesced), "overflow": dict(self.overflow)}
 
 # Utilidad: “topic cache” seguro con defecto
-async def last_or(bus: Bus, topic: str, default: Any):
-    v = await bus.last(topic)
+def last_or(bus: Bus, topic: str, default: Any):
+    v = bus.last(topic)
     return v if v is not None else default
@@ -0,0 +1,136 @@
+# app/core/history.py
+"""
+Historial de telemetría en memoria: un anillo NumPy por campo numérico
+(almacenamiento columnar, sin dicts por muestra). A 5 Hz, 4 h de historia con
+8 campos ocupan ~3 MB. Las consultas devuelven buckets min/mean/max
+calculados de forma vectorial (reduceat).
+
+Los `ts` son de pared (time.time(), epoch): el historial se consulta desde la
+UI con `since` absoluto y sobrevive a la lectura entre reinicios. A diferencia
+de SensorHistory y del anillo de frames (time.monotonic), no sirve para
+alinear con ellos sin convertir; un ajuste del reloj del sistema puede dejar
+muestras fuera de orden.
+"""
+import asyncio, math, os, time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+DEFAULT_FIELDS = ("fps", "depth_min_m", "motion_x", "motion_y", "motion_z", "motion_speed",
+                  "loop_lag_ms")
+MAX_BUCKETS = 2000
+
+class TelemetryHistory:
+    def __init__(self, fields: Iterable[str] = DEFAULT_FIELDS, capacity: int = 72000):
+        self.fields: List[str] = list(fields)
+        self.capacity = int(capacity)
+        self._ts = np.zeros(self.capacity, dtype=np.float64)
+        self._cols: Dict[str, np.ndarray] = {
+            f: np.full(self.capacity, np.nan, dtype=np.float32) for f in self.fields
+        }
+        self._head = 0        # próxima posición a escribir
+        self._count = 0
+
+    @classmethod
+    def from_env(cls) -> "TelemetryHistory":
+        seconds = float(os.getenv("TELEMETRY_HISTORY_S", "14400"))
+        hz = float(os.getenv("TELEMETRY_HISTORY_HZ", "5"))
+        return cls(capacity=max(1, int(seconds * hz)))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def nbytes(self) -> int:
+        return self._ts.nbytes + sum(c.nbytes for c in self._cols.values())
+
+    def record(self, values: Dict[str, Optional[float]], ts: Optional[float] = None) -> None:
+        """Añade una muestra; los campos ausentes o no numéricos quedan como NaN."""
+        i = self._head
+        self._ts[i] = time.time() if ts is None else ts
+        for f, col in self._cols.items():
+            v = values.get(f)
+            try:
+                col[i] = np.nan if v is None else float(v)
+            except (TypeError, ValueError):
+                col[i] = np.nan
+        self._head = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def _ordered(self, arr: np.ndarray) -> np.ndarray:
+        if self._count < self.capacity:
+            return arr[:self._count]
+        h = self._head
+        return np.concatenate((arr[h:], arr[:h]))
+
+    def query(self, fields: Optional[Iterable[str]] = None, since: Optional[float] = None,
+              step: Optional[float] = None) -> dict:
+        """
+        fields: subconjunto de campos (None = todos).
+        since: epoch (reloj de pared) en segundos; si es <= 0 se interpreta relativo a ahora
+               (-600 = últimos 10 min).
+        step: ancho de bucket en segundos (None = automático); nunca más de MAX_BUCKETS buckets.
+        """
+        fields = [f for f in (fields or self.fields)]
+        unknown = [f for f in fields if f not in self._cols]
+        if unknown:
+            raise KeyError(f"Campos desconocidos: {unknown}")
+        ts = self._ordered(self._ts)
+        start = 0
+        if since is not None:
+            if since <= 0:
+                since = time.time() + since
+            start = int(np.searchsorted(ts, since, side="left"))
+        ts = ts[start:]
+        out = {"step": step, "t": [], "count": [], "fields": {f: {"min": [], "mean": [], "max": []} for f in fields}}
+        if ts.size == 0:
+            return out
+
+        t0 = float(ts[0])
+        span = float(ts[-1]) - t0
+        if not step or step <= 0:
+            step = max(span / (MAX_BUCKETS - 1), 1e-3) if span > 0 else 1.0
+        step = max(step, span / MAX_BUCKETS)
+        out["step"] = step
+
+        # con step = span/MAX_BUCKETS la última muestra caería en el bucket MAX_BUCKETS
+        bucket = np.minimum((ts - t0) // step, MAX_BUCKETS - 1).astype(np.int64)
+        edges = np.flatnonzero(np.diff(bucket)) + 1
+        starts = np.concatenate(([0], edges))
+        counts = np.diff(np.concatenate((starts, [ts.size])))
+        digits = max(0, 1 - math.floor(math.log10(step)))      # 2 cifras significativas del step
+        out["t"] = (t0 + bucket[starts] * step).round(digits).tolist()
+        out["count"] = counts.tolist()
+
+        for f in fields:
+            v = self._ordered(self._cols[f])[start:]
+            valid = ~np.isnan(v)
+            n = np.add.reduceat(valid.astype(np.int32), starts)
+            s = np.add.reduceat(np.where(valid, v, 0.0).astype(np.float64), starts)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = s / n
+            vmin = np.fmin.reduceat(v, starts)
+            vmax = np.fmax.reduceat(v, starts)
+            out["fields"][f] = {
+                "min": _to_list(vmin), "mean": _to_list(mean), "max": _to_list(vmax),
+            }
+        return out
+
+def _to_list(a: np.ndarray) -> list:
+    # NaN → None para que sea JSON válido
+    return [None if math.isnan(x) else round(x, 4) for x in a.tolist()]
+
+async def history_loop(history: TelemetryHistory, sample: Callable[[], Dict[str, Optional[float]]],
+                       hz: float = 5.0):
+    """Muestrea a ritmo fijo; `loop_lag_ms` es el retraso del propio tick (salud del event loop)."""
+    period = 1.0 / max(hz, 0.1)
+    next_t = time.monotonic()
+    while True:
+        next_t += period
+        await asyncio.sleep(max(0.0, next_t - time.monotonic()))
+        lag = time.monotonic() - next_t
+        if lag > period:
+            next_t = time.monotonic()     # no intentes recuperar ticks perdidos
+        values = sample()
+        values["loop_lag_ms"] = lag * 1000.0
+        history.record(values)
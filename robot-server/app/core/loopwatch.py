@@ -0,0 +1,173 @@
+# app/core/loopwatch.py
+"""
+Vigilante del event loop.
+
+- Un latido asyncio cada LOOP_WATCH_PERIOD_MS mide el retraso de
+  planificación (lag) en un histograma.
+- Un hilo auxiliar comprueba el latido; si el loop lleva más de
+  LOOP_WATCH_THRESHOLD_MS sin latir, captura la pila del hilo del loop en
+  ese momento (mientras la llamada bloqueante sigue en curso) y la cuenta
+  como "ofensor" por sitio de llamada.
+- Al recuperarse, el loop publica `alert` (code LOOP_LAG, con percentiles y
+  la pila capturada), con límite de una alerta cada LOOP_WATCH_ALERT_S; el
+  `clear` sale tras un rato sin bloqueos. Todo aparece también en /metrics.
+"""
+import asyncio, os, sys, threading, time
+from collections import Counter as _Counts
+from typing import List, Optional, Tuple
+
+from .metrics import Histogram
+
+LAG_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+STACK_DEPTH = 12
+
+def _short(path: str) -> str:
+    for marker in ("/site-packages/", "/robot-server/"):
+        i = path.rfind(marker)
+        if i >= 0:
+            return path[i + len(marker):]
+    return os.path.basename(path)
+
+def _stack(frame) -> List[Tuple[str, int, str]]:
+    """(fichero, línea, función) de la raíz a la hoja, recortado a STACK_DEPTH."""
+    out = []
+    while frame is not None and len(out) < 64:
+        out.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    out.reverse()
+    return out[-STACK_DEPTH:]
+
+def _site(stack: List[Tuple[str, int, str]]) -> str:
+    """Clave del ofensor: último frame de la app → hoja (donde realmente bloquea)."""
+    if not stack:
+        return "?"
+    fmt = lambda f: f"{_short(f[0])}:{f[1]} {f[2]}"
+    leaf = stack[-1]
+    app = next((f for f in reversed(stack) if "/app/" in f[0]), None)
+    if app is None or app is leaf:
+        return fmt(leaf)
+    return f"{fmt(app)} → {fmt(leaf)}"
+
+class LoopWatchdog:
+    def __init__(self, period_ms: float = 50.0, threshold_ms: float = 100.0,
+                 alert_s: float = 10.0, clear_s: float = 30.0, enabled: bool = True):
+        self.period = max(0.005, period_ms / 1000.0)
+        self.threshold = max(0.01, threshold_ms / 1000.0)
+        self.alert_s = alert_s
+        self.clear_s = clear_s
+        self.enabled = enabled
+        self.bus = None
+        self.lag_ms = Histogram(LAG_BUCKETS)          # escritor: el loop
+        self.stall_ms = Histogram(LAG_BUCKETS)        # duración de cada bloqueo detectado
+        self.stalls = 0
+        self.offenders: _Counts = _Counts()           # sitio → muestras (escritor: hilo vigía)
+        self.last_stack: Optional[List[str]] = None
+        self._beat = 0.0
+        self._loop_ident: Optional[int] = None
+        self._captured = False                        # ya hay pila para el bloqueo en curso
+        self._pending: Optional[dict] = None          # bloqueo a reportar cuando el loop vuelva
+        self._alert_t = 0.0
+        self._active = False
+        self._last_stall_t = 0.0
+        self._suppressed = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "LoopWatchdog":
+        g = os.getenv
+        return cls(period_ms=float(g("LOOP_WATCH_PERIOD_MS", "50")),
+                   threshold_ms=float(g("LOOP_WATCH_THRESHOLD_MS", "100")),
+                   alert_s=float(g("LOOP_WATCH_ALERT_S", "10")),
+                   clear_s=float(g("LOOP_WATCH_CLEAR_S", "30")),
+                   enabled=g("LOOP_WATCH_ENABLED", "1") == "1")
+
+    # ------- latido (event loop) -------
+    async def run(self):
+        if not self.enabled:
+            return
+        self._loop_ident = threading.get_ident()
+        self._beat = time.monotonic()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                expected = self._beat + self.period
+                await asyncio.sleep(self.period)
+                now = time.monotonic()
+                lag = max(0.0, now - expected)
+                self._beat = now
+                self.lag_ms.observe(lag * 1000.0)
+                if lag >= self.threshold:
+                    self._on_stall(lag, now)
+                elif self._active and now - self._last_stall_t >= self.clear_s:
+                    self._active = False
+                    self._publish("clear", f"Event loop normalizado ({self._p(0.99)} ms p99)", None)
+        finally:
+            self._stop.set()
+
+    def _on_stall(self, lag: float, now: float) -> None:
+        self.stalls += 1
+        self.stall_ms.observe(lag * 1000.0)
+        self._last_stall_t = now
+        info, self._pending, self._captured = self._pending, None, False
+        if now - self._alert_t < self.alert_s:
+            self._suppressed += 1
+            return
+        self._alert_t = now
+        self._active = True
+        site = info["site"] if info else "sin pila (bloqueo más corto que el muestreo)"
+        self._publish("raise", f"Event loop bloqueado {lag * 1000:.0f} ms en {site}", lag * 1000.0,
+                      stack=info["stack"] if info else None, site=site)
+
+    def _p(self, q: float) -> Optional[float]:
+        return self.lag_ms.quantile(q)
+
+    def _publish(self, state: str, message: str, value: Optional[float], **extra) -> None:
+        if self.bus is None:
+            return
+        self.bus.publish_nowait("alert", {
+            "code": "LOOP_LAG", "level": "warn" if state == "raise" else "info", "state": state,
+            "message": message, "value": value, "ts": time.time(),
+            "lag_ms": {"p50": self._p(0.5), "p99": self._p(0.99), "max": round(self.lag_ms.max, 1)},
+            "suppressed": self._suppressed, "top": self.top(5), **extra})
+        self._suppressed = 0
+
+    # ------- vigía (hilo propio) -------
+    def _watch(self):
+        # comprobación a 1/4 de umbral: la pila se toma con el bloqueo aún en curso
+        step = self.threshold / 4.0
+        while not self._stop.wait(step):
+            since = time.monotonic() - self._beat
+            if since < self.period + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_ident)
+            if frame is None:
+                continue
+            stack = _stack(frame)
+            del frame
+            site = _site(stack)
+            self.offenders[site] += 1
+            if not self._captured:
+                # primera muestra del bloqueo: la que se reporta en la alerta
+                self._captured = True
+                self.last_stack = [f"{_short(f)}:{ln} {fn}" for f, ln, fn in stack]
+                self._pending = {"site": site, "stack": self.last_stack}
+
+    # ------- introspección -------
+    def top(self, n: int = 10) -> List[dict]:
+        # copia primero: el hilo vigía puede estar añadiendo sitios
+        return [{"site": s, "samples": c} for s, c in self.offenders.copy().most_common(n)]
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "period_ms": self.period * 1000, "threshold_ms": self.threshold * 1000,
+                "stalls": self.stalls, "active": self._active, "lag_ms": self.lag_ms.snapshot(),
+                "stall_ms": self.stall_ms.snapshot(), "top": self.top(), "last_stack": self.last_stack}
+
+    def collect_metrics(self, m) -> None:
+        m.histogram("event_loop_lag", self.lag_ms, "Retraso de planificación del event loop")
+        m.histogram("event_loop_stall", self.stall_ms, "Duración de los bloqueos sobre el umbral")
+        m.counter("event_loop_stalls", self.stalls, "Bloqueos del event loop sobre el umbral")
+        for row in self.top(10):
+            m.counter("event_loop_stall_samples", row["samples"],
+                      "Muestras de pila durante bloqueos, por sitio", site=row["site"])
@@ -0,0 +1,162 @@
+# app/core/metrics.py
+"""
+Instrumentación barata: histogramas de buckets fijos sin locks. Cada
+histograma tiene un único escritor (su hilo/bucle); los lectores solo toman
+instantáneas, así que basta con incrementos de enteros en listas.
+
+Cada subsistema guarda sus propios contadores/histogramas y registra un
+colector en `REGISTRY`; `/metrics` los vuelca en formato de texto de
+Prometheus solo cuando alguien hace scrape.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+# buckets por defecto en milisegundos
+MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: Sequence[float] = MS_BUCKETS):
+        self.bounds = tuple(sorted(bounds))
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)   # último = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximación por límite superior del bucket (o el máximo si cae en +Inf)."""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, object]:
+        cum, acc = {}, 0
+        for b, c in zip(self.bounds, self.counts):
+            acc += c
+            cum[str(b)] = acc
+        cum["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3),
+            "buckets": cum,
+        }
+
+class Counter:
+    """Contador monotónico. Con varios hilos escritores puede perder algún
+    incremento suelto (sin lock a propósito): sirve para tasas, no para contabilidad."""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+# ---------------- exposición Prometheus ----------------
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def _labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, esc)) + "}"
+
+class Exposition:
+    """
+    Acumula muestras en formato de texto de Prometheus (0.0.4), agrupadas por
+    familia aunque los colectores las emitan intercaladas. Los histogramas en
+    ms se exponen en segundos (`<nombre>_seconds`), como manda la convención.
+    """
+    def __init__(self, prefix: str = "hexamind_"):
+        self.prefix = prefix
+        self._fam: Dict[str, list] = {}     # nombre → [tipo, ayuda, líneas]
+
+    def _family(self, name: str, kind: str, help: str) -> list:
+        name = self.prefix + name
+        fam = self._fam.get(name)
+        if fam is None:
+            fam = self._fam[name] = [kind, help, []]
+        return fam[2]
+
+    def counter(self, name: str, value: float, help: str = "", **labels) -> None:
+        if not name.endswith("_total"):
+            name += "_total"
+        self._family(name, "counter", help).append(f"{self.prefix}{name}{_labels(labels)} {_fmt(value)}")
+
+    def gauge(self, name: str, value: Optional[float], help: str = "", **labels) -> None:
+        if value is None:
+            return
+        self._family(name, "gauge", help).append(f"{self.prefix}{name}{_labels(labels)} {_fmt(value)}")
+
+    def histogram(self, name: str, h: Histogram, help: str = "", scale: float = 0.001, **labels) -> None:
+        """`scale` convierte la unidad del histograma (ms por defecto) a la base de Prometheus."""
+        if scale == 0.001 and not name.endswith("_seconds"):
+            name += "_seconds"
+        lines = self._family(name, "histogram", help)
+        full = self.prefix + name
+        counts, count, total = list(h.counts), h.count, h.sum     # copia: el escritor sigue
+        acc = 0
+        for b, c in zip(h.bounds, counts):
+            acc += c
+            lines.append(f"{full}_bucket{_labels({**labels, 'le': _fmt(float(b) * scale)})} {acc}")
+        lines.append(f"{full}_bucket{_labels({**labels, 'le': '+Inf'})} {max(acc + counts[-1], count)}")
+        lines.append(f"{full}_sum{_labels(labels)} {_fmt(total * scale)}")
+        lines.append(f"{full}_count{_labels(labels)} {count}")
+
+    def text(self) -> str:
+        out = []
+        for name, (kind, help, lines) in self._fam.items():
+            if help:
+                out.append(f"# HELP {name} {help}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+class Registry:
+    """
+    Colectores registrados por cada subsistema: fn(Exposition). Se ejecutan
+    solo al hacer scrape; el camino caliente únicamente toca contadores e
+    histogramas propios.
+    """
+    def __init__(self):
+        self._collectors: Dict[str, Callable[[Exposition], None]] = {}
+
+    def register(self, name: str, fn: Callable[[Exposition], None]) -> None:
+        self._collectors[name] = fn
+
+    def unregister(self, name: str) -> None:
+        self._collectors.pop(name, None)
+
+    def render(self) -> str:
+        exp = Exposition()
+        for name, fn in list(self._collectors.items()):
+            try:
+                fn(exp)
+                ok = 1
+            except Exception as e:
+                print(f"[WARN] colector de métricas '{name}':", e)
+                ok = 0
+            exp.gauge("collector_up", ok, "1 si el colector respondió en este scrape", collector=name)
+        return exp.text()
+
+REGISTRY = Registry()
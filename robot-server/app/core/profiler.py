@@ -0,0 +1,224 @@
+# app/core/profiler.py
+"""
+Profiler de muestreo bajo demanda para el servidor en marcha.
+
+Un hilo temporal lee `sys._current_frames()` a `hz` durante los
+segundos pedidos y acumula pilas por hilo (captura, visión, control, LiDAR,
+event loop, workers del threadpool). Fuera de una sesión no existe ningún
+hilo ni hook: el coste en reposo es cero.
+
+Modos:
+- "cpu" (por defecto): solo cuenta la muestra si el reloj de CPU del hilo
+  avanzó desde la anterior (hilos dormidos en sleep/wait/select no suman).
+- "wall": todas las muestras (útil para ver dónde espera cada hilo).
+
+Salidas: pilas colapsadas (`hilo;f1;f2 N`, para flamegraph.pl / speedscope)
+o JSON de speedscope con un perfil por hilo. Solo ve los hilos de este
+proceso; la captura y los analizadores multiproceso tienen su propio PID.
+"""
+import os, re, sys, threading, time
+from collections import Counter as _Counts
+from typing import Dict, List, Optional, Tuple
+
+MAX_SECONDS = 120.0
+MAX_HZ = 1000.0
+MAX_DEPTH = 96
+_STDLIB = re.compile(r"^.*/lib/python\d+\.\d+/")
+
+def _frame_name(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    path = code.co_filename
+    # ruta relativa al paquete o al site-packages: pilas más cortas y legibles
+    for marker in ("/site-packages/", "/robot-server/"):
+        i = path.rfind(marker)
+        if i >= 0:
+            path = path[i + len(marker):]
+            break
+    else:
+        path = _STDLIB.sub("", path)
+    return f"{name} ({path})"
+
+def _thread_cpu(ident: int) -> Optional[float]:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (OSError, AttributeError, OverflowError):
+        return None
+
+def thread_cpu_times() -> Dict[str, dict]:
+    """CPU acumulada por hilo Python vivo (s) y su native_id."""
+    out = {}
+    for t in threading.enumerate():
+        cpu = _thread_cpu(t.ident) if t.ident is not None else None
+        out[f"{t.name}#{t.ident}"] = {"name": t.name, "tid": t.native_id, "cpu_s": cpu}
+    return out
+
+def native_thread_cpu() -> Dict[int, Tuple[str, float]]:
+    """Todos los hilos del proceso (también los nativos de OpenCV/MediaPipe) vía /proc."""
+    out = {}
+    tick = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    try:
+        tids = os.listdir("/proc/self/task")
+    except OSError:
+        return out
+    for tid in tids:
+        try:
+            with open(f"/proc/self/task/{tid}/stat", "rb") as f:
+                raw = f.read().decode(errors="replace")
+        except OSError:
+            continue
+        # "tid (comm) S ..." — comm puede tener espacios: cortar por el último ')'
+        comm = raw[raw.find("(") + 1:raw.rfind(")")]
+        rest = raw[raw.rfind(")") + 2:].split()
+        out[int(tid)] = (comm, (int(rest[11]) + int(rest[12])) / tick)   # utime + stime
+    return out
+
+class SamplingProfiler:
+    """Una sesión a la vez; `run()` bloquea al llamante durante `seconds`."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.sessions = 0
+        self.last: Optional[dict] = None      # resumen de la última sesión
+
+    def run(self, seconds: float = 5.0, hz: float = 100.0, mode: str = "cpu") -> dict:
+        if mode not in ("cpu", "wall"):
+            raise ValueError("mode debe ser 'cpu' o 'wall'")
+        seconds = max(0.1, min(MAX_SECONDS, float(seconds)))
+        hz = max(1.0, min(MAX_HZ, float(hz)))
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("ya hay un perfilado en curso")
+        self.running = True
+        try:
+            result: dict = {}
+            t = threading.Thread(target=self._sample, args=(seconds, hz, mode, result),
+                                 name="profiler", daemon=True)
+            t.start()
+            t.join()
+            self.sessions += 1
+            self.last = {k: v for k, v in result.items() if k != "stacks"}
+            return result
+        finally:
+            self.running = False
+            self._lock.release()
+
+    def _sample(self, seconds: float, hz: float, mode: str, out: dict) -> None:
+        me = threading.get_ident()
+        period = 1.0 / hz
+        stacks: Dict[str, _Counts] = {}       # hilo → pila colapsada → muestras
+        names: Dict[int, str] = {}
+        last_cpu: Dict[int, float] = {}
+        cache: Dict[object, str] = {}         # code → nombre (evita formatear en cada muestra)
+        cpu0 = {k: v["cpu_s"] for k, v in thread_cpu_times().items()}
+        nat0 = native_thread_cpu()
+        p0, w0 = time.process_time(), time.monotonic()
+        samples = taken = 0
+        cost = 0.0
+        deadline = w0 + seconds
+        nxt = w0
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            t0 = time.perf_counter()
+            frames = sys._current_frames()
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                if mode == "cpu":
+                    cpu = _thread_cpu(ident)
+                    prev = last_cpu.get(ident)
+                    last_cpu[ident] = cpu
+                    if cpu is None or prev is None or cpu <= prev:
+                        continue
+                parts: List[str] = []
+                f, depth = frame, 0
+                while f is not None and depth < MAX_DEPTH:
+                    code = f.f_code
+                    n = cache.get(code)
+                    if n is None:
+                        n = cache[code] = _frame_name(code)
+                    parts.append(f"{n}:{f.f_lineno}")
+                    f = f.f_back
+                    depth += 1
+                tname = f"{names.get(ident, 'thread')}#{ident}"
+                parts.reverse()
+                stacks.setdefault(tname, _Counts())[";".join(parts)] += 1
+                taken += 1
+            del frames
+            samples += 1
+            cost += time.perf_counter() - t0
+            nxt += period
+            rest = nxt - time.monotonic()
+            if rest > 0:
+                time.sleep(rest)
+            else:
+                nxt = time.monotonic()        # atrasado: no encadenar muestras seguidas
+        wall = time.monotonic() - w0
+        cpu1 = thread_cpu_times()
+        nat1 = native_thread_cpu()
+        threads = {}
+        for k, v in cpu1.items():
+            a, b = cpu0.get(k), v["cpu_s"]
+            threads[k] = {"name": v["name"], "tid": v["tid"],
+                          "cpu_s": round(b - a, 4) if a is not None and b is not None else None}
+        native = {str(tid): {"comm": comm, "cpu_s": round(cpu - nat0[tid][1], 3)}
+                  for tid, (comm, cpu) in nat1.items() if tid in nat0 and cpu > nat0[tid][1]}
+        out.update({
+            "mode": mode, "hz": hz, "seconds": round(wall, 3), "ticks": samples, "samples": taken,
+            "overhead_pct": round(100.0 * cost / wall, 2) if wall else None,
+            "process_cpu_s": round(time.process_time() - p0, 4),
+            "threads": threads, "native_threads": native, "stacks": stacks,
+        })
+
+# ---------------- formatos ----------------
+def collapsed(result: dict) -> str:
+    """Una línea por pila: `hilo;raíz;...;hoja muestras` (flamegraph.pl, speedscope, inferno)."""
+    lines = []
+    for tname, counts in result["stacks"].items():
+        root = tname.replace(";", ":").replace(" ", "_")
+        for stack, n in counts.most_common():
+            lines.append(f"{root};{stack} {n}")
+    return "\n".join(lines) + "\n"
+
+def speedscope(result: dict, name: str = "hexamind") -> dict:
+    """Formato de fichero de speedscope: un perfil 'sampled' por hilo, frames compartidos."""
+    frames: List[dict] = []
+    index: Dict[str, int] = {}
+    profiles = []
+    weight = 1.0 / result["hz"]
+    for tname, counts in result["stacks"].items():
+        samples, weights = [], []
+        for stack, n in counts.items():
+            ids = []
+            for part in stack.split(";"):
+                i = index.get(part)
+                if i is None:
+                    fn, _, line = part.rpartition(":")
+                    i = index[part] = len(frames)
+                    frames.append({"name": fn, "line": int(line) if line.isdigit() else None})
+                ids.append(i)
+            samples.append(ids)
+            weights.append(n * weight)
+        profiles.append({"type": "sampled", "name": tname, "unit": "seconds", "startValue": 0,
+                         "endValue": round(sum(weights), 6), "samples": samples, "weights": weights})
+    profiles.sort(key=lambda p: -p["endValue"])
+    return {"$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames}, "profiles": profiles, "name": name,
+            "activeProfileIndex": 0, "exporter": "hexamind-profiler"}
+
+def summary(result: dict, top: int = 25) -> dict:
+    """Resumen JSON: CPU por hilo y funciones hoja/inclusivas más muestreadas."""
+    leaf, incl = _Counts(), _Counts()
+    for counts in result["stacks"].values():
+        for stack, n in counts.items():
+            parts = stack.split(";")
+            leaf[parts[-1]] += n
+            for p in set(parts):
+                incl[p] += n
+    total = max(1, result["samples"])
+    pct = lambda c: [{"frame": k, "samples": n, "pct": round(100.0 * n / total, 1)} for k, n in c.most_common(top)]
+    return {**{k: v for k, v in result.items() if k != "stacks"}, "top_self": pct(leaf), "top_inclusive": pct(incl)}
+
+profiler = SamplingProfiler()
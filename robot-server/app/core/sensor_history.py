@@ -0,0 +1,194 @@
+# app/core/sensor_history.py
+"""
+Historia reciente de sensores con reloj común (time.monotonic, el mismo que
+`camera.frame_ts`, el `ts` del anillo de frames y el dead-man del control).
+
+Un anillo acotado por stream ("frame", "depth", "setpoint", "command",
+"telemetry", "vision/<kind>"...). Cada muestra es (t, valor); los arrays se
+guardan por referencia, sin copiar: el productor debe entregar un array nuevo
+por muestra (la cámara ya lo hace) y los consumidores no deben modificarlo.
+
+Consultas por búsqueda binaria sobre los timestamps (O(log n)):
+- at(t):        última muestra con ts <= t (lo que se sabía en el instante t)
+- nearest(t):   la más cercana en el tiempo (opcionalmente con tolerancia)
+- range(t0, t1): todas las de [t0, t1]
+- fuse(t, ...): at/nearest de varios streams a la vez (alinear una detección
+  con la profundidad y la velocidad ordenada en su instante de captura)
+
+La memoria queda acotada por la capacidad de cada anillo: los streams de
+arrays por número de muestras (SENSOR_HISTORY_FRAMES), el resto por
+segundos × frecuencia (SENSOR_HISTORY_S).
+"""
+import bisect, math, os, threading, time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+
+DEFAULT_HZ = 30.0
+
+class Sample(NamedTuple):
+    t: float
+    value: Any
+
+class _Times:
+    """Vista ordenada (de la más antigua a la más nueva) de los ts del anillo, para bisect."""
+    __slots__ = ("ring",)
+
+    def __init__(self, ring: "SensorRing"):
+        self.ring = ring
+
+    def __len__(self) -> int:
+        return self.ring._count
+
+    def __getitem__(self, k: int) -> float:
+        r = self.ring
+        return r._ts[(r._head - r._count + k) % r.capacity]
+
+class SensorRing:
+    """Anillo de (t, valor) con t no decreciente; las muestras fuera de orden se descartan."""
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._ts: List[float] = [0.0] * self.capacity
+        self._vals: List[Any] = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+        self._times = _Times(self)
+        self._lock = threading.Lock()     # varios productores posibles (p. ej. setpoints de WS y HTTP)
+        self.appended = 0
+        self.reordered = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value: Any, t: Optional[float] = None) -> bool:
+        t = time.monotonic() if t is None else float(t)
+        with self._lock:
+            if self._count and t < self._ts[(self._head - 1) % self.capacity]:
+                self.reordered += 1
+                return False
+            i = self._head
+            self._ts[i], self._vals[i] = t, value
+            self._head = (i + 1) % self.capacity
+            if self._count < self.capacity:
+                self._count += 1
+            self.appended += 1
+            return True
+
+    def _get(self, k: int) -> Sample:
+        i = (self._head - self._count + k) % self.capacity
+        return Sample(self._ts[i], self._vals[i])
+
+    def latest(self) -> Optional[Sample]:
+        with self._lock:
+            return self._get(self._count - 1) if self._count else None
+
+    def at(self, t: float) -> Optional[Sample]:
+        with self._lock:
+            k = bisect.bisect_right(self._times, t) - 1
+            return self._get(k) if k >= 0 else None
+
+    def nearest(self, t: float, tol: Optional[float] = None) -> Optional[Sample]:
+        with self._lock:
+            if not self._count:
+                return None
+            k = bisect.bisect_left(self._times, t)
+            if k >= self._count or (k > 0 and t - self._times[k - 1] <= self._times[k] - t):
+                k -= 1
+            s = self._get(k)
+        return s if tol is None or abs(s.t - t) <= tol else None
+
+    def range(self, t0: float, t1: float) -> List[Sample]:
+        with self._lock:
+            a = bisect.bisect_left(self._times, t0)
+            b = bisect.bisect_right(self._times, t1)
+            return [self._get(k) for k in range(a, b)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._count
+            first = self._get(0).t if n else None
+            last = self._get(n - 1).t if n else None
+            vals = [self._get(k).value for k in range(n)]
+        nbytes = sum(v.nbytes for v in vals if isinstance(v, np.ndarray))
+        return {"samples": n, "capacity": self.capacity, "appended": self.appended,
+                "reordered": self.reordered, "span_s": round(last - first, 3) if n else 0.0,
+                "age_s": round(time.monotonic() - last, 3) if n else None, "bytes": nbytes}
+
+class SensorHistory:
+    def __init__(self, seconds: float = 30.0, frames: int = 30, enabled: bool = True):
+        self.seconds = max(0.1, seconds)
+        self.frames = max(0, int(frames))
+        self.enabled = enabled
+        self._streams: Dict[str, SensorRing] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SensorHistory":
+        g = os.getenv
+        return cls(seconds=float(g("SENSOR_HISTORY_S", "30")),
+                   frames=int(g("SENSOR_HISTORY_FRAMES", "30")),
+                   enabled=g("SENSOR_HISTORY_ENABLED", "1") == "1")
+
+    def stream(self, name: str, hz: float = DEFAULT_HZ, capacity: Optional[int] = None) -> SensorRing:
+        """Declara (o devuelve) un stream; sin `capacity` guarda SENSOR_HISTORY_S a `hz`."""
+        r = self._streams.get(name)
+        if r is None:
+            with self._lock:
+                r = self._streams.get(name)
+                if r is None:
+                    cap = capacity if capacity is not None else math.ceil(self.seconds * hz)
+                    r = self._streams[name] = SensorRing(cap)
+        return r
+
+    def array_stream(self, name: str) -> Optional[SensorRing]:
+        """Stream de arrays grandes (frames, profundidad), acotado a SENSOR_HISTORY_FRAMES muestras."""
+        return self.stream(name, capacity=self.frames) if self.frames else None
+
+    def record(self, name: str, value: Any, t: Optional[float] = None) -> None:
+        """Añade a un stream declarado; los no declarados se ignoran (la memoria no crece sola)."""
+        r = self._streams.get(name) if self.enabled else None
+        if r is not None:
+            r.append(value, t)
+
+    def names(self) -> List[str]:
+        return sorted(self._streams)
+
+    def get(self, name: str) -> Optional[SensorRing]:
+        return self._streams.get(name)
+
+    def at(self, name: str, t: float) -> Optional[Sample]:
+        r = self._streams.get(name)
+        return r.at(t) if r is not None else None
+
+    def nearest(self, name: str, t: float, tol: Optional[float] = None) -> Optional[Sample]:
+        r = self._streams.get(name)
+        return r.nearest(t, tol) if r is not None else None
+
+    def range(self, name: str, t0: float, t1: float) -> List[Sample]:
+        r = self._streams.get(name)
+        return r.range(t0, t1) if r is not None else []
+
+    def fuse(self, t: float, names: Optional[Iterable[str]] = None, mode: str = "at",
+             tol: Optional[float] = None) -> Dict[str, Optional[Sample]]:
+        """Muestra de cada stream en el instante t ("at": causal; "nearest": la más cercana)."""
+        if mode not in ("at", "nearest"):
+            raise ValueError("mode debe ser 'at' o 'nearest'")
+        out: Dict[str, Optional[Sample]] = {}
+        for n in (names if names is not None else self.names()):
+            s = self.at(n, t) if mode == "at" else self.nearest(n, t, tol)
+            if s is not None and mode == "at" and tol is not None and t - s.t > tol:
+                s = None                  # demasiado vieja para contar como "en ese instante"
+            out[n] = s
+        return out
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "seconds": self.seconds, "frames": self.frames,
+                "streams": {n: self._streams[n].stats() for n in self.names()}}
+
+    def collect_metrics(self, m) -> None:
+        for n, st in self.stats()["streams"].items():
+            m.gauge("sensor_history_samples", st["samples"], "Muestras retenidas por stream", stream=n)
+            m.gauge("sensor_history_bytes", st["bytes"], "Bytes de arrays retenidos por stream", stream=n)
+            m.counter("sensor_history_appended", st["appended"], "Muestras añadidas por stream", stream=n)
+            m.counter("sensor_history_reordered", st["reordered"],
+                      "Muestras descartadas por timestamp anterior al último", stream=n)
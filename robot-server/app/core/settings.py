@@ -8,4 +8,9 @@ load_dotenv(ENV_PATH)
 JETSON = os.getenv("JETSON", "0") == "1"
 CAM_INDEX = int(os.getenv("CAM_INDEX", "0"))
 HTTP_PORT = int(os.getenv("HTTP_PORT", "8000"))
-WS_RATE_HZ = float(os.getenv("WS_RATE_HZ", "10"))
\ No newline at end of file
+WS_RATE_HZ = float(os.getenv("WS_RATE_HZ", "10"))
+
+# Captura y visión multiproceso (ver sensors/capture_proc.py, IA/workers.py)
+CAMERA_SHM = os.getenv("CAMERA_SHM", "0") == "1"
+VISION_WORKERS = [k.strip() for k in os.getenv("VISION_WORKERS", "").split(",") if k.strip()]
+VISION_FPS = float(os.getenv("VISION_FPS", "10"))
@@ -1,38 +1,114 @@
 # app/main.py
 from contextlib import asynccontextmanager
-import asyncio, time
+import asyncio, os, time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .core.bus import Bus
-from .core.settings import HTTP_PORT
-from .core.alerts import alerts_loop
+from .core.settings import HTTP_PORT, CAMERA_SHM, VISION_WORKERS, VISION_FPS
+from .core.alerts import AlertEngine
+from .core.history import TelemetryHistory, history_loop
+from .core.sensor_history import SensorHistory
+from .core.metrics import REGISTRY
+from .core.loopwatch import LoopWatchdog
 from .sensors.camera import camera, get_telemetry_snapshot  
 from .web.routes_stream import router as stream_router
 from .web.routes_status import router as status_router
 from .web.routes_control import router as control_router
+from .web.routes_motion import router as motion_router
+from .web.routes_admin import router as admin_router
 from .web import ws as ws_module
 from .motion.controller_vel import MotionControllerVel
+from .motion.reflex import ObstacleReflex
+from .sensors.capture_proc import CaptureProcess
+from .sensors.lidar import lidar
+from .sensors.lidar_map import lidar_map
+from .IA.workers import VisionHub
+from .streaming import MJPEG
 
 bus = Bus()
 t0 = time.time()
 _bg_tasks: list[asyncio.Task] = []
+_procs: dict = {}
 
-async def telemetry_loop():
+async def telemetry_loop(period: float = 0.2, heartbeat_s: float = 1.0, sensors: SensorHistory = None):
+    # Publica solo si algo cambió (ignorando `ts`), con latido para los clientes
+    last_key = None
+    last_pub = 0.0
     while True:
-        await bus.publish("telemetry", get_telemetry_snapshot())
-        await asyncio.sleep(0.2)
+        tel = get_telemetry_snapshot()
+        key = tuple((k, str(v)) for k, v in tel.items() if k != "ts")
+        now = time.monotonic()
+        if sensors is not None:
+            sensors.record("telemetry", tel, now)
+        if key != last_key or (now - last_pub) >= heartbeat_s:
+            await bus.publish("telemetry", tel)
+            last_key, last_pub = key, now
+        await asyncio.sleep(period)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    
+    bus.bind_loop(asyncio.get_running_loop())
+
+    # historia por stream con reloj monotonic común (alineación temporal entre sensores)
+    sensors = SensorHistory.from_env()
+    sensors.array_stream("frame")
+    sensors.array_stream("depth")
+    sensors.stream("depth_front_m", hz=camera.fps)
+    sensors.stream("setpoint", hz=ws_module.IN_HZ)
+    sensors.stream("command", hz=15.0)
+    sensors.stream("telemetry", hz=5.0)
+    for k in VISION_WORKERS:
+        sensors.stream(f"vision/{k}", hz=VISION_FPS)
+    camera.history = sensors
+
     motion_controller = MotionControllerVel(hz=15.0, deadman_s=0.8)
+    motion_controller.bus = bus         # progreso de planes → motion/plan
+    reflex = ObstacleReflex.from_env()  # veto/escala de setpoints hacia obstáculos, por tick
+    reflex.bus = bus
+    motion_controller.reflex = reflex
+    motion_controller.history = sensors
+    camera.on_depth(reflex.feed_depth)
     motion_controller.start(asyncio.get_event_loop())
     
     ws_module.BUS = bus
-    from .web import routes_status, routes_control
+    ws_module._controller = motion_controller
+    from .web import routes_status, routes_control, routes_motion
+    routes_motion._controller = motion_controller
     routes_status.BUS = bus
     routes_control.BUS = bus
+    alerts = AlertEngine(bus)
+    routes_status.ALERTS = alerts
+    history = TelemetryHistory.from_env()
+    routes_status.HISTORY = history
+    loopwatch = LoopWatchdog.from_env()     # lag del loop + pila de quien lo bloquea
+    loopwatch.bus = bus
+    routes_status.LOOPWATCH = loopwatch
+    routes_status.SENSORS = sensors
+
+    def sample_history() -> dict:
+        tel = bus.last("telemetry") or {}
+        sp = motion_controller.snapshot()
+        return {
+            "fps": tel.get("fps"),
+            "depth_min_m": tel.get("depth_min_m"),
+            "motion_x": sp["x"], "motion_y": sp["y"], "motion_z": sp["z"],
+            "motion_speed": sp["speed"],
+        }
+
+    # Captura/visión en procesos aparte (CAMERA_SHM=1). El primer worker que
+    # crea el anillo lanza la captura y los analizadores; el resto solo lee.
+    if CAMERA_SHM:
+        try:
+            cap = CaptureProcess().start()
+            _procs["capture"] = cap
+            print(f"[INFO] Anillo de frames '{cap.name}' (owner={cap.owner})")
+            if cap.owner and VISION_WORKERS:
+                hub = VisionHub(cap.name, VISION_WORKERS, bus=bus, fps=VISION_FPS)
+                hub.history = sensors
+                _procs["vision"] = hub.start()
+        except Exception as e:
+            print("[WARN] No se pudo iniciar la captura multiproceso:", e)
 
     # Abrir cámara
     try:
@@ -40,11 +116,38 @@ async def lifespan(app: FastAPI):
         print("[INFO] Cámara abierta")
     except Exception as e:
         print("[WARN] No se pudo abrir la cámara:", e)
+    # profundidad → reflejo a ritmo de cámara aunque no haya visores (Astra o CAMERA_SHM=1)
+    camera.start_depth_poll()
+
+    # LiDAR en su propio hilo (LIDAR_BACKEND=none lo deja apagado)
+    lidar.bus = bus
+    lidar_map.bus = bus
+    lidar.on_scan(reflex.feed_lidar)    # primero el reflejo (latencia), luego el mapa
+    lidar.on_scan(lidar_map.update)     # mapa de ocupación en el mismo hilo
+    lidar.start()
+
+    # /metrics: cada subsistema vuelca sus contadores/histogramas al hacer scrape
+    REGISTRY.register("process", lambda m: m.gauge("uptime_seconds", round(time.time() - t0, 1),
+                                                   "Segundos desde el arranque"))
+    REGISTRY.register("camera", camera.collect_metrics)
+    REGISTRY.register("mjpeg", MJPEG.collect_metrics)
+    REGISTRY.register("bus", bus.collect_metrics)
+    REGISTRY.register("ws", ws_module.collect_metrics)
+    REGISTRY.register("motion", motion_controller.collect_metrics)
+    REGISTRY.register("loop", loopwatch.collect_metrics)
+    REGISTRY.register("sensor_history", sensors.collect_metrics)
+    if lidar.enabled:
+        REGISTRY.register("lidar", lidar.collect_metrics)
+        REGISTRY.register("lidar_map", lidar_map.collect_metrics)
+    if "vision" in _procs:
+        REGISTRY.register("vision", _procs["vision"].collect_metrics)
 
     # Tareas de fondo
-    _bg_tasks.append(asyncio.create_task(telemetry_loop()))
-    _bg_tasks.append(asyncio.create_task(alerts_loop(bus)))
-    # (futuro) _bg_tasks.append(asyncio.create_task(lidar_loop(bus, driver)))
+    _bg_tasks.append(asyncio.create_task(telemetry_loop(sensors=sensors)))
+    _bg_tasks.append(asyncio.create_task(alerts.run()))
+    _bg_tasks.append(asyncio.create_task(loopwatch.run()))
+    _bg_tasks.append(asyncio.create_task(history_loop(history, sample_history,
+                                                      float(os.getenv("TELEMETRY_HISTORY_HZ", "5")))))
     # (futuro) _bg_tasks.append(asyncio.create_task(gps_loop(bus)))
 
     yield
@@ -52,10 +155,19 @@ async def lifespan(app: FastAPI):
     # Shutdown ordenado
     for t in _bg_tasks:
         t.cancel()
+    motion_controller.stop_loop()
+    camera.history = None
+    lidar.stop()
+    camera.stop_depth_poll()
     try:
         camera.release()
     except Exception:
         pass
+    REGISTRY.unregister("vision")
+    for name in ("vision", "capture"):
+        p = _procs.pop(name, None)
+        if p is not None:
+            p.stop()
 
 app = FastAPI(title="HexaMind Robot Server (Phase 1)", lifespan=lifespan)
 
@@ -70,4 +182,6 @@ app.add_middleware(
 app.include_router(status_router, prefix="", tags=["status"])
 app.include_router(stream_router, prefix="", tags=["stream"])
 app.include_router(control_router, prefix="/control", tags=["control"])
+app.include_router(motion_router)
+app.include_router(admin_router)
 app.mount("/ws", ws_module.ws_app)
@@ -2,31 +2,89 @@
 import asyncio, time, threading
 from dataclasses import dataclass
 from typing import Optional
-from MutoLib import Muto
+
+from ..core.metrics import Histogram
+from .drivers import MotionDriver, make_driver
+from .plan import MotionPlan
+from .reflex import ObstacleReflex
 
 @dataclass
 class VelSP:
-    x:int=0; y:int=0; z:int=0           
-    speed:int=2                     
+    x:int=0; y:int=0; z:int=0
+    speed:int=2
     ts:float=time.time()
     gen:int=0
+    t_mono:float=0.0                    # reloj del dead-man (monotonic)
 
 class MotionControllerVel:
-    def __init__(self, hz:float=15.0, deadman_s:float=0.8):
-        self.bot = Muto() 
+    """
+    Bucle de control en un hilo propio: las escrituras serie de MutoLib
+    (bloqueantes) nunca paran el event loop. El API solo deja el último
+    setpoint (latest-wins) bajo un lock; el hilo lo aplica con deadlines
+    absolutos sobre time.monotonic(), así el periodo no deriva con el tiempo
+    de escritura.
+
+    Un MotionPlan (run_plan) se muestrea en cada tick y sustituye al setpoint
+    manual; cualquier set_vel/stop lo interrumpe. El progreso sale por el bus
+    en `motion/plan` si hay uno inyectado (`self.bus`).
+
+    Con `self.reflex` (ObstacleReflex) cada move() pasa antes por el reflejo de
+    obstáculos, en el mismo tick en que se aplica.
+    """
+    PLAN_PUB_S = 0.2    # cadencia máxima de progreso en el bus (además de cambios de segmento)
+
+    def __init__(self, hz:float=15.0, deadman_s:float=0.8, driver:Optional[MotionDriver]=None):
+        self.bot = driver or make_driver()   # MOTION_BACKEND=muto|sim
         self.sp = VelSP()
         self._lock = threading.Lock()
         self._hz = hz
         self._deadman = deadman_s
-        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_evt = threading.Event()
         self._running = False
+        self.bus = None                     # inyectado por main (publish_threadsafe)
+        self.reflex: Optional[ObstacleReflex] = None
+        self.history = None                 # SensorHistory: "setpoint" (API) y "command" (lo enviado)
+
+        # plan temporizado en curso (protegido por _lock)
+        self._plan: Optional[MotionPlan] = None
+        self._plan_t0: Optional[float] = None
+        self._plan_seg = -1
+        self._plan_pub = 0.0
+        self._plan_status: Optional[dict] = None
+
+        # estado de lo último enviado (supresión de comandos redundantes)
+        self._sent_speed: Optional[int] = None
+        self._halted = False
+        self._actuated_gen = -1
+
+        # métricas del bucle (escritas solo por el hilo de control)
+        self.ticks = 0
+        self.overruns = 0           # ticks que empezaron después de su deadline
+        self.missed = 0             # ticks saltados por ir más de un periodo tarde
+        self.suppressed = 0         # speed()/stay_put() no enviados por redundantes
+        self.write_errors = 0
+        self.jitter_ms = Histogram()    # retraso del inicio del tick respecto al deadline
+        self.period_ms = Histogram((5, 10, 20, 40, 50, 60, 66, 70, 80, 100, 150, 250, 500, 1000))
+        self.write_ms = Histogram()     # duración de las escrituras serie por tick
+        self.actuation_ms = Histogram((5, 10, 20, 40, 60, 80, 100, 150, 200, 500))  # setpoint → move() completado
 
-    def start(self, loop: asyncio.AbstractEventLoop):
-        if self._task and not self._task.done(): return
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        # `loop` se acepta por compatibilidad; el bucle ya no vive en asyncio
+        if self._thread and self._thread.is_alive(): return
         self._running = True
-        self._task = loop.create_task(self._loop())
+        self._stop_evt.clear()
+        self._thread = threading.Thread(target=self._run, name="motion-control", daemon=True)
+        self._thread.start()
 
-    def stop_loop(self): self._running = False
+    def stop_loop(self, timeout: float = 1.0):
+        self._running = False
+        self._stop_evt.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if isinstance(self.bot, MotionDriver):
+            self.bot.close()
 
     # ------- API pública (latest-wins) -------
     def set_vel(self, x:int, y:int, z:int, speed:Optional[int]=None):
@@ -34,37 +92,199 @@ class MotionControllerVel:
         y = max(-30, min(30, int(y)))
         z = max(-30, min(30, int(z)))
         with self._lock:
+            preempted = self._end_plan_locked("preempted")
             self.sp.x, self.sp.y, self.sp.z = x, y, z
             if speed is not None: self.sp.speed = max(1, min(5, int(speed)))
-            self.sp.ts = time.time(); self.sp.gen += 1
+            self.sp.ts = time.time(); self.sp.t_mono = time.monotonic(); self.sp.gen += 1
+            if self.history is not None:
+                self.history.record("setpoint", (x, y, z, self.sp.speed), self.sp.t_mono)
+        if preempted:
+            self._publish_plan(preempted)
         return self.snapshot()
 
     def stop(self):
         return self.set_vel(0,0,0)
 
+    # ------- planes temporizados -------
+    def run_plan(self, plan: MotionPlan) -> dict:
+        """Sustituye cualquier plan en curso; arranca en el próximo tick (t=0)."""
+        with self._lock:
+            replaced = self._end_plan_locked("preempted")
+            self._plan, self._plan_t0, self._plan_seg = plan, None, -1
+            self._plan_status = st = self._plan_state(plan, "pending", 0.0, -1)
+        if replaced:
+            self._publish_plan(replaced)
+        self._publish_plan(st)
+        return st
+
+    def cancel_plan(self) -> Optional[dict]:
+        with self._lock:
+            st = self._end_plan_locked("cancelled")
+            if st:
+                self.sp.x = self.sp.y = self.sp.z = 0
+                self.sp.t_mono = 0.0            # el dead-man emite stay_put en el próximo tick
+        if st:
+            self._publish_plan(st)
+        return st
+
+    def plan_status(self) -> Optional[dict]:
+        with self._lock:
+            return dict(self._plan_status) if self._plan_status else None
+
+    def _plan_state(self, plan: MotionPlan, state: str, t: float, seg: int) -> dict:
+        return {**plan.describe(), "state": state, "segment": seg,
+                "elapsed_ms": round(t * 1000), "progress": round(min(1.0, t / plan.total_s), 3),
+                "cmd": {"x": self.sp.x, "y": self.sp.y, "z": self.sp.z, "speed": self.sp.speed}}
+
+    def _end_plan_locked(self, state: str) -> Optional[dict]:
+        plan = self._plan
+        if plan is None:
+            return None
+        t = 0.0 if self._plan_t0 is None else time.monotonic() - self._plan_t0
+        self._plan = None
+        self._plan_status = self._plan_state(plan, state, t, self._plan_seg)
+        return self._plan_status
+
+    def _publish_plan(self, st: dict):
+        if self.bus is not None:
+            self.bus.publish_threadsafe("motion/plan", dict(st))
+
+    def _step_plan(self, now: float) -> Optional[dict]:
+        """Con _lock tomado: vuelca el plan al setpoint; devuelve estado a publicar."""
+        plan = self._plan
+        if self._plan_t0 is None:
+            self._plan_t0 = now
+        t = now - self._plan_t0
+        cmd = plan.sample(t)
+        if cmd is None:
+            self._plan = None
+            self.sp.x = self.sp.y = self.sp.z = 0
+            self.sp.t_mono = 0.0                # fin: stay_put en este mismo tick
+            self._plan_status = self._plan_state(plan, "done", plan.total_s, self._plan_seg)
+            return self._plan_status
+        x, y, z, speed, seg = cmd
+        self.sp.x, self.sp.y, self.sp.z = x, y, z
+        if speed is not None:
+            self.sp.speed = speed
+        self.sp.ts = time.time(); self.sp.t_mono = now
+        if seg != self._plan_seg or (now - self._plan_pub) >= self.PLAN_PUB_S:
+            self._plan_seg, self._plan_pub = seg, now
+            self._plan_status = self._plan_state(plan, "running", t, seg)
+            return self._plan_status
+        return None
+
     def snapshot(self):
         with self._lock:
             return dict(x=self.sp.x,y=self.sp.y,z=self.sp.z,
                         speed=self.sp.speed, ts=self.sp.ts, gen=self.sp.gen)
 
+    def loop_stats(self) -> dict:
+        return {
+            "hz": self._hz,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "missed": self.missed,
+            "suppressed": self.suppressed,
+            "write_errors": self.write_errors,
+            "halted": self._halted,
+            "plan": self._plan.id if self._plan else None,
+            "jitter_ms": self.jitter_ms.snapshot(),
+            "period_ms": self.period_ms.snapshot(),
+            "write_ms": self.write_ms.snapshot(),
+            "actuation_ms": self.actuation_ms.snapshot(),
+            "reflex": self.reflex.stats() if self.reflex is not None else None,
+        }
+
+    def collect_metrics(self, m) -> None:
+        m.counter("motion_ticks", self.ticks, "Ticks del bucle de control")
+        m.counter("motion_overruns", self.overruns, "Ticks que se pasaron de su periodo")
+        m.counter("motion_missed_ticks", self.missed, "Ticks saltados por atraso")
+        m.counter("motion_write_errors", self.write_errors, "Errores escribiendo al robot")
+        m.gauge("motion_halted", int(bool(self._halted)), "1 si el dead-man detuvo el robot")
+        m.histogram("motion_loop_period", self.period_ms, "Periodo real del bucle de control")
+        m.histogram("motion_loop_jitter", self.jitter_ms, "Retraso del tick respecto a su deadline")
+        m.histogram("motion_write", self.write_ms, "Escrituras al driver por tick")
+        m.histogram("motion_actuation", self.actuation_ms, "Setpoint recibido → move() completado")
+        r = self.reflex
+        if r is not None:
+            m.counter("motion_reflex_vetoed", r.vetoed, "Ticks con alguna componente anulada")
+            m.counter("motion_reflex_scaled", r.scaled, "Ticks con alguna componente escalada")
+            m.counter("motion_reflex_stale_ticks", r.stale_ticks,
+                      "Ticks en movimiento con alguna fuente de distancia caducada")
+            m.histogram("motion_reflex_reaction", r.reaction_ms, "Obstáculo visto → tick que lo aplica")
+
+    def driver_stats(self) -> dict:
+        return self.bot.stats() if isinstance(self.bot, MotionDriver) else {"backend": type(self.bot).__name__}
+
     # ------- Bucle único que aplica el setpoint -------
-    async def _loop(self):
+    def _run(self):
         period = max(1.0/self._hz, 0.02)
+        next_t = time.monotonic()
+        last_start = None
         while self._running:
-            await asyncio.sleep(period)
-            with self._lock:
-                sp = VelSP(**self.sp.__dict__)
-            now = time.time()
-
-            # Dead-man: si no hay “vida”, detén
-            if (now - sp.ts) > self._deadman:
-                try: self.bot.stay_put()
-                except: pass
-                continue
-
-            try:
-                self.bot.speed(sp.speed)      # nivel 1..5 (la lib lo invierte internamente)
-                self.bot.move(sp.x, sp.y, sp.z)  # llamada CONTINUA (requerido por MutoLib)
-            except Exception:
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                if self._stop_evt.wait(delay):
+                    break
+            start = time.monotonic()
+            late = start - next_t
+            if late > 0.001:
+                self.overruns += 1
+            if late > period:
+                # demasiado tarde: no encadenar ticks atrasados, re-sincroniza
+                skipped = int(late // period)
+                self.missed += skipped
+                next_t += skipped * period
+            self.jitter_ms.observe(max(0.0, late) * 1000.0)
+            if last_start is not None:
+                self.period_ms.observe((start - last_start) * 1000.0)
+            last_start = start
+            self.ticks += 1
+            self._tick(start)
+
+    def _tick(self, now: float):
+        plan_st = None
+        with self._lock:
+            if self._plan is not None:
+                plan_st = self._step_plan(now)
+            sp = VelSP(**self.sp.__dict__)
+        if plan_st is not None:
+            self._publish_plan(plan_st)
+
+        t0 = time.perf_counter()
+        try:
+            # Dead-man: si no hay “vida”, detén (una vez; luego no hay nada que reenviar)
+            if (now - sp.t_mono) > self._deadman:
+                if self._halted:
+                    self.suppressed += 1
+                    return
+                self.bot.stay_put()
+                self._halted = True
+                if self.history is not None:
+                    self.history.record("command", (0, 0, 0), now)
+                return
 
-                pass
+            self._halted = False
+            if sp.speed != self._sent_speed:
+                self.bot.speed(sp.speed)      # nivel 1..5 (la lib lo invierte internamente)
+                self._sent_speed = sp.speed
+            else:
+                self.suppressed += 1
+            x, y, z = sp.x, sp.y, sp.z
+            if self.reflex is not None:
+                x, y, z = self.reflex.filter(x, y, z, now)
+            self.bot.move(x, y, z)           # llamada CONTINUA (requerido por MutoLib)
+            if self.history is not None:
+                self.history.record("command", (x, y, z), now)
+            if sp.gen != self._actuated_gen:
+                self._actuated_gen = sp.gen
+                self.actuation_ms.observe((time.monotonic() - sp.t_mono) * 1000.0)
+        except Exception:
+            # estado del robot desconocido: reenviar todo en el próximo tick
+            self.write_errors += 1
+            self._sent_speed = None
+            self._halted = False
+        finally:
+            self.write_ms.observe((time.perf_counter() - t0) * 1000.0)
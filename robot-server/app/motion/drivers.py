@@ -0,0 +1,163 @@
+# app/motion/drivers.py
+"""
+Drivers de movimiento intercambiables para MotionControllerVel.
+
+- "muto": hexápodo real vía MutoLib (se importa solo al elegirlo).
+- "sim":  hexápodo simulado; registra cada llamada con timestamp, modela la
+          latencia serie (fija + jitter + bytes/baudios con la línea ocupada)
+          e integra opcionalmente una odometría simple.
+
+MOTION_BACKEND=muto|sim elige el driver por defecto.
+"""
+import abc, math, os, random, threading, time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+class MotionDriver(abc.ABC):
+    """Interfaz mínima que usa el bucle de control (la misma que MutoLib.Muto)."""
+    name = "base"
+
+    @abc.abstractmethod
+    def speed(self, level: int) -> None: ...
+
+    @abc.abstractmethod
+    def move(self, x: int, y: int, z: int) -> None: ...
+
+    @abc.abstractmethod
+    def stay_put(self) -> None: ...
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class MutoDriver(MotionDriver):
+    name = "muto"
+
+    def __init__(self):
+        from MutoLib import Muto
+        self.bot = Muto()
+
+    def speed(self, level: int) -> None:
+        self.bot.speed(level)
+
+    def move(self, x: int, y: int, z: int) -> None:
+        self.bot.move(x, y, z)
+
+    def stay_put(self) -> None:
+        self.bot.stay_put()
+
+# bytes aproximados por trama del protocolo serie (cabecera + payload + checksum)
+_FRAME_BYTES = {"speed": 8, "move": 12, "stay_put": 8}
+
+class SimDriver(MotionDriver):
+    name = "sim"
+
+    def __init__(self, latency_ms: float = 2.0, jitter_ms: float = 0.5, baud: int = 115200,
+                 max_v: float = 0.15, max_w: float = 1.0, odometry: bool = True,
+                 log_size: int = 10000, seed: Optional[int] = None):
+        self.latency_s = max(0.0, latency_ms) / 1000.0
+        self.jitter_s = max(0.0, jitter_ms) / 1000.0
+        self.baud = max(1, int(baud))
+        self.max_v = max_v            # m/s con |x| = 30 y speed = 5
+        self.max_w = max_w            # rad/s con |z| = 30 y speed = 5
+        self.odometry = odometry
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # registro: (t_monotonic, llamada, args, duración_s)
+        self.calls: Deque[Tuple[float, str, tuple, float]] = deque(maxlen=log_size)
+        self.counts: Dict[str, int] = {"speed": 0, "move": 0, "stay_put": 0}
+        self.busy_s = 0.0
+        self._line_free_at = 0.0
+        self._t0 = time.monotonic()
+        self._level = 2
+        self._vel = (0.0, 0.0, 0.0)
+        self._pose = [0.0, 0.0, 0.0]  # x, y (m), theta (rad)
+        self._pose_t: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "SimDriver":
+        return cls(latency_ms=float(os.getenv("MOTION_SIM_LATENCY_MS", "2.0")),
+                   jitter_ms=float(os.getenv("MOTION_SIM_JITTER_MS", "0.5")),
+                   baud=int(os.getenv("MOTION_SIM_BAUD", "115200")),
+                   odometry=os.getenv("MOTION_SIM_ODOMETRY", "1") == "1")
+
+    # ------- modelo serie -------
+    def _write(self, call: str, args: tuple) -> None:
+        now = time.monotonic()
+        tx = _FRAME_BYTES[call] * 10 / self.baud          # 8N1: 10 bits por byte
+        start = max(now, self._line_free_at)
+        self._line_free_at = start + tx
+        done = self._line_free_at + self.latency_s + self._rng.uniform(0.0, self.jitter_s)
+        rest = done - time.monotonic()
+        if rest > 0:
+            time.sleep(rest)                                # bloquea como MutoLib
+        dur = time.monotonic() - now
+        with self._lock:
+            self.calls.append((now, call, args, dur))
+            self.counts[call] += 1
+            self.busy_s += tx
+
+    # ------- odometría -------
+    def _integrate(self, now: float) -> None:
+        if self._pose_t is not None:
+            dt = now - self._pose_t
+            vx, vy, w = self._vel
+            th = self._pose[2]
+            self._pose[0] += (vx * math.cos(th) - vy * math.sin(th)) * dt
+            self._pose[1] += (vx * math.sin(th) + vy * math.cos(th)) * dt
+            self._pose[2] = (th + w * dt + math.pi) % (2 * math.pi) - math.pi
+        self._pose_t = now
+
+    # ------- interfaz -------
+    def speed(self, level: int) -> None:
+        self._write("speed", (level,))
+        self._level = int(level)
+
+    def move(self, x: int, y: int, z: int) -> None:
+        self._write("move", (x, y, z))
+        if self.odometry:
+            now = time.monotonic()
+            with self._lock:
+                self._integrate(now)
+                k = self._level / 5.0 / 30.0
+                self._vel = (x * k * self.max_v, y * k * self.max_v, -z * k * self.max_w)
+
+    def stay_put(self) -> None:
+        self._write("stay_put", ())
+        if self.odometry:
+            with self._lock:
+                self._integrate(time.monotonic())
+                self._vel = (0.0, 0.0, 0.0)
+
+    def pose(self) -> Tuple[float, float, float]:
+        with self._lock:
+            if self.odometry:
+                self._integrate(time.monotonic())
+            return tuple(self._pose)
+
+    def last_calls(self, n: int = 20) -> list:
+        with self._lock:
+            items = list(self.calls)[-n:]
+        return [{"t": round(t - self._t0, 4), "call": c, "args": list(a), "ms": round(d * 1000, 3)}
+                for t, c, a, d in items]
+
+    def stats(self) -> dict:
+        elapsed = max(1e-9, time.monotonic() - self._t0)
+        x, y, th = self.pose()
+        return {
+            "backend": self.name,
+            "counts": dict(self.counts),
+            "line_utilization": round(self.busy_s / elapsed, 4),
+            "latency_ms": self.latency_s * 1000, "jitter_ms": self.jitter_s * 1000, "baud": self.baud,
+            "pose": {"x": round(x, 4), "y": round(y, 4), "theta": round(th, 4)} if self.odometry else None,
+        }
+
+def make_driver(backend: Optional[str] = None) -> MotionDriver:
+    backend = (backend or os.getenv("MOTION_BACKEND", "muto")).strip().lower()
+    if backend == "sim":
+        return SimDriver.from_env()
+    if backend == "muto":
+        return MutoDriver()
+    raise ValueError(f"MOTION_BACKEND desconocido: {backend}")
@@ -0,0 +1,73 @@
+# app/motion/plan.py
+"""
+Planes de movimiento temporizados: secuencia de segmentos de velocidad con
+rampa lineal de entrada. Se suben una vez y los ejecuta el hilo de control,
+muestreando el plan en cada tick (sin chatter de red ni dependencia del Wi-Fi).
+"""
+import itertools, time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+MAX_SEGMENTS = 64
+MAX_SEGMENT_MS = 60_000
+MAX_PLAN_MS = 600_000
+
+_ids = itertools.count(1)
+
+def _clamp(v: float) -> int:
+    return max(-30, min(30, int(round(v))))
+
+@dataclass
+class Segment:
+    x: int = 0
+    y: int = 0
+    z: int = 0
+    duration_ms: int = 1000
+    ramp_ms: int = 0              # rampa desde el comando anterior (dentro de duration_ms)
+    speed: Optional[int] = None   # None = conserva el nivel vigente
+
+@dataclass
+class MotionPlan:
+    segments: List[Segment]
+    name: str = ""
+    id: int = field(default_factory=lambda: next(_ids))
+    created: float = field(default_factory=time.time)
+
+    def __post_init__(self):
+        if not self.segments:
+            raise ValueError("el plan no tiene segmentos")
+        if len(self.segments) > MAX_SEGMENTS:
+            raise ValueError(f"máximo {MAX_SEGMENTS} segmentos")
+        for s in self.segments:
+            if not 0 < s.duration_ms <= MAX_SEGMENT_MS:
+                raise ValueError(f"duration_ms fuera de rango (1..{MAX_SEGMENT_MS})")
+            s.x, s.y, s.z = _clamp(s.x), _clamp(s.y), _clamp(s.z)
+            s.ramp_ms = max(0, min(int(s.ramp_ms), int(s.duration_ms)))
+            if s.speed is not None:
+                s.speed = max(1, min(5, int(s.speed)))
+        # instantes de inicio de cada segmento (s) para buscar con bisect
+        self._starts = list(itertools.accumulate((s.duration_ms / 1000.0 for s in self.segments), initial=0.0))
+        self.total_s = self._starts[-1]
+        if self.total_s * 1000 > MAX_PLAN_MS:
+            raise ValueError(f"el plan supera {MAX_PLAN_MS} ms")
+        # comando de partida de cada rampa = objetivo del segmento anterior (el primero parte de 0)
+        self._prev = [(0, 0, 0)] + [(s.x, s.y, s.z) for s in self.segments[:-1]]
+
+    def sample(self, t: float) -> Optional[Tuple[int, int, int, Optional[int], int]]:
+        """(x, y, z, speed, índice) a los `t` segundos del inicio; None si ya terminó."""
+        if t >= self.total_s:
+            return None
+        i = max(0, bisect_right(self._starts, t) - 1)
+        s = self.segments[i]
+        dt_ms = (t - self._starts[i]) * 1000.0
+        if s.ramp_ms and dt_ms < s.ramp_ms:
+            a = dt_ms / s.ramp_ms
+            px, py, pz = self._prev[i]
+            return (_clamp(px + (s.x - px) * a), _clamp(py + (s.y - py) * a),
+                    _clamp(pz + (s.z - pz) * a), s.speed, i)
+        return s.x, s.y, s.z, s.speed, i
+
+    def describe(self) -> dict:
+        return {"id": self.id, "name": self.name, "segments": len(self.segments),
+                "total_ms": round(self.total_s * 1000)}
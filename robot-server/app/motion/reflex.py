@@ -0,0 +1,232 @@
+# app/motion/reflex.py
+"""
+Reflejo de obstáculos dentro del bucle de control.
+
+Los sensores (hilo del LiDAR, lector de la cámara Astra) vuelcan su mínimo por
+sector de 45° alrededor del robot (0 = frente, sentido antihorario, igual que
+`lidar/scan`). El hilo de control, en cada tick y antes de escribir al robot,
+escala o anula las componentes del setpoint que van hacia un sector ocupado:
+
+    d <= REFLEX_STOP_M            → componente a 0 (veto)
+    REFLEX_STOP_M < d < SLOW_M    → escala lineal
+    datos con más de REFLEX_STALE_S → se ignoran (el sensor ya no protege); si
+    eso pasa con el robot en movimiento sale `alert` REFLEX_STALE (y despeja
+    cuando el sensor vuelve)
+
+Todo lo caro se precalcula: columnas de profundidad → sector (límites para
+reduceat) y ángulo de LiDAR → sector (tabla de 0.5°). La reacción queda en un
+periodo de control en vez de telemetría a 5 Hz + operador.
+"""
+import math, os, threading, time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from ..core.metrics import Histogram
+
+SECTORS = 8
+_W = 360.0 / SECTORS
+# sectores que bloquean cada sentido de movimiento (x adelante, y del API positivo = derecha)
+_GROUPS = {
+    "fwd":   np.array([7, 0, 1]),
+    "back":  np.array([3, 4, 5]),
+    "right": np.array([5, 6, 7]),
+    "left":  np.array([1, 2, 3]),
+}
+# tabla ángulo (0.5°, [-180, 180)) → sector
+_ANG_BINS = 720
+_ANG_TABLE = ((((np.arange(_ANG_BINS) + 0.5) * 0.5 - 180.0 + _W / 2) // _W).astype(np.intp) % SECTORS)
+
+def _no_data() -> np.ndarray:
+    return np.full(SECTORS, np.inf, np.float32)
+
+class _Source:
+    __slots__ = ("mins", "ts", "updates")
+
+    def __init__(self):
+        self.mins = _no_data()
+        self.ts = 0.0
+        self.updates = 0
+
+class ObstacleReflex:
+    def __init__(self, stop_m: float = 0.30, slow_m: float = 0.60, stale_s: float = 0.5,
+                 hfov_deg: float = 58.0, enabled: bool = True):
+        self.stop_m = stop_m
+        self.slow_m = max(slow_m, stop_m + 1e-3)
+        self.stale_s = stale_s
+        self.hfov = hfov_deg
+        self.enabled = enabled
+        self.bus = None
+        self._src: Dict[str, _Source] = {"depth": _Source(), "lidar": _Source()}
+        self._lock = threading.Lock()                 # solo para el inicio de bloqueo
+        self._onset: Dict[str, Optional[float]] = {k: None for k in _GROUPS}
+        self._blocked = {k: False for k in _GROUPS}
+        self._depth_tab: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._active: Dict[str, float] = {}           # sentido → factor aplicado en el último tick
+        self._since: Dict[str, Optional[float]] = {k: None for k in _GROUPS}   # desde cuándo se ordena ir hacia k
+        self._stale: tuple = ()                       # fuentes caducadas en el último tick con movimiento
+        self.stale_ticks = 0
+        # métricas (escritas por el hilo de control)
+        self.scaled = 0
+        self.vetoed = 0
+        self.reaction_ms = Histogram()                # bloqueo visto (yendo hacia él) → tick que lo aplica
+        self.age_ms = Histogram((5, 10, 20, 40, 60, 80, 100, 150, 250, 500))  # edad del dato al decidir
+
+    @classmethod
+    def from_env(cls) -> "ObstacleReflex":
+        g = os.getenv
+        return cls(stop_m=float(g("REFLEX_STOP_M", "0.30")), slow_m=float(g("REFLEX_SLOW_M", "0.60")),
+                   stale_s=float(g("REFLEX_STALE_S", "0.5")), hfov_deg=float(g("CAMERA_HFOV_DEG", "58")),
+                   enabled=g("REFLEX_ENABLED", "1") == "1")
+
+    # ------- entrada de sensores (sus hilos) -------
+    def _update(self, name: str, mins: np.ndarray) -> None:
+        now = time.monotonic()
+        s = self._src[name]
+        s.mins, s.ts = mins, now                       # cambio de referencia: lectura sin lock
+        s.updates += 1
+        eff = self._effective(now)
+        with self._lock:
+            for k, idx in _GROUPS.items():
+                b = bool(eff[idx].min() <= self.slow_m)
+                if b and not self._blocked[k]:
+                    self._onset[k] = now
+                elif not b:
+                    self._onset[k] = None
+                self._blocked[k] = b
+
+    def feed_lidar(self, scan) -> None:
+        """Callback de Lidar.on_scan: mínimo por sector desde x/y (marco del robot)."""
+        mins = _no_data()
+        if scan.k:
+            x, y = scan.x, scan.y
+            deg = np.degrees(np.arctan2(y, x))
+            bins = ((deg + 180.0) * 2.0).astype(np.intp) % _ANG_BINS
+            np.minimum.at(mins, _ANG_TABLE[bins], np.hypot(x, y))
+        self._update("lidar", mins)
+
+    def _depth_table(self, w: int) -> Tuple[np.ndarray, np.ndarray]:
+        tab = self._depth_tab.get(w)
+        if tab is None:
+            ang = (0.5 - (np.arange(w) + 0.5) / w) * self.hfov          # + = izquierda
+            sec = ((ang + _W / 2) // _W).astype(np.intp) % SECTORS
+            starts = np.flatnonzero(np.r_[True, sec[1:] != sec[:-1]])  # columnas contiguas por sector
+            tab = self._depth_tab[w] = (sec[starts], starts)
+        return tab
+
+    def feed_depth(self, depth_mm: Optional[np.ndarray], front_m: Optional[float] = None) -> None:
+        """
+        Callback del lector de la cámara. Con el frame de profundidad (Astra) usa la
+        franja central de filas; con CAMERA_SHM=1 solo llega `front_m` (sector 0).
+        """
+        mins = _no_data()
+        if depth_mm is not None:
+            h, w = depth_mm.shape
+            roi = depth_mm[h // 3: 2 * h // 3]
+            # buffer por llamada: feed_depth puede correr a la vez en varios hilos lectores
+            tmp = np.subtract(roi, 1, dtype=np.uint16, casting="unsafe")   # 0 (inválido) → 65535
+            sec, starts = self._depth_table(w)
+            group = np.minimum.reduceat(tmp.min(axis=0), starts).astype(np.float32) + 1.0
+            group[group >= 8000] = np.inf
+            np.minimum.at(mins, sec, group / 1000.0)
+        elif front_m is not None:
+            mins[0] = front_m
+        self._update("depth", mins)
+
+    # ------- bucle de control -------
+    def _effective(self, now: float) -> np.ndarray:
+        eff = None
+        for s in self._src.values():
+            if s.updates and now - s.ts <= self.stale_s:
+                eff = s.mins if eff is None else np.fmin(eff, s.mins)
+        return eff if eff is not None else _no_data()
+
+    def _factor(self, d: float) -> float:
+        if d <= self.stop_m:
+            return 0.0
+        if d >= self.slow_m:
+            return 1.0
+        return (d - self.stop_m) / (self.slow_m - self.stop_m)
+
+    def filter(self, x: int, y: int, z: int, now: float) -> Tuple[int, int, int]:
+        """Setpoint (x, y, z) → setpoint seguro para este tick. z (giro en sitio) no se toca."""
+        heading = {}
+        if x:
+            heading["fwd" if x > 0 else "back"] = x
+        if y:
+            heading["right" if y > 0 else "left"] = y
+        for k in self._since:
+            if k not in heading:
+                self._since[k] = None
+            elif self._since[k] is None:
+                self._since[k] = now
+        eff = self._effective(now)
+        if heading and self.enabled:
+            # una fuente que ya dio datos y dejó de darlos no protege: avisar, no solo ignorarla
+            self._set_stale(tuple(k for k, s in self._src.items() if s.updates and now - s.ts > self.stale_s), now)
+        if not self.enabled or not heading:
+            self._set_active({}, eff)
+            return x, y, z
+        active = {}
+        for k in heading:
+            f = self._factor(float(eff[_GROUPS[k]].min()))
+            if f >= 1.0:
+                continue
+            active[k] = f
+            if k in ("fwd", "back"):
+                x = int(x * f)
+            else:
+                y = int(y * f)
+            with self._lock:
+                onset, self._onset[k] = self._onset[k], None
+            if onset is not None:
+                self.reaction_ms.observe(max(0.0, now - max(onset, self._since[k])) * 1000.0)
+        if active:
+            if any(f == 0.0 for f in active.values()):
+                self.vetoed += 1
+            else:
+                self.scaled += 1
+            ages = [now - s.ts for s in self._src.values() if s.updates and now - s.ts <= self.stale_s]
+            if ages:
+                self.age_ms.observe(min(ages) * 1000.0)
+        self._set_active(active, eff)
+        return x, y, z
+
+    def _set_active(self, active: Dict[str, float], eff: np.ndarray) -> None:
+        # solo los cambios de estado salen al bus (entra/sale un veto o escalado)
+        if active.keys() != self._active.keys() and self.bus is not None:
+            self.bus.publish_threadsafe("motion/reflex", {
+                "active": {k: round(f, 2) for k, f in active.items()},
+                "sectors_m": [None if math.isinf(v) else round(float(v), 3) for v in eff],
+                "ts": time.time()})
+        self._active = active
+
+    def _set_stale(self, stale: tuple, now: float) -> None:
+        if stale:
+            self.stale_ticks += 1
+        if stale == self._stale:
+            return
+        was, self._stale = self._stale, stale
+        if self.bus is None or (was and stale):
+            return                                    # solo transiciones sano <-> caducado
+        ages = {k: round(now - s.ts, 2) for k, s in self._src.items() if s.updates}
+        self.bus.publish_threadsafe("alert", {
+            "code": "REFLEX_STALE", "level": "warn" if stale else "info",
+            "state": "raise" if stale else "clear",
+            "message": (f"Reflejo sin datos recientes de {', '.join(stale)} con el robot en movimiento"
+                        if stale else "Reflejo con datos de sensores al día"),
+            "value": max(ages[k] for k in stale) if stale else None, "age_s": ages, "ts": time.time()})
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        eff = self._effective(now)
+        return {
+            "enabled": self.enabled, "stop_m": self.stop_m, "slow_m": self.slow_m,
+            "sectors_m": [None if math.isinf(v) else round(float(v), 3) for v in eff],
+            "sources": {k: {"updates": s.updates,
+                            "age_ms": round((now - s.ts) * 1000, 1) if s.updates else None}
+                        for k, s in self._src.items()},
+            "active": dict(self._active), "scaled": self.scaled, "vetoed": self.vetoed,
+            "stale": list(self._stale), "stale_ticks": self.stale_ticks,
+            "reaction_ms": self.reaction_ms.snapshot(), "age_ms": self.age_ms.snapshot(),
+        }
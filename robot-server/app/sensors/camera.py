@@ -1,11 +1,13 @@
 # app/sensors/camera.py
-import os, time
-from typing import Optional, Tuple, Union
+import os, threading, time
+from typing import Optional, Sequence, Tuple, Union
 from pathlib import Path
 import numpy as np
 import cv2
 from dotenv import load_dotenv
 
+from ..core.metrics import Counter, Histogram
+
 # ---------- Carga .env desde robot-server/config/.env ----------
 ENV_PATH = Path(__file__).resolve().parents[2] / "config" / ".env"
 load_dotenv(ENV_PATH)
@@ -80,8 +82,10 @@ class _Astra:
         # Evita copias intermedias usando frombuffer y reshape sin copiar
         color = np.frombuffer(c.get_data(), dtype=np.uint8)
         color = color.reshape(c.get_height(), c.get_width(), 3)
+        # la profundidad sí se copia (una vez): la vista de frombuffer apunta al
+        # buffer del SDK, que se recicla, y el array se retiene (historial, reflejo)
         depth = np.frombuffer(d.get_data(), dtype=np.uint16)
-        depth = depth.reshape(d.get_height(), d.get_width())
+        depth = depth.reshape(d.get_height(), d.get_width()).copy()
 
         # SDK entrega color en RGB → conviértelo a BGR para OpenCV
         bgr = cv2.cvtColor(color, cv2.COLOR_RGB2BGR)
@@ -158,21 +162,153 @@ class _OpenCVCam:
             self._cap.release()
             self._cap = None
 
+# ---------- Backends sin hardware (pruebas de carga, benchmarks) ----------
+class _Pacer:
+    """Ritmo fijo con deadlines absolutos (monotonic), como una cámara real."""
+    def __init__(self, fps: float):
+        self.period = 1.0 / max(float(fps), 1e-3)
+        self._next = time.monotonic()
+
+    def wait(self):
+        self._next += self.period
+        rest = self._next - time.monotonic()
+        if rest > 0:
+            time.sleep(rest)
+        elif rest < -self.period:
+            self._next = time.monotonic()   # muy atrasado: no intentes recuperar
+
+class _SyntheticCam:
+    """Escena sintética determinista: degradado fijo + bloques de color en movimiento."""
+    def __init__(self, width: int, height: int, fps: float):
+        self.width, self.height = width, height
+        self._pacer = _Pacer(fps)
+        self._n = 0
+        gx = np.linspace(40, 200, width, dtype=np.float32)
+        gy = np.linspace(30, 120, height, dtype=np.float32)[:, None]
+        base = np.empty((height, width, 3), dtype=np.uint8)
+        base[:, :, 0] = (gx * 0.6 + gy * 0.4).astype(np.uint8)
+        base[:, :, 1] = (gy * 1.2).astype(np.uint8)
+        base[:, :, 2] = (255 - gx * 0.8).astype(np.uint8)
+        self._base = base
+        self._frame = base.copy()
+
+    def open(self):
+        pass
+
+    def read(self) -> np.ndarray:
+        self._pacer.wait()
+        w, h, n = self.width, self.height, self._n
+        self._n += 1
+        f = self._frame
+        np.copyto(f, self._base)
+        s = max(8, min(w, h) // 6)
+        x = (n * 7) % max(1, w - s)
+        y = (n * 3) % max(1, h - s)
+        f[y:y + s, x:x + s] = (0, 0, 220)                      # rojo
+        f[h - s - y // 2:h - y // 2, w - s - x:w - x] = (200, 60, 0)  # azul
+        return f.copy()
+
+    def release(self):
+        pass
+
+class _ReplayCam:
+    """Reproduce un vídeo o un directorio de imágenes (ordenadas) en bucle, a `fps`."""
+    _EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, path: str, fps: float, loop: bool = True):
+        self.path = path
+        self.loop = loop
+        self._pacer = _Pacer(fps)
+        self._cap: Optional[cv2.VideoCapture] = None
+        self._files: list = []
+        self._i = 0
+
+    def open(self):
+        p = Path(self.path)
+        if p.is_dir():
+            self._files = sorted(str(f) for f in p.iterdir() if f.suffix.lower() in self._EXTS)
+            if not self._files:
+                raise RuntimeError(f"Replay: no hay imágenes en {p}")
+        else:
+            self._cap = cv2.VideoCapture(str(p))
+            if not self._cap.isOpened():
+                raise RuntimeError(f"Replay: no se pudo abrir {p}")
+
+    def read(self) -> np.ndarray:
+        if self._cap is None and not self._files:
+            self.open()
+        self._pacer.wait()
+        if self._files:
+            if self._i >= len(self._files):
+                if not self.loop:
+                    raise RuntimeError("Replay: fin de la secuencia")
+                self._i = 0
+            frame = cv2.imread(self._files[self._i], cv2.IMREAD_COLOR)
+            self._i += 1
+        else:
+            ok, frame = self._cap.read()
+            if not ok and self.loop:
+                self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self._cap.read()
+            if not ok:
+                raise RuntimeError("Replay: fin del vídeo")
+        if frame is None:
+            raise RuntimeError("Replay: frame ilegible")
+        return frame
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+# ---------- Backend memoria compartida (frames del proceso de captura) ----------
+class _ShmCam:
+    """Lee del FrameRing que llena `capture_proc`; no toca el dispositivo."""
+    def __init__(self, name: str, timeout: float = 1.0):
+        from .frame_ring import FrameRing
+        self.ring = FrameRing.attach(name)
+        self.timeout = timeout
+        self._seq = 0
+        self._aux = -1
+        self.ts = 0.0           # monotonic de la captura del último frame leído
+        self.skipped = 0        # frames del anillo que este lector no llegó a ver
+
+    def read(self) -> np.ndarray:
+        # espera un frame nuevo: un lector más rápido que la cámara no duplica frames
+        ref = self.ring.read_copy(self._seq, self.timeout)
+        if ref is None:
+            raise RuntimeError("Sin frames nuevos en memoria compartida")
+        if self._seq:
+            self.skipped += max(0, ref.seq - self._seq - 1)
+        self._seq, self._aux, self.ts = ref.seq, ref.aux, ref.ts
+        return ref.frame
+
+    def depth_min_m(self) -> Optional[float]:
+        return self._aux / 1000.0 if self._aux >= 0 else None
+
+    def release(self):
+        self.ring.close()
+
 # ---------- Interfaz pública (compatible con tu código) ----------
 class Camera:
-    def __init__(self):
+    def __init__(self, use_shm: Optional[bool] = None):
         # Fija hilos de OpenCV si la build lo soporta (evita sobre-subscription)
         try:
             cv2.setNumThreads(max(1, int(os.getenv("OPENCV_THREADS", "1"))))
         except Exception:
             pass
 
-        self.backend = os.getenv("CAMERA_BACKEND", "opencv").strip().lower()  # "opencv" | "astra"
+        self.backend = os.getenv("CAMERA_BACKEND", "opencv").strip().lower()  # "opencv" | "astra" | "synthetic" | "replay"
         self.device  = _parse_device(os.getenv("CAMERA_DEVICE", "0"))
         self.width   = int(os.getenv("CAMERA_WIDTH", "640"))
         self.height  = int(os.getenv("CAMERA_HEIGHT", "480"))
         self.fps     = int(os.getenv("CAMERA_FPS", "30"))
         self.codec   = os.getenv("CAMERA_CODEC", "MJPG").strip().upper()
+        self.replay_path = os.getenv("CAMERA_REPLAY", "")
+
+        # CAMERA_SHM=1: los frames llegan del proceso de captura (ver capture_proc.py)
+        self.shm = (os.getenv("CAMERA_SHM", "0") == "1") if use_shm is None else use_shm
+        self.shm_name = os.getenv("CAMERA_SHM_NAME", "hexamind_frames")
 
         self.lowlight_auto   = os.getenv("CAMERA_LOWLIGHT_AUTO", "1") == "1"
         self.lowlight_force  = os.getenv("CAMERA_LOWLIGHT_FORCE", "0") == "1"
@@ -180,22 +316,53 @@ class Camera:
 
         self._ema = _EMA(alpha=float(os.getenv("CAMERA_TEMPORAL_EMA", "0.2")))
         self._fps_actual = 0.0
-        self._t_last = time.time()
+        self._t_last = time.monotonic()
         self._last_frame: Optional[np.ndarray] = None
+        self.frame_ts = 0.0     # monotonic de captura del último frame (latencia captura → envío)
+        self.history = None     # core.sensor_history.SensorHistory (inyectado por main)
+
+        # métricas (ver /metrics)
+        self.interval_ms = Histogram((5, 10, 20, 33, 40, 50, 66, 100, 200, 500, 1000))
+        self.lowlight_ms = Histogram()
+        self.jpeg_ms = Histogram()
+        self.frames = Counter()
+        self.dropped = Counter()        # huecos respecto a CAMERA_FPS (o saltos de seq del anillo)
+        self.enhanced = Counter()       # frames que pasaron por la mejora de baja luz
 
         # backends
         self._astra: Optional[_Astra] = None
-        self._cv: Optional[_OpenCVCam] = None
+        self._cv: Optional[Union[_OpenCVCam, _SyntheticCam, _ReplayCam]] = None   # todo lo que no es Astra
+        self._shm: Optional[_ShmCam] = None
+        self._depth_listeners: list = []
+        self._read_at = 0.0             # monotonic del último read() de un visor (no del hilo de profundidad)
+        self._poll_stop = threading.Event()
+        self._poll_thread: Optional[threading.Thread] = None
+        self.polled = Counter()         # lecturas hechas por el hilo de profundidad (sin visores)
+
+    def _is_open(self) -> bool:
+        if self.shm:
+            return self._shm is not None
+        return (self._astra if self.backend == "astra" else self._cv) is not None
 
     def open(self):
-        if self.backend == "astra":
+        if self.shm:
+            if self._shm is None:
+                self._shm = _ShmCam(self.shm_name)
+        elif self.backend == "astra":
             if not _ASTRA_OK:
                 raise RuntimeError("CAMERA_BACKEND=astra pero pyorbbecsdk no está instalado")
             if self._astra is None:
                 self._astra = _Astra()
         else:
             if self._cv is None:
-                self._cv = _OpenCVCam(self.device, self.width, self.height, self.fps, self.codec)
+                if self.backend == "synthetic":
+                    self._cv = _SyntheticCam(self.width, self.height, self.fps)
+                elif self.backend == "replay":
+                    if not self.replay_path:
+                        raise RuntimeError("CAMERA_BACKEND=replay requiere CAMERA_REPLAY")
+                    self._cv = _ReplayCam(self.replay_path, self.fps)
+                else:
+                    self._cv = _OpenCVCam(self.device, self.width, self.height, self.fps, self.codec)
             self._cv.open()
 
     def _postprocess_lowlight(self, frame: np.ndarray) -> np.ndarray:
@@ -209,26 +376,117 @@ class Camera:
         if do_enh:
             frame = _lowlight_enhance(frame)
             frame = self._ema.apply(frame)
+            self.enhanced.inc()
         return frame
 
     def read(self) -> np.ndarray:
-        if (self.backend == "astra" and self._astra is None) or (self.backend != "astra" and self._cv is None):
+        if not self._is_open():
             self.open()
 
-        frame = self._astra.read() if self.backend == "astra" else self._cv.read()
-        frame = self._postprocess_lowlight(frame)
-
-        t = time.time()
-        dt = t - self._t_last
-        if dt <= 0:
-            dt = 1e-6
-        self._fps_actual = 1.0 / dt
-        self._t_last = t
+        if self.shm:
+            frame = self._shm.read()   # baja luz ya aplicada en el proceso de captura
+            t = self._shm.ts
+        else:
+            frame = self._astra.read() if self.backend == "astra" else self._cv.read()
+            t = time.monotonic()
+            frame = self._postprocess_lowlight(frame)
+            self.lowlight_ms.observe((time.monotonic() - t) * 1000.0)
+        if self._depth_listeners:
+            self._notify_depth()
+
+        dt = max(t - self._t_last, 1e-6)
+        self.frames.inc()
+        if self.frame_ts:
+            self.interval_ms.observe(dt * 1000.0)
+            if self.shm:
+                self.dropped.value = self._shm.skipped
+            elif dt > 1.5 / self.fps:
+                self.dropped.inc(int(round(dt * self.fps)) - 1)
+            # fps suavizado (EMA): un único intervalo es demasiado ruidoso
+            f = 1.0 / dt
+            self._fps_actual = f if self._fps_actual <= 0 else self._fps_actual + 0.1 * (f - self._fps_actual)
+        self._t_last = self.frame_ts = t
         self._last_frame = frame
+        if threading.current_thread() is not self._poll_thread:
+            self._read_at = time.monotonic()
+        if self.history is not None:
+            self._record(frame, t)
         return frame
 
+    def _record(self, frame: np.ndarray, t: float) -> None:
+        # por referencia: el frame BGR sale nuevo de cada read() y la profundidad
+        # de Astra se copia en _Astra.read (frombuffer sería una vista del SDK)
+        h = self.history
+        h.record("frame", frame, t)
+        if self._astra is not None:
+            h.record("depth", self._astra._last_depth_mm, t)
+        elif self._shm is not None:
+            h.record("depth_front_m", self._shm.depth_min_m(), t)
+
     # -------- profundidad (solo cuando backend=astra) --------
+    def on_depth(self, fn) -> None:
+        """fn(depth_mm | None, front_m | None) tras cada frame con profundidad (reflejo de obstáculos)."""
+        self._depth_listeners.append(fn)
+
+    def has_depth(self) -> bool:
+        return self.shm or self.backend == "astra"
+
+    def start_depth_poll(self) -> None:
+        """
+        Mantiene la profundidad fluyendo hacia on_depth aunque nadie lea la cámara
+        (sin visores MJPEG el reflejo se quedaría sin datos). Solo lee cuando
+        ningún otro hilo lo ha hecho en el último periodo: con visores no roba frames.
+        """
+        if not self.has_depth() or not self._depth_listeners:
+            return
+        if self._poll_thread is not None and self._poll_thread.is_alive():
+            return
+        self._poll_stop.clear()
+        self._poll_thread = threading.Thread(target=self._depth_poll, name="camera-depth", daemon=True)
+        self._poll_thread.start()
+
+    def stop_depth_poll(self, timeout: float = 2.0) -> None:
+        self._poll_stop.set()
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout)
+            self._poll_thread = None
+
+    def _depth_poll(self):
+        period = 1.0 / max(1, self.fps)
+        warned = False
+        while not self._poll_stop.is_set():
+            idle = time.monotonic() - self._read_at
+            if idle < 1.5 * period:
+                self._poll_stop.wait(1.5 * period - idle)   # un visor ya está leyendo (y notificando)
+                continue
+            try:                                # read() espera al siguiente frame: ritmo de cámara
+                self.read()
+                self.polled.inc()
+                warned = False
+            except Exception as e:
+                if not warned:
+                    print("[WARN] lectura de profundidad:", e)
+                    warned = True
+                self._poll_stop.wait(0.5)
+
+    def _notify_depth(self):
+        if self._shm is not None:
+            depth, front = None, self._shm.depth_min_m()
+        elif self._astra is not None:
+            depth, front = self._astra._last_depth_mm, None
+        else:
+            return
+        if depth is None and front is None:
+            return
+        for fn in self._depth_listeners:
+            try:
+                fn(depth, front)
+            except Exception as e:
+                print("[WARN] depth listener:", e)
+
     def depth_min_m(self) -> Optional[float]:
+        if self._shm is not None:
+            return self._shm.depth_min_m()
         if self.backend != "astra" or self._astra is None:
             return None
         return self._astra.depth_min_m()
@@ -247,9 +505,15 @@ class Camera:
 
     def snapshot_jpeg(self, quality: int = 85) -> bytes:
         frame = self.read()
-        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return self.encode_jpeg(frame, quality)
+
+    def encode_jpeg(self, frame: np.ndarray, quality: int = 85, params: Sequence[int] = ()) -> bytes:
+        """params: opciones extra de cv2.imencode (pares clave, valor), p. ej. submuestreo de croma."""
+        t0 = time.perf_counter()
+        ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality, *params])
         if not ok:
             raise RuntimeError("No se pudo codificar JPG")
+        self.jpeg_ms.observe((time.perf_counter() - t0) * 1000.0)
         return buf.tobytes()
 
     def snapshot_depth_jpeg(self) -> Optional[bytes]:
@@ -263,6 +527,9 @@ class Camera:
         return buf.tobytes()
 
     def release(self):
+        if self._shm is not None:
+            self._shm.release()
+            self._shm = None
         if self._astra is not None:
             self._astra.release()
             self._astra = None
@@ -280,7 +547,7 @@ class Camera:
         except Exception:
             fps = 0.0
         dmin = None
-        if self.backend == "astra" and self._astra is not None:
+        if self._shm is not None or (self.backend == "astra" and self._astra is not None):
             try:
                 dmin = self.depth_min_m()
             except Exception:
@@ -293,6 +560,19 @@ class Camera:
             "ts": time.time(),
         }
 
+    def collect_metrics(self, m) -> None:
+        """Colector para core.metrics.REGISTRY."""
+        m.counter("camera_frames", self.frames.value, "Frames leídos por el proceso web")
+        m.counter("camera_dropped_frames", self.dropped.value,
+                  "Frames perdidos (huecos respecto a CAMERA_FPS o saltos del anillo)")
+        m.counter("camera_lowlight_enhanced_frames", self.enhanced.value, "Frames con mejora de baja luz")
+        m.counter("camera_depth_polled_frames", self.polled.value,
+                  "Lecturas del hilo de profundidad (sin visores leyendo la cámara)")
+        m.gauge("camera_fps", round(self._fps_actual, 2), "FPS suavizados (EMA)")
+        m.histogram("camera_capture_interval", self.interval_ms, "Intervalo entre frames leídos")
+        m.histogram("camera_lowlight", self.lowlight_ms, "Etapa de baja luz (detección + mejora)")
+        m.histogram("camera_jpeg_encode", self.jpeg_ms, "Codificación JPEG")
+
 # ---------- Instancia global y helper conservados ----------
 camera = Camera()
 
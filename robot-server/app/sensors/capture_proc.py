@@ -0,0 +1,109 @@
+# app/sensors/capture_proc.py
+"""
+Proceso de captura: lee la cámara real (OpenCV/Astra + baja luz) y escribe
+cada frame en el FrameRing compartido. Así captura y post-proceso no
+compiten por el GIL con el loop de uvicorn, y varios workers web pueden
+leer la misma cámara.
+
+Uso independiente (p. ej. con `uvicorn --workers N`):
+    python -m app.sensors.capture_proc
+"""
+import multiprocessing as mp
+import os, signal, time
+from typing import Optional
+
+from .frame_ring import FrameRing
+
+SHM_NAME  = os.getenv("CAMERA_SHM_NAME", "hexamind_frames")
+SHM_SLOTS = int(os.getenv("CAMERA_SHM_SLOTS", "4"))
+
+def capture_main(ring_name: str, stop_evt=None) -> None:
+    """Bucle del proceso hijo. Importa la cámara aquí: el padre no abre el dispositivo."""
+    import cv2
+    from .camera import Camera
+
+    ring = FrameRing.attach(ring_name)
+    cam = Camera(use_shm=False)
+    fails = 0
+    try:
+        while stop_evt is None or not stop_evt.is_set():
+            try:
+                frame = cam.read()
+                fails = 0
+            except Exception as e:
+                fails += 1
+                if fails == 1:
+                    print("[capture] error leyendo cámara:", e)
+                cam.release()
+                time.sleep(min(2.0, 0.1 * fails))
+                continue
+            h, w = frame.shape[:2]
+            if h > ring.height or w > ring.width:
+                frame = cv2.resize(frame, (ring.width, ring.height), interpolation=cv2.INTER_AREA)
+            dmin = cam.depth_min_m()
+            ring.write(frame, aux=int(dmin * 1000) if dmin is not None else -1)
+    finally:
+        cam.release()
+        ring.close()
+
+class CaptureProcess:
+    """
+    Crea el anillo y lanza el proceso de captura. Si el anillo ya existe
+    (otro worker web lo creó o corre `python -m app.sensors.capture_proc`),
+    solo se adjunta: `owner` indica quién debe lanzar analizadores y limpiar.
+    """
+    def __init__(self, name: str = SHM_NAME, slots: int = SHM_SLOTS,
+                 width: Optional[int] = None, height: Optional[int] = None):
+        self.name = name
+        self.slots = slots
+        self.width = width or int(os.getenv("CAMERA_WIDTH", "640"))
+        self.height = height or int(os.getenv("CAMERA_HEIGHT", "480"))
+        self.ring: Optional[FrameRing] = None
+        self.owner = False
+        self._ctx = mp.get_context("spawn")   # nunca fork de un proceso con loop e hilos
+        self._stop = self._ctx.Event()
+        self._proc = None
+
+    def start(self) -> "CaptureProcess":
+        try:
+            self.ring = FrameRing.create(self.name, self.slots, self.height, self.width)
+            self.owner = True
+        except FileExistsError:
+            self.ring = FrameRing.attach(self.name)
+            return self
+        self._proc = self._ctx.Process(target=capture_main, args=(self.name, self._stop),
+                                       name="hexamind-capture", daemon=True)
+        self._proc.start()
+        return self
+
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.is_alive()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        if self._proc is not None:
+            self._proc.join(timeout)
+            if self._proc.is_alive():
+                self._proc.terminate()
+            self._proc = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+def main():
+    cap = CaptureProcess()
+    cap.start()
+    if not cap.owner:
+        raise SystemExit(f"[capture] el anillo '{cap.name}' ya existe (¿otra captura corriendo?)")
+    print(f"[capture] anillo '{cap.name}' {cap.width}x{cap.height}x{cap.slots} listo")
+    signal.signal(signal.SIGTERM, lambda *_: cap._stop.set())
+    try:
+        while cap.alive() and not cap._stop.is_set():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+# app/sensors/frame_ring.py
+"""
+Anillo de frames en memoria compartida (multiprocessing.shared_memory).
+
+Un único escritor (proceso de captura) y N lectores (analizadores, workers
+web) que leen vistas NumPy sin copiar. Cada slot lleva un seqlock:
+impar = escribiendo, par = estable. El lector toma el seq antes de usar la
+vista y lo revalida después (`FrameRef.valid()`); si cambió, el escritor dio
+la vuelta al anillo y el frame se descarta.
+
+Layout:  [cabecera int64 x 8][meta int64 x 5 por slot][datos uint8 slots x H x W x C]
+"""
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+_MAGIC = 0x48584D5246524E47   # "HXMRFRNG"
+_HDR_N = 8
+_META_N = 5
+
+# índices de cabecera
+_H_MAGIC, _H_SLOTS, _H_HEIGHT, _H_WIDTH, _H_CHANNELS, _H_LATEST = range(6)
+# índices de meta por slot
+_M_SEQ, _M_H, _M_W, _M_TS_NS, _M_AUX = range(_META_N)
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    # Python < 3.13 registra también los attach en el resource_tracker y el
+    # lector borraría el segmento al salir: solo el creador debe hacerlo.
+    # Los hijos `spawn` comparten el tracker del padre; ahí no se toca nada.
+    try:
+        return shared_memory.SharedMemory(name=name, create=False, track=False)
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    own_tracker = getattr(resource_tracker._resource_tracker, "_fd", None) is None
+    shm = shared_memory.SharedMemory(name=name, create=False)
+    if own_tracker:
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+    return shm
+
+@dataclass
+class FrameRef:
+    seq: int
+    ts: float             # time.monotonic() de la captura (reloj común entre procesos)
+    frame: np.ndarray     # vista sin copia sobre la memoria compartida
+    aux: int              # dato extra del escritor (p. ej. profundidad mínima en mm, -1 = n/a)
+    _ring: "FrameRing"
+    _slot: int
+    _lock_seq: int
+
+    def valid(self) -> bool:
+        """True si el escritor no ha sobrescrito el slot desde que se leyó."""
+        return int(self._ring._meta[self._slot, _M_SEQ]) == self._lock_seq
+
+class FrameRing:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        hdr = np.ndarray((_HDR_N,), dtype=np.int64, buffer=shm.buf)
+        if int(hdr[_H_MAGIC]) != _MAGIC:
+            raise RuntimeError(f"FrameRing '{shm.name}': cabecera inválida")
+        n, h, w, c = (int(hdr[i]) for i in (_H_SLOTS, _H_HEIGHT, _H_WIDTH, _H_CHANNELS))
+        self.slots, self.height, self.width, self.channels = n, h, w, c
+        self._hdr = hdr
+        off = _HDR_N * 8
+        self._meta = np.ndarray((n, _META_N), dtype=np.int64, buffer=shm.buf, offset=off)
+        off += n * _META_N * 8
+        self._data = np.ndarray((n, h, w, c), dtype=np.uint8, buffer=shm.buf, offset=off)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    # ------- ciclo de vida -------
+    @staticmethod
+    def nbytes(slots: int, height: int, width: int, channels: int = 3) -> int:
+        return (_HDR_N + slots * _META_N) * 8 + slots * height * width * channels
+
+    @classmethod
+    def create(cls, name: str, slots: int, height: int, width: int, channels: int = 3) -> "FrameRing":
+        """Crea el segmento; lanza FileExistsError si otro proceso ya lo creó."""
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=cls.nbytes(slots, height, width, channels))
+        hdr = np.ndarray((_HDR_N,), dtype=np.int64, buffer=shm.buf)
+        hdr[:] = 0
+        hdr[_H_SLOTS], hdr[_H_HEIGHT], hdr[_H_WIDTH], hdr[_H_CHANNELS] = slots, height, width, channels
+        np.ndarray((slots * _META_N,), dtype=np.int64, buffer=shm.buf, offset=_HDR_N * 8)[:] = 0
+        hdr[_H_MAGIC] = _MAGIC   # al final: el anillo solo es visible ya inicializado
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        return cls(_open_untracked(name), owner=False)
+
+    def close(self) -> None:
+        # soltar vistas antes de cerrar el mmap
+        self._hdr = self._meta = self._data = None
+        try:
+            self.shm.close()
+        except Exception:
+            pass
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    # ------- escritor (un solo proceso) -------
+    def write(self, frame: np.ndarray, ts: Optional[float] = None, aux: int = -1) -> int:
+        h, w = frame.shape[:2]
+        if h > self.height or w > self.width:
+            raise ValueError(f"frame {w}x{h} no cabe en slot {self.width}x{self.height}")
+        seq = int(self._hdr[_H_LATEST]) + 1
+        i = seq % self.slots
+        meta = self._meta[i]
+        meta[_M_SEQ] = 2 * seq - 1                 # impar: escribiendo
+        self._data[i, :h, :w] = frame.reshape(h, w, -1)
+        meta[_M_H], meta[_M_W] = h, w
+        meta[_M_TS_NS] = int((time.monotonic() if ts is None else ts) * 1e9)
+        meta[_M_AUX] = aux
+        meta[_M_SEQ] = 2 * seq                     # par: estable
+        self._hdr[_H_LATEST] = seq
+        return seq
+
+    # ------- lectores -------
+    def latest_seq(self) -> int:
+        return int(self._hdr[_H_LATEST])
+
+    def latest(self) -> Optional[FrameRef]:
+        """Último frame como vista sin copia (None si no hay o se está escribiendo)."""
+        for _ in range(3):
+            seq = int(self._hdr[_H_LATEST])
+            if seq == 0:
+                return None
+            i = seq % self.slots
+            meta = self._meta[i]
+            lock = int(meta[_M_SEQ])
+            if lock != 2 * seq:
+                continue                           # escritor ya avanzó; reintenta
+            h, w = int(meta[_M_H]), int(meta[_M_W])
+            view = self._data[i, :h, :w]
+            if self.channels == 1:
+                view = view[:, :, 0]
+            ref = FrameRef(seq, int(meta[_M_TS_NS]) / 1e9, view, int(meta[_M_AUX]), self, i, lock)
+            if ref.valid():
+                return ref
+        return None
+
+    def wait_next(self, after_seq: int, timeout: float = 1.0, poll_s: float = 0.002) -> Optional[FrameRef]:
+        """Espera a un frame con seq > after_seq (sondeo barato del contador de cabecera)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if int(self._hdr[_H_LATEST]) > after_seq:
+                ref = self.latest()
+                if ref is not None:
+                    return ref
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_s)
+
+    def read_copy(self, after_seq: int = 0, timeout: float = 1.0) -> Optional[FrameRef]:
+        """Como wait_next, pero con el frame copiado (seguro de retener)."""
+        for _ in range(3):
+            ref = self.wait_next(after_seq, timeout)
+            if ref is None:
+                return None
+            frame = ref.frame.copy()
+            if ref.valid():
+                ref.frame = frame
+                return ref
+        return None
@@ -0,0 +1,468 @@
+# app/sensors/lidar.py
+"""
+LiDAR RPLIDAR en un hilo propio, con vueltas completas en arrays NumPy.
+
+Los nodos del modo "normal" (5 bytes) se leen en bloque del puerto serie y se
+decodifican vectorialmente; cada vuelta se ensambla en un LidarScan de un
+anillo de buffers preasignados (sin tuplas por medida ni listas por vuelta).
+El paso a cartesianas (marco del robot: x adelante, y izquierda, metros)
+aplica LIDAR_OFFSET_X/Y y LIDAR_YAW_DEG con operaciones `out=`.
+
+Backends (LIDAR_BACKEND):
+- "rplidar":   sensor real (paquete `rplidar-roboticia` o `rplidar`, se importa al abrir).
+- "replay":    fichero .npz grabado (LIDAR_REPLAY) a LIDAR_FPS, en bucle.
+- "synthetic": habitación rectangular + obstáculo móvil, sin hardware.
+- "none":      desactivado.
+
+Cada vuelta publica un resumen compacto en `lidar/scan`. Si el backend falla
+o deja de entregar datos, se cierra y se reintenta tras LIDAR_RETRY_S.
+
+Grabar vueltas para replay:
+    python -m app.sensors.lidar --record scans.npz --seconds 20
+"""
+import math, os, threading, time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+SCAN_CAPACITY = 8192      # puntos por vuelta (S2 a 10 Hz ≈ 3200)
+RING_SCANS = 3            # vueltas preasignadas; el lector debe terminar antes de 2 vueltas
+NODE_BYTES = 5
+SECTORS = 8               # resumen: distancia mínima por sector de 45° (0 = frente)
+
+_Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]   # start, quality, angle_deg, dist_mm
+
+# ---------------- decodificación vectorial ----------------
+def _node_ok(nodes: np.ndarray) -> np.ndarray:
+    b0, b1 = nodes[:, 0], nodes[:, 1]
+    return (((b0 ^ (b0 >> 1)) & 1) & (b1 & 1)).astype(bool)
+
+def decode_nodes(buf: bytes) -> Tuple[Optional[_Chunk], int]:
+    """
+    Decodifica los nodos completos de `buf`; devuelve (chunk, bytes consumidos).
+    Si el flujo está desalineado busca el primer desplazamiento válido; un
+    nodo corrupto corta el bloque y el resto se reintenta en la próxima lectura.
+    """
+    a = np.frombuffer(buf, dtype=np.uint8)
+    for off in range(NODE_BYTES):
+        m = (len(a) - off) // NODE_BYTES
+        if m <= 0:
+            return None, off
+        nodes = a[off:off + m * NODE_BYTES].reshape(m, NODE_BYTES)
+        ok = _node_ok(nodes)
+        bad = np.flatnonzero(~ok)
+        k = m if bad.size == 0 else int(bad[0])
+        if k == 0:
+            continue
+        nodes = nodes[:k]
+        b = nodes.astype(np.uint16)
+        start = (b[:, 0] & 1).astype(bool)
+        quality = (b[:, 0] >> 2).astype(np.uint8)
+        angle = ((b[:, 1] >> 1) | (b[:, 2] << 7)).astype(np.float32) * (1.0 / 64.0)
+        dist = (b[:, 3] | (b[:, 4] << 8)).astype(np.float32) * 0.25
+        return (start, quality, angle, dist), off + k * NODE_BYTES
+    return None, 1      # nada válido: descarta un byte y resincroniza
+
+# ---------------- vuelta preasignada ----------------
+class LidarScan:
+    """Una vuelta. Los arrays son vistas de buffers reutilizados: copiar si se guardan."""
+    __slots__ = ("seq", "ts", "n", "k", "_angle", "_dist", "_quality", "_x", "_y", "_valid", "_tmp", "_tmp_b")
+
+    def __init__(self, capacity: int = SCAN_CAPACITY):
+        self.seq = 0
+        self.ts = 0.0
+        self.n = 0                # medidas de la vuelta
+        self.k = 0                # puntos válidos (rango min..max)
+        self._angle = np.zeros(capacity, np.float32)     # grados, sentido horario del sensor
+        self._dist = np.zeros(capacity, np.float32)      # mm
+        self._quality = np.zeros(capacity, np.uint8)
+        self._x = np.zeros(capacity, np.float32)         # m, marco del robot (solo válidos)
+        self._y = np.zeros(capacity, np.float32)
+        self._valid = np.zeros(capacity, bool)
+        self._tmp = np.zeros((3, capacity), np.float32)
+        self._tmp_b = np.zeros(capacity, bool)
+
+    @property
+    def angle_deg(self) -> np.ndarray: return self._angle[:self.n]
+    @property
+    def dist_mm(self) -> np.ndarray: return self._dist[:self.n]
+    @property
+    def quality(self) -> np.ndarray: return self._quality[:self.n]
+    @property
+    def x(self) -> np.ndarray: return self._x[:self.k]
+    @property
+    def y(self) -> np.ndarray: return self._y[:self.k]
+
+    def points(self) -> np.ndarray:
+        """Copia (k, 2) en metros; para quien necesite conservar la vuelta."""
+        return np.stack((self.x, self.y), axis=1)
+
+class _Geometry:
+    """Transformación polar→cartesiana precalculada (montaje del sensor)."""
+    def __init__(self, off_x: float, off_y: float, yaw_deg: float, min_m: float, max_m: float):
+        self.off_x, self.off_y = off_x, off_y
+        self.yaw = math.radians(yaw_deg)
+        self.min_mm, self.max_mm = min_m * 1000.0, max_m * 1000.0
+
+    def apply(self, s: LidarScan) -> None:
+        n = s.n
+        d, a = s._dist[:n], s._angle[:n]
+        th, c, r = s._tmp[0, :n], s._tmp[1, :n], s._tmp[2, :n]
+        valid = s._valid[:n]
+        np.greater_equal(d, self.min_mm, out=valid)
+        np.less_equal(d, self.max_mm, out=s._tmp_b[:n])
+        valid &= s._tmp_b[:n]
+        k = int(np.count_nonzero(valid))
+        # el sensor gira en sentido horario: ángulo del robot = yaw − ángulo medido
+        np.multiply(a, -math.pi / 180.0, out=th)
+        th += self.yaw
+        np.multiply(d, 0.001, out=r)
+        np.cos(th, out=c); c *= r; c += self.off_x
+        np.compress(valid, c, out=s._x[:k])
+        np.sin(th, out=c); c *= r; c += self.off_y
+        np.compress(valid, c, out=s._y[:k])
+        s.k = k
+
+def summarize(s: LidarScan, hz: float) -> dict:
+    """Resumen compacto para el bus: mínimos global y por sector (0 = frente, antihorario)."""
+    out = {"seq": s.seq, "ts": s.ts, "n": s.n, "valid": s.k, "hz": round(hz, 2),
+           "min_m": None, "min_deg": None, "sectors_m": [None] * SECTORS}
+    if s.k == 0:
+        return out
+    x, y = s.x, s.y
+    r = np.hypot(x, y)
+    deg = np.degrees(np.arctan2(y, x))
+    i = int(np.argmin(r))
+    out["min_m"], out["min_deg"] = round(float(r[i]), 3), round(float(deg[i]), 1)
+    width = 360.0 / SECTORS
+    sec = ((deg + width / 2) // width).astype(np.intp) % SECTORS
+    mins = np.full(SECTORS, np.inf, np.float32)
+    np.minimum.at(mins, sec, r)
+    out["sectors_m"] = [round(float(v), 3) if np.isfinite(v) else None for v in mins]
+    return out
+
+# ---------------- backends ----------------
+class _RPLidarBackend:
+    """RPLIDAR en modo scan normal; bytes en bloque del serie y decodificación NumPy."""
+    def __init__(self, port: str, baud: int, timeout: float):
+        self.port, self.baud, self.timeout = port, baud, timeout
+        self._dev = None
+        self._ser = None
+        self._buf = bytearray()
+        self.resyncs = 0
+
+    def open(self):
+        from rplidar import RPLidar            # dependencia opcional
+        self._dev = dev = RPLidar(self.port, baudrate=self.baud, timeout=self.timeout)
+        dev.start_motor()
+        if hasattr(dev, "start"):              # rplidar-roboticia
+            dev.start("normal")
+        else:                                  # rplidar original: SCAN a mano
+            dev._send_cmd(b"\x20")
+            dev._read_descriptor()
+        self._ser = getattr(dev, "_serial", None) or dev._serial_port
+        self._buf.clear()
+
+    def read(self) -> Optional[_Chunk]:
+        ser = self._ser
+        data = ser.read(max(NODE_BYTES * 64, ser.in_waiting))
+        if not data:
+            raise TimeoutError("LiDAR sin datos")
+        self._buf += data
+        chunk, used = decode_nodes(bytes(self._buf))
+        if chunk is None or len(chunk[0]) * NODE_BYTES < used:
+            self.resyncs += 1
+        del self._buf[:used]
+        return chunk
+
+    def close(self):
+        dev, self._dev = self._dev, None
+        if dev is None:
+            return
+        self._ser = None
+        for f in (dev.stop, dev.stop_motor, dev.disconnect):
+            try:
+                f()
+            except Exception:
+                pass
+
+class _Pacer:
+    def __init__(self, fps: float):
+        self.period = 1.0 / max(0.1, fps)
+        self._next = time.monotonic()
+
+    def wait(self):
+        self._next += self.period
+        d = self._next - time.monotonic()
+        if d > 0:
+            time.sleep(d)
+        else:
+            self._next = time.monotonic()
+
+class _ReplayBackend:
+    """
+    .npz con `angle_deg`, `dist_mm`, `quality` (concatenados) y `starts`
+    (índice de inicio de cada vuelta), p. ej. el que produce --record.
+    """
+    whole_scans = True      # cada read() es una vuelta completa: se cierra sin esperar a la siguiente
+
+    def __init__(self, path: str, fps: float):
+        self.path, self._pacer = path, _Pacer(fps)
+        self._i = 0
+
+    def open(self):
+        z = np.load(self.path)
+        self._angle = z["angle_deg"].astype(np.float32)
+        self._dist = z["dist_mm"].astype(np.float32)
+        self._quality = z["quality"].astype(np.uint8) if "quality" in z else np.full(len(self._dist), 15, np.uint8)
+        self._bounds = np.append(z["starts"].astype(np.int64), len(self._dist))
+        if len(self._bounds) < 2:
+            raise RuntimeError(f"Replay LiDAR: {self.path} sin vueltas")
+
+    def read(self) -> _Chunk:
+        self._pacer.wait()
+        a, b = self._bounds[self._i], self._bounds[self._i + 1]
+        self._i = (self._i + 1) % (len(self._bounds) - 1)
+        start = np.zeros(b - a, bool)
+        start[:1] = True
+        return start, self._quality[a:b], self._angle[a:b], self._dist[a:b]
+
+    def close(self):
+        pass
+
+class _SyntheticBackend:
+    """Habitación de 6×4 m con el robot descentrado y una caja que se acerca y aleja."""
+    whole_scans = True
+
+    def __init__(self, fps: float, points: int = 720):
+        self._pacer, self._n = _Pacer(fps), 0
+        self._angle = np.linspace(0, 360, points, endpoint=False, dtype=np.float32)
+        th = -np.radians(self._angle)
+        self._c, self._s = np.cos(th), np.sin(th)
+        self._start = np.zeros(points, bool)
+        self._start[0] = True
+        self._quality = np.full(points, 47, np.uint8)
+        with np.errstate(divide="ignore"):
+            wall_x = np.where(self._c > 0, 4.0 / self._c, np.where(self._c < 0, -2.0 / self._c, np.inf))
+            wall_y = np.where(self._s > 0, 1.5 / self._s, np.where(self._s < 0, -2.5 / self._s, np.inf))
+        self._walls = np.minimum(wall_x, wall_y).astype(np.float32)
+
+    def open(self):
+        pass
+
+    def read(self) -> _Chunk:
+        self._pacer.wait()
+        self._n += 1
+        bx = 1.2 + 0.8 * math.sin(self._n * 0.05)       # caja de 0.4 m frente al robot
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(self._c > 0, bx / self._c, np.inf)
+            hit = np.abs(t * self._s) <= 0.2
+        d = np.where(hit, np.minimum(t, self._walls), self._walls) * 1000.0
+        return self._start, self._quality, self._angle, d.astype(np.float32)
+
+    def close(self):
+        pass
+
+# ---------------- lector ----------------
+class Lidar:
+    """
+    Hilo lector: backend → ensamblado de vueltas → cartesianas → bus.
+    `latest()` devuelve la última vuelta completa; `on_scan` registra callbacks
+    que corren en el hilo del LiDAR (deben ser rápidos y no guardar vistas).
+    """
+    def __init__(self, backend: str = "none", port: str = "/dev/ttyUSB0", baud: int = 115200,
+                 timeout: float = 1.0, retry_s: float = 2.0, fps: float = 12.0,
+                 min_dist: float = 0.10, max_dist: float = 8.0, offset_x: float = 0.0,
+                 offset_y: float = 0.0, yaw_deg: float = 0.0, replay: str = "",
+                 capacity: int = SCAN_CAPACITY):
+        self.backend = backend
+        self.port, self.baud, self.timeout = port, baud, timeout
+        self.retry_s, self.fps, self.replay = retry_s, fps, replay
+        self.geometry = _Geometry(offset_x, offset_y, yaw_deg, min_dist, max_dist)
+        self.bus = None
+        self._ring: List[LidarScan] = [LidarScan(capacity) for _ in range(RING_SCANS)]
+        self._w = 0                      # índice del buffer en escritura
+        self._latest: Optional[LidarScan] = None
+        self._started = False            # se vio la primera marca de inicio
+        self._callbacks: List[Callable[[LidarScan], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._dev = None
+        # estado / métricas
+        self.state = "stopped"
+        self.last_error: Optional[str] = None
+        self.seq = 0
+        self.reconnects = 0
+        self.overflow = 0
+        self._resyncs = 0                # de conexiones anteriores
+        self.hz = 0.0
+        self._t_last = 0.0
+        self.proc_ms = 0.0
+
+    @classmethod
+    def from_env(cls) -> "Lidar":
+        g = os.getenv
+        return cls(backend=g("LIDAR_BACKEND", "none").strip().lower(),
+                   port=g("LIDAR_PORT", "/dev/ttyUSB0"), baud=int(g("LIDAR_BAUD", "115200")),
+                   timeout=float(g("LIDAR_TIMEOUT", "1.0")), retry_s=float(g("LIDAR_RETRY_S", "2.0")),
+                   fps=float(g("LIDAR_FPS", "12")), min_dist=float(g("LIDAR_MIN_DIST", "0.10")),
+                   max_dist=float(g("LIDAR_MAX_DIST", "8.0")), offset_x=float(g("LIDAR_OFFSET_X", "0.0")),
+                   offset_y=float(g("LIDAR_OFFSET_Y", "0.0")), yaw_deg=float(g("LIDAR_YAW_DEG", "0.0")),
+                   replay=g("LIDAR_REPLAY", ""))
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend not in ("", "none", "off")
+
+    def _make_backend(self):
+        if self.backend == "rplidar":
+            return _RPLidarBackend(self.port, self.baud, self.timeout)
+        if self.backend == "replay":
+            return _ReplayBackend(self.replay, self.fps)
+        if self.backend == "synthetic":
+            return _SyntheticBackend(self.fps)
+        raise ValueError(f"LIDAR_BACKEND desconocido: {self.backend}")
+
+    def on_scan(self, fn: Callable[[LidarScan], None]) -> None:
+        self._callbacks.append(fn)
+
+    def latest(self) -> Optional[LidarScan]:
+        return self._latest
+
+    # ------- ciclo de vida -------
+    def start(self) -> "Lidar":
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="lidar", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.state = "stopped"
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dev = dev = self._make_backend()
+            try:
+                self.state = "connecting"
+                dev.open()
+                self.state = "running"
+                self.last_error = None
+                print(f"[lidar] running backend={self.backend} port={self.port} baud={self.baud}")
+                whole = getattr(dev, "whole_scans", False)
+                while not self._stop.is_set():
+                    chunk = dev.read()
+                    if chunk is not None:
+                        self._push(*chunk)
+                        if whole:
+                            self._finish()
+                            self._started = False
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.state = "reconnecting"
+                self.reconnects += 1
+                print(f"[lidar] {self.last_error}; reintento en {self.retry_s}s")
+            finally:
+                dev.close()
+                self._resyncs += getattr(dev, "resyncs", 0)
+                self._dev = None
+                self._started = False
+            self._stop.wait(self.retry_s)
+
+    # ------- ensamblado de vueltas -------
+    def _push(self, start: np.ndarray, quality: np.ndarray, angle: np.ndarray, dist: np.ndarray):
+        cuts = np.flatnonzero(start)
+        lo = 0
+        for c in cuts.tolist():
+            if self._started:
+                self._append(quality, angle, dist, lo, c)
+                self._finish()
+            self._started = True
+            lo = c
+        if self._started:
+            self._append(quality, angle, dist, lo, len(start))
+
+    def _append(self, quality, angle, dist, lo: int, hi: int):
+        s = self._ring[self._w]
+        m = min(hi - lo, len(s._dist) - s.n)
+        if m < hi - lo:
+            self.overflow += (hi - lo) - m
+        if m > 0:
+            s._angle[s.n:s.n + m] = angle[lo:lo + m]
+            s._dist[s.n:s.n + m] = dist[lo:lo + m]
+            s._quality[s.n:s.n + m] = quality[lo:lo + m]
+            s.n += m
+
+    def _finish(self):
+        t0 = time.perf_counter()
+        s = self._ring[self._w]
+        if s.n == 0:
+            return
+        self.geometry.apply(s)
+        self.seq += 1
+        s.seq, s.ts = self.seq, time.time()
+        now = time.monotonic()
+        if self._t_last:
+            dt = now - self._t_last
+            self.hz = (1.0 / dt) if self.hz == 0.0 else 0.8 * self.hz + 0.2 / dt
+        self._t_last = now
+        self._latest = s
+        self._w = (self._w + 1) % RING_SCANS
+        self._ring[self._w].n = 0
+        for fn in self._callbacks:
+            try:
+                fn(s)
+            except Exception as e:
+                print("[lidar] callback:", e)
+        if self.bus is not None:
+            self.bus.publish_threadsafe("lidar/scan", summarize(s, self.hz))
+        self.proc_ms = (time.perf_counter() - t0) * 1000.0
+
+    def stats(self) -> dict:
+        s = self._latest
+        return {
+            "backend": self.backend, "state": self.state, "last_error": self.last_error,
+            "seq": self.seq, "hz": round(self.hz, 2), "points": s.n if s else 0,
+            "valid": s.k if s else 0, "reconnects": self.reconnects, "overflow": self.overflow,
+            "resyncs": self._resyncs + getattr(self._dev, "resyncs", 0), "proc_ms": round(self.proc_ms, 3),
+        }
+
+    def collect_metrics(self, m) -> None:
+        m.gauge("lidar_up", int(self.state == "running"), "1 si el LiDAR está entregando vueltas")
+        m.gauge("lidar_scan_hz", round(self.hz, 2), "Vueltas por segundo")
+        m.counter("lidar_scans", self.seq, "Vueltas completas")
+        m.counter("lidar_reconnects", self.reconnects, "Reconexiones del sensor")
+        m.counter("lidar_overflow", self.overflow, "Vueltas truncadas por capacidad del buffer")
+
+lidar = Lidar.from_env()
+
+# ---------------- grabación (CLI) ----------------
+def _record(path: str, seconds: float):
+    rec = Lidar.from_env()
+    if not rec.enabled:
+        rec.backend = "rplidar"
+    parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    rec.on_scan(lambda s: parts.append((s.angle_deg.copy(), s.dist_mm.copy(), s.quality.copy())))
+    rec.start()
+    time.sleep(seconds)
+    rec.stop()
+    if not parts:
+        raise SystemExit(f"sin vueltas ({rec.last_error})")
+    starts = np.cumsum([0] + [len(p[0]) for p in parts[:-1]])
+    np.savez_compressed(path, angle_deg=np.concatenate([p[0] for p in parts]),
+                        dist_mm=np.concatenate([p[1] for p in parts]),
+                        quality=np.concatenate([p[2] for p in parts]), starts=starts)
+    print(f"{len(parts)} vueltas → {path}")
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Graba vueltas del LiDAR para LIDAR_BACKEND=replay")
+    ap.add_argument("--record", required=True)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    a = ap.parse_args()
+    _record(a.record, a.seconds)
@@ -0,0 +1,197 @@
+# app/sensors/lidar_map.py
+"""
+Mapa de ocupación local (centrado en el robot) a partir de las vueltas del LiDAR.
+
+- Log-odds en una rejilla float32 de LIDAR_MAP_SIZE² celdas (LIDAR_MAP_SCALE px/m).
+- Cada vuelta: decay en sitio (LIDAR_MAP_DECAY), celdas libres a lo largo de
+  cada rayo y ocupadas en el impacto (LIDAR_MAP_POINT px), todo vectorizado.
+  El trazado de rayos se hace por celda (modelo inverso del sensor): cada
+  celda conoce de antemano su sector angular y su distancia al LiDAR, así que
+  "libre" es una comparación contra el alcance del sector en esta vuelta; el
+  coste no depende del número de puntos ni de su alcance.
+- Render con LUT de color (applyColorMap) a buffers preasignados; el JPEG se
+  codifica una vez por (vuelta, tamaño) y lo comparten todos los visores.
+- Opcional: rejilla uint8 cruda por el bus (`lidar/map`) para la UI, solo
+  mientras haya clientes WS que la pidan.
+
+Orientación de la imagen: x (adelante) hacia arriba, y (izquierda) a la izquierda.
+"""
+import math, os, threading, time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from ..core.metrics import Histogram
+from .lidar import LidarScan
+
+L_OCC = 0.85      # log-odds por impacto
+L_FREE = -0.40    # log-odds por celda atravesada
+L_MAX = 4.0       # saturación (p ≈ 0.982)
+BINS = 720        # sectores angulares del trazado (0.5°)
+
+def _make_lut() -> np.ndarray:
+    """256×1 BGR: libre → casi negro, desconocido (128) → gris, ocupado → ámbar."""
+    i = np.arange(256, dtype=np.float32)
+    lut = np.empty((256, 1, 3), np.uint8)
+    free = i < 128
+    a = np.where(free, i / 128.0, (i - 128.0) / 127.0)
+    lut[:, 0, 0] = np.where(free, 10 + a * 50, 60 - a * 60)          # B
+    lut[:, 0, 1] = np.where(free, 12 + a * 48, 60 + a * 140)         # G
+    lut[:, 0, 2] = np.where(free, 10 + a * 50, 60 + a * 195)         # R
+    return lut
+
+class OccupancyGrid:
+    def __init__(self, size: int = 640, scale: float = 100.0, decay: float = 0.94, point: int = 2,
+                 quality: int = 80, raw_hz: float = 2.0, raw_step: int = 2,
+                 origin_m: Tuple[float, float] = (0.0, 0.0)):
+        self.size, self.scale, self.decay = int(size), float(scale), float(decay)
+        self.quality = int(quality)
+        self.raw_period = 1.0 / max(0.1, raw_hz)
+        self.raw_step = max(1, int(raw_step))
+        n = self.size
+        self.grid = np.zeros((n, n), np.float32)
+        self._flat = self.grid.reshape(-1)
+        self._c = n // 2
+        # geometría polar de cada celda respecto al LiDAR (montado en origin_m del robot)
+        self._ox, self._oy = origin_m
+        rows, cols = np.mgrid[0:n, 0:n].astype(np.float32)
+        fwd = (self._c - self._ox * self.scale) - rows          # px hacia +x
+        left = (self._c - self._oy * self.scale) - cols         # px hacia +y
+        ang = np.arctan2(left, fwd)
+        self._cell_bin = (((ang + math.pi) * (BINS / (2 * math.pi))).astype(np.int32) % BINS).reshape(-1).astype(np.int16)
+        self._cell_r = np.hypot(fwd, left).reshape(-1)
+        del rows, cols, fwd, left, ang
+        self._bin_r = np.empty(BINS, np.float32)
+        self._reach = np.empty(n * n, np.float32)
+        self._free = np.empty(n * n, bool)
+        r = max(0, int(point) - 1)
+        d = np.arange(-r, r + 1)
+        self._dots = (d[:, None] * n + d[None, :]).ravel()     # desplazamientos planos del punto
+        # rejilla y render (protegidos por _lock: los usan el hilo del LiDAR y los visores)
+        self._lock = threading.Lock()
+        self._tmp = np.empty((n, n), np.float32)
+        self._u8 = np.empty((n, n), np.uint8)
+        self._bgr = np.empty((n, n, 3), np.uint8)
+        self._lut = _make_lut()
+        self._jpeg: Dict[Tuple[int, int], Tuple[int, bytes]] = {}   # (w, h) → (seq, jpeg)
+        self._u8_seq = -1
+        # estado
+        self.seq = 0
+        self.ts = 0.0
+        self.bus = None
+        self.viewers = 0         # visores MJPEG
+        self.raw_clients = 0     # conexiones WS con ?map=1
+        self._raw_t = 0.0
+        self.encodes = 0
+        self.update_ms = Histogram()
+        self.render_ms = Histogram()
+
+    @classmethod
+    def from_env(cls) -> "OccupancyGrid":
+        g = os.getenv
+        return cls(size=int(g("LIDAR_MAP_SIZE", "640")), scale=float(g("LIDAR_MAP_SCALE", "100.0")),
+                   decay=float(g("LIDAR_MAP_DECAY", "0.94")), point=int(g("LIDAR_MAP_POINT", "2")),
+                   quality=int(g("LIDAR_MAP_QUALITY", "80")), raw_hz=float(g("LIDAR_MAP_WS_HZ", "2")),
+                   raw_step=int(g("LIDAR_MAP_WS_STEP", "2")),
+                   origin_m=(float(g("LIDAR_OFFSET_X", "0.0")), float(g("LIDAR_OFFSET_Y", "0.0"))))
+
+    # ------- actualización (hilo del LiDAR) -------
+    def update(self, scan: LidarScan) -> None:
+        t0 = time.perf_counter()
+        n, c, g = self.size, self._c, self._flat
+        k = scan.k
+        if k:
+            # alcance (px) por sector desde el LiDAR; el impacto más cercano manda
+            fx = (scan.x - self._ox) * self.scale
+            ly = (scan.y - self._oy) * self.scale
+            bins = (((np.arctan2(ly, fx) + math.pi) * (BINS / (2 * math.pi))).astype(np.int32)) % BINS
+            br = self._bin_r
+            br.fill(np.inf)
+            np.minimum.at(br, bins, np.hypot(fx, ly))
+            # sectores vacíos (vuelta poco densa): hereda el menor de sus vecinos
+            empty = np.isinf(br)
+            if empty.any():
+                fill = np.minimum(np.roll(br, 1), np.roll(br, -1))
+                br[empty] = fill[empty]
+            br[np.isinf(br)] = -1.0                              # sin retorno: desconocido
+            br -= 1.0                                            # libre hasta 1 px antes del impacto
+            # libres: celdas más cerca que el alcance de su sector
+            np.take(br, self._cell_bin, out=self._reach)
+            np.less(self._cell_r, self._reach, out=self._free)
+            # ocupadas: impacto (± LIDAR_MAP_POINT) en coordenadas de la rejilla
+            hc = np.rint(c - scan.y * self.scale).astype(np.int64)
+            hr = np.rint(c - scan.x * self.scale).astype(np.int64)
+            ok = (hc >= 0) & (hc < n) & (hr >= 0) & (hr < n)
+            hit = ((hr[ok] * n + hc[ok])[:, None] + self._dots).ravel()
+            hit = hit[(hit >= 0) & (hit < n * n)]
+        # la rejilla se muta bajo _lock: raw()/jpeg() la cuantizan desde otros hilos y
+        # sin él podrían cachear con el seq nuevo una vuelta a medio aplicar
+        with self._lock:
+            self.grid *= self.decay
+            if k:
+                np.add(g, L_FREE, out=g, where=self._free)
+                np.maximum(g, -L_MAX, out=g)
+                if hit.size:
+                    g[hit] += L_OCC                              # una vez por celda y vuelta
+                    g[hit] = np.minimum(g[hit], L_MAX)
+            self.seq += 1
+            self.ts = scan.ts
+        self.update_ms.observe((time.perf_counter() - t0) * 1000.0)
+        if self.raw_clients > 0 and self.bus is not None and (time.monotonic() - self._raw_t) >= self.raw_period:
+            self._raw_t = time.monotonic()
+            self.bus.publish_threadsafe("lidar/map", self.raw())
+
+    # ------- render -------
+    def _quantize_locked(self) -> np.ndarray:
+        if self._u8_seq != self.seq:
+            np.multiply(self.grid, 127.5 / L_MAX, out=self._tmp)
+            self._tmp += 127.5
+            np.copyto(self._u8, self._tmp, casting="unsafe")
+            self._u8_seq = self.seq
+        return self._u8
+
+    def raw(self) -> dict:
+        """Rejilla uint8 (0 libre, 128 desconocido, 255 ocupado) submuestreada para la UI."""
+        s = self.raw_step
+        with self._lock:
+            data = self._quantize_locked()[::s, ::s].tobytes()
+        side = -(-self.size // s)
+        return {"seq": self.seq, "ts": self.ts, "w": side, "h": side, "scale": self.scale / s,
+                "origin": [self._c // s, self._c // s], "data": data}
+
+    def jpeg(self, size: Optional[Tuple[int, int]] = None) -> Tuple[int, Optional[bytes]]:
+        """(seq, JPEG) del mapa actual; se codifica una sola vez por vuelta y tamaño."""
+        key = size or (self.size, self.size)
+        hit = self._jpeg.get(key)
+        seq = self.seq
+        if hit is not None and hit[0] == seq:
+            return hit
+        with self._lock:
+            hit = self._jpeg.get(key)
+            if hit is not None and hit[0] == seq:
+                return hit
+            t0 = time.perf_counter()
+            cv2.applyColorMap(self._quantize_locked(), self._lut, dst=self._bgr)
+            c = self._c
+            cv2.drawMarker(self._bgr, (c, c), (255, 200, 0), cv2.MARKER_TRIANGLE_UP, 12, 2)
+            img = self._bgr if key == (self.size, self.size) else cv2.resize(self._bgr, key, interpolation=cv2.INTER_AREA)
+            ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+            out = (seq, buf.tobytes() if ok else None)
+            # solo se conserva la última vuelta por tamaño
+            self._jpeg[key] = out
+            self.encodes += 1
+            self.render_ms.observe((time.perf_counter() - t0) * 1000.0)
+            return out
+
+    def collect_metrics(self, m) -> None:
+        m.counter("lidar_map_encodes", self.encodes, "JPEG del mapa codificados")
+        m.histogram("lidar_map_update", self.update_ms, "Actualización del mapa por vuelta")
+        m.histogram("lidar_map_render", self.render_ms, "Render + JPEG del mapa")
+
+    def stats(self) -> dict:
+        return {"seq": self.seq, "size": self.size, "scale": self.scale, "decay": self.decay,
+                "viewers": self.viewers, "raw_clients": self.raw_clients, "encodes": self.encodes,
+                "update_ms": self.update_ms.snapshot(), "render_ms": self.render_ms.snapshot()}
+
+lidar_map = OccupancyGrid.from_env()
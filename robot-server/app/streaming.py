@@ -1,49 +1,212 @@
 # app/streaming.py
-import cv2, numpy as np, time
+import asyncio, cv2, itertools, numpy as np, threading, time
 from .sensors.camera import camera
+from .sensors.lidar_map import OccupancyGrid
 from .IA import ColorRecognizer
 from .IA.face_recognition import FaceDetector 
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
+from .core.metrics import Counter, Histogram
 
 BOUNDARY = b"--frame"
 _recog = ColorRecognizer()
 _face = FaceDetector()                                
 
+# supresión de escena estática: diferencia media (0..255) en gris a esta resolución
+STATIC_SIZE = (64, 48)
+CHROMA = ("full", "low", "gray")
+BASELINE_EVERY = 30   # cada N partes se codifica también el frame completo (estimar bytes ahorrados)
+# chroma=low: croma submuestreado 4:2:0 en el propio codificador, sin tocar píxeles (es lo
+# que hace libjpeg por defecto; se fija por si la build usa otro). 4:1:1 no compensa: en
+# libjpeg-turbo no tiene ruta SIMD y no ahorra bytes frente a 4:2:0. Tampoco se usa
+# IMWRITE_JPEG_CHROMA_QUALITY: con calidades de luma y croma distintas OpenCV desactiva el
+# submuestreo (4:4:4) y el JPEG sale mayor.
+_LOW_CHROMA = ([cv2.IMWRITE_JPEG_SAMPLING_FACTOR, cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420]
+               if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420") else [])
+
+class MjpegStats:
+    """Contadores de los streams MJPEG (`camera`, `lidar_map`) para /metrics."""
+    def __init__(self):
+        self.viewers: Dict[str, int] = {"camera": 0}
+        self.frames: Dict[str, Counter] = {"camera": Counter(), "lidar_map": Counter()}
+        self.bytes: Dict[str, Counter] = {"camera": Counter(), "lidar_map": Counter()}
+        self.skipped = Counter()        # frames de cámara no enviados por escena estática
+        self.saved = Counter()          # bytes estimados ahorrados frente al stream completo
+        self.analyze_ms: Dict[str, Histogram] = {"color": Histogram(), "face": Histogram()}
+        # captura del frame → el servidor pide el siguiente (parte entregada al socket)
+        self.latency_ms = Histogram((5, 10, 20, 33, 50, 66, 100, 150, 200, 300, 500, 1000, 2000))
+        # los generadores de cámara corren en hilos del threadpool: sin lock, dos altas/bajas
+        # simultáneas pueden pisarse y el contador de visores queda desviado para siempre
+        self._viewers_lock = threading.Lock()
+
+    def add_viewer(self, stream: str, n: int) -> None:
+        with self._viewers_lock:
+            self.viewers[stream] = self.viewers.get(stream, 0) + n
+
+    def sent(self, stream: str, n: int) -> None:
+        self.frames[stream].inc()
+        self.bytes[stream].inc(n)
+
+    def collect_metrics(self, m) -> None:
+        for name in self.frames:
+            m.gauge("mjpeg_viewers", self.viewers.get(name, 0), "Visores MJPEG conectados", stream=name)
+        for name, c in self.frames.items():
+            m.counter("mjpeg_frames_sent", c.value, "Partes MJPEG enviadas", stream=name)
+        for name, c in self.bytes.items():
+            m.counter("mjpeg_bytes_sent", c.value, "Bytes MJPEG enviados", stream=name)
+        m.counter("mjpeg_frames_skipped", self.skipped.value, "Frames suprimidos por escena estática",
+                  stream="camera")
+        m.counter("mjpeg_bytes_saved", self.saved.value,
+                  "Bytes ahorrados (estimados) frente al frame completo a color", stream="camera")
+        for kind, h in self.analyze_ms.items():
+            m.histogram("analyzer", h, "Tiempo de cada analizador", analyzer=kind, where="stream")
+        m.histogram("capture_to_send", self.latency_ms, "Latencia captura → envío", path="mjpeg")
+
+MJPEG = MjpegStats()
+SESSIONS: Set["StreamSession"] = set()
+_ids = itertools.count(1)
+
+class StreamSession:
+    """Estado y contadores de un visor de /stream.mjpg (ver GET /stream/stats)."""
+    def __init__(self, mode, static, heartbeat, crop, chroma, quality):
+        self.id = next(_ids)
+        self.params = {"mode": mode, "static": static, "heartbeat": heartbeat,
+                       "crop": list(crop) if crop else None, "chroma": chroma, "quality": quality}
+        self.t_open = time.time()
+        self.frames = self.skipped = self.heartbeats = 0
+        self.bytes_sent = 0
+        self.bytes_saved = 0.0
+        self.ratio = 1.0              # bytes del frame completo / bytes enviados (última muestra)
+        self.last_len = 0
+
+    def stats(self) -> dict:
+        full = self.bytes_sent + self.bytes_saved
+        return {"id": self.id, **self.params, "uptime_s": round(time.time() - self.t_open, 1),
+                "frames": self.frames, "skipped": self.skipped, "heartbeats": self.heartbeats,
+                "bytes_sent": self.bytes_sent, "bytes_saved": int(self.bytes_saved),
+                "saved_pct": round(100.0 * self.bytes_saved / full, 1) if full else 0.0}
+
+def _crop_box(shape, crop) -> Tuple[int, int, int, int]:
+    h, w = shape[:2]
+    x, y, cw, ch = crop
+    x0, y0 = int(x * w), int(y * h)
+    return x0, y0, max(x0 + 1, min(w, int(round((x + cw) * w)))), max(y0 + 1, min(h, int(round((y + ch) * h))))
+
+def _static_small(frame: np.ndarray) -> np.ndarray:
+    return cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), STATIC_SIZE, interpolation=cv2.INTER_AREA)
+
+def _render(frame: np.ndarray, mode: Optional[str], overlay: bool, chroma: str, quality: int) -> bytes:
+    """Trabajo por frame enviado: análisis sobre el frame (sin ida y vuelta JPEG) → croma → un JPEG."""
+    frame_out = frame
+    if mode in ("color", "face"):
+        t0 = time.perf_counter()
+        if mode == "color":
+            res = _recog.process_frame(frame)
+            frame_out = res.frame if overlay else frame
+        else:  # mode == "face"
+            frame_out = _face.process_frame(frame, draw=overlay).frame
+        MJPEG.analyze_ms[mode].observe((time.perf_counter() - t0) * 1000.0)
+    if chroma == "gray":
+        frame_out = cv2.cvtColor(frame_out, cv2.COLOR_BGR2GRAY)
+    return camera.encode_jpeg(frame_out, quality=quality, params=_LOW_CHROMA if chroma == "low" else ())
+
 def mjpeg_generator(mode: Optional[str] = None,
                     color: Optional[str] = None,
                     overlay: bool = True,
-                    quality: int = 80):
-
+                    quality: int = 80,
+                    static: float = 0.0,
+                    heartbeat: float = 2.0,
+                    crop: Optional[Tuple[float, float, float, float]] = None,
+                    chroma: str = "full",
+                    stop: Optional[threading.Event] = None):
+    """
+    static > 0: no envía frames cuya diferencia media (gris 64x48, 0..255) con
+    el último enviado sea menor; reenvía uno cada `heartbeat` s como latido.
+    crop: (x, y, w, h) en fracciones del frame; se envía a resolución nativa.
+    chroma: full | low (croma reducido) | gray.
+    stop: lo marca la ruta al desconectarse el cliente (el generador corre en el threadpool).
+    """
     if mode == "color":
         _recog.set_current_color(color)
 
-    while True:
-        try:
-            jpg = camera.snapshot_jpeg(quality=quality)
-
-            if mode in ("color", "face"):
-                # decodificar a BGR
-                arr = np.frombuffer(jpg, dtype=np.uint8)
-                frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-                if frame is None:
-                    payload = jpg
-                else:
-                    if mode == "color":
-                        res = _recog.process_frame(frame)
-                        frame_out = res.frame if overlay else frame
-                    else:  # mode == "face"
-                        fres = _face.process_frame(frame, draw=overlay)
-                        frame_out = fres.frame
-
-                    ok, buf = cv2.imencode(".jpg", frame_out, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
-                    payload = buf.tobytes() if ok else jpg
-            else:
-                payload = jpg
-
-            yield (BOUNDARY +
-                   b"\r\nContent-Type: image/jpeg\r\nContent-Length: " +
-                   str(len(payload)).encode() + b"\r\n\r\n" + payload + b"\r\n")
-
-        except Exception:
-            time.sleep(0.03)
-            continue
\ No newline at end of file
+    sess = StreamSession(mode, static, heartbeat, crop, chroma, quality)
+    variant = crop is not None or chroma != "full"
+    ref_small: Optional[np.ndarray] = None
+    t_sent = 0.0
+    MJPEG.add_viewer("camera", 1)
+    SESSIONS.add(sess)
+    try:
+        while stop is None or not stop.is_set():
+            try:
+                full = camera.read()
+                ts = camera.frame_ts
+                frame = full
+                if crop is not None:
+                    x0, y0, x1, y1 = _crop_box(full.shape, crop)
+                    frame = full[y0:y1, x0:x1]
+
+                beat = False
+                if static > 0:
+                    small = _static_small(frame)
+                    if ref_small is not None and float(cv2.absdiff(small, ref_small).mean()) < static:
+                        if time.monotonic() - t_sent < heartbeat:
+                            sess.skipped += 1
+                            MJPEG.skipped.inc()
+                            est = sess.last_len * sess.ratio
+                            sess.bytes_saved += est
+                            MJPEG.saved.inc(int(est))
+                            continue
+                        beat = True
+                    else:
+                        ref_small = small   # referencia = último frame con cambios enviado
+
+                payload = _render(frame, mode, overlay, chroma, quality)
+
+                if variant and sess.frames % BASELINE_EVERY == 0:
+                    # muestra de lo que costaría el frame completo a color
+                    sess.ratio = len(camera.encode_jpeg(full, quality=quality)) / max(1, len(payload))
+                part = _part(payload)
+                yield part
+                # el servidor vuelve a pedir cuando la parte anterior ya salió
+                t_sent = time.monotonic()
+                sess.frames += 1
+                sess.heartbeats += beat
+                sess.bytes_sent += len(part)
+                sess.last_len = len(part)
+                if variant:
+                    est = len(part) * (sess.ratio - 1.0)
+                    sess.bytes_saved += est
+                    MJPEG.saved.inc(int(est))
+                MJPEG.sent("camera", len(part))
+                MJPEG.latency_ms.observe((time.monotonic() - ts) * 1000.0)
+
+            except Exception:
+                time.sleep(0.03)
+                continue
+    finally:
+        SESSIONS.discard(sess)
+        MJPEG.add_viewer("camera", -1)
+
+def _part(payload: bytes) -> bytes:
+    return (BOUNDARY + b"\r\nContent-Type: image/jpeg\r\nContent-Length: " +
+            str(len(payload)).encode() + b"\r\n\r\n" + payload + b"\r\n")
+
+async def lidar_map_generator(grid: OccupancyGrid, fps: float = 8.0,
+                              size: Optional[Tuple[int, int]] = None):
+    """MJPEG del mapa: solo emite si hay vuelta nueva; el JPEG es compartido entre visores."""
+    period = 1.0 / max(0.5, min(30.0, fps))
+    grid.viewers += 1
+    MJPEG.viewers["lidar_map"] = grid.viewers
+    last = -1
+    try:
+        while True:
+            if grid.seq != last:
+                seq, jpg = await asyncio.to_thread(grid.jpeg, size)
+                if jpg is not None and seq != last:
+                    last = seq
+                    part = _part(jpg)
+                    yield part
+                    MJPEG.sent("lidar_map", len(part))
+            await asyncio.sleep(period)
+    finally:
+        grid.viewers -= 1
+        MJPEG.viewers["lidar_map"] = grid.viewers
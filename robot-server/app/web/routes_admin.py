@@ -0,0 +1,70 @@
+# app/web/routes_admin.py
+"""
+Diagnóstico en campo, solo con ADMIN_TOKEN (cabecera `X-Admin-Token` o
+`Authorization: Bearer <token>`). Sin ADMIN_TOKEN configurado, todo responde 403.
+"""
+import asyncio, hmac, os, time
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import Optional
+
+from ..core.profiler import collapsed, native_thread_cpu, profiler, speedscope, summary, thread_cpu_times
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+except Exception:
+    import json
+    _dumps = lambda o: json.dumps(o, separators=(",", ":")).encode()
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None),
+                  authorization: Optional[str] = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="endpoints de administración deshabilitados (ADMIN_TOKEN)")
+    token = x_admin_token
+    if token is None and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="token de administración inválido")
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profile")
+async def profile(seconds: float = 5.0, hz: float = 100.0, mode: str = "cpu", format: str = "collapsed"):
+    """
+    Muestrea todos los hilos del proceso durante `seconds`.
+    format: collapsed (texto) | speedscope (JSON para speedscope.app) | json (resumen + CPU por hilo).
+    """
+    if format not in ("collapsed", "speedscope", "json"):
+        raise HTTPException(status_code=400, detail="format debe ser collapsed, speedscope o json")
+    try:
+        res = await asyncio.to_thread(profiler.run, seconds, hz, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if format == "json":
+        return {"ok": True, **summary(res)}
+    if format == "speedscope":
+        return Response(content=_dumps(speedscope(res, f"hexamind {stamp}")), media_type="application/json",
+                        headers={"Content-Disposition": f'attachment; filename="hexamind-{stamp}.speedscope.json"'})
+    return Response(content=collapsed(res), media_type="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": f'attachment; filename="hexamind-{stamp}.collapsed.txt"'})
+
+@router.get("/threads")
+async def threads(seconds: float = 1.0):
+    """CPU por hilo (Python y nativos) en una ventana de `seconds`; sin muestreo de pilas."""
+    seconds = max(0.1, min(30.0, seconds))
+    py0, nat0, w0 = thread_cpu_times(), native_thread_cpu(), time.monotonic()
+    await asyncio.sleep(seconds)
+    py1, nat1, wall = thread_cpu_times(), native_thread_cpu(), time.monotonic() - w0
+    pct = lambda d: round(100.0 * d / wall, 1)
+    py = [{"thread": v["name"], "tid": v["tid"], "cpu_pct": pct(v["cpu_s"] - py0[k]["cpu_s"])}
+          for k, v in py1.items() if k in py0 and v["cpu_s"] is not None and py0[k]["cpu_s"] is not None]
+    nat = [{"tid": tid, "comm": comm, "cpu_pct": pct(cpu - nat0[tid][1])}
+           for tid, (comm, cpu) in nat1.items() if tid in nat0]
+    py.sort(key=lambda r: -r["cpu_pct"])
+    nat.sort(key=lambda r: -r["cpu_pct"])
+    return {"ok": True, "seconds": round(wall, 3), "python": py, "native": [r for r in nat if r["cpu_pct"] > 0]}
@@ -1,9 +1,10 @@
-from fastapi import APIRouter
-from pydantic import BaseModel, conint
-from typing import Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field, conint
+from typing import List, Optional
 import asyncio
 
 from ..motion.controller_vel import MotionControllerVel
+from ..motion.plan import MAX_SEGMENT_MS, MAX_SEGMENTS, MotionPlan, Segment
 
 router = APIRouter(prefix="/motion", tags=["motion"])
 _controller: MotionControllerVel | None = None
@@ -32,7 +33,53 @@ def stop():
 
 @router.get("/status")
 def status():
-    return {"ok": True, "state": ctl().snapshot()}
+    c = ctl()
+    return {"ok": True, "state": c.snapshot(), "loop": c.loop_stats()}
+
+@router.get("/driver")
+def driver(calls: int = 0):
+    c = ctl()
+    out = {"ok": True, "driver": c.driver_stats()}
+    if calls > 0 and hasattr(c.bot, "last_calls"):
+        out["calls"] = c.bot.last_calls(min(calls, 1000))
+    return out
+
+# -------- Planes temporizados (ejecutados en el hilo de control) --------
+class SegmentBody(BaseModel):
+    x: conint(ge=-30, le=30) = 0
+    y: conint(ge=-30, le=30) = 0
+    z: conint(ge=-30, le=30) = 0
+    duration_ms: conint(ge=1, le=MAX_SEGMENT_MS)
+    ramp_ms: conint(ge=0, le=MAX_SEGMENT_MS) = 0
+    speed: Optional[conint(ge=1, le=5)] = None
+
+class PlanBody(BaseModel):
+    segments: List[SegmentBody] = Field(..., min_length=1, max_length=MAX_SEGMENTS)
+    name: str = ""
+
+def _run(segments: List[Segment], name: str = ""):
+    try:
+        plan = MotionPlan(segments, name=name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"ok": True, "plan": ctl().run_plan(plan)}
+
+@router.post("/plan")
+def run_plan(b: PlanBody):
+    return _run([Segment(**s.model_dump()) for s in b.segments], b.name)
+
+@router.get("/plan")
+def plan_status():
+    return {"ok": True, "plan": ctl().plan_status()}
+
+@router.delete("/plan")
+def cancel_plan():
+    return {"ok": True, "plan": ctl().cancel_plan()}
+
+@router.post("/move")
+def move(b: SegmentBody):
+    # atajo: un único segmento de `duration_ms`; al terminar el robot se detiene
+    return _run([Segment(**b.model_dump())], "move")
 
 # -------- Compatibilidad (alias “por pasos”) --------
 # Mapeamos a vectores unitarios, el bucle re-emite continuo sin colas
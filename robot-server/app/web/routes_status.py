@@ -1,18 +1,32 @@
 # app/web/routes_status.py
 import time
-from fastapi import APIRouter, Response
+import numpy as np
+from fastapi import APIRouter, HTTPException, Response
 from ..core.bus import Bus, last_or
+from ..core.metrics import REGISTRY
+from ..core.alerts import AlertEngine
+from ..core.history import TelemetryHistory
+from ..core.loopwatch import LoopWatchdog
+from ..core.sensor_history import SensorHistory
+from ..IA.color_recognition import ColorRecognizer
 from ..sensors.camera import camera, get_telemetry_snapshot  # ajusta import si no moviste
+from ..sensors.lidar import lidar
+from ..sensors.lidar_map import lidar_map
 from typing import Optional
 router = APIRouter()
 
 BUS: Optional[Bus] = None
+ALERTS: Optional[AlertEngine] = None
+HISTORY: Optional[TelemetryHistory] = None
+LOOPWATCH: Optional[LoopWatchdog] = None
+SENSORS: Optional[SensorHistory] = None
 
 T0 = time.time()
+_HEAT = ColorRecognizer()   # solo para /vision/heatmap (máscaras + integrales bajo demanda)
 
 @router.get("/health")
 async def health():
-    tel = await last_or(BUS, "telemetry", get_telemetry_snapshot()) if BUS else get_telemetry_snapshot()
+    tel = last_or(BUS, "telemetry", get_telemetry_snapshot()) if BUS else get_telemetry_snapshot()
     up = time.time() - T0
     return {
         "ok": True,
@@ -21,6 +35,100 @@ async def health():
         "fps_current": tel.get("fps", 0.0),
     }
 
+@router.get("/alerts")
+def alerts():
+    if ALERTS is None:
+        return {"ok": False, "active": [], "rules": []}
+    return {"ok": True, "active": ALERTS.active(), "rules": ALERTS.stats()}
+
+@router.get("/telemetry/history")
+def telemetry_history(fields: Optional[str] = None, since: Optional[float] = None, step: Optional[float] = None):
+    if HISTORY is None:
+        raise HTTPException(status_code=503, detail="historial no disponible")
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    try:
+        data = HISTORY.query(names, since=since, step=step)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"{e.args[0]}. Usa {HISTORY.fields}")
+    return {"ok": True, "samples": len(HISTORY), **data}
+
+@router.get("/metrics")
+def metrics():
+    """Exposición en formato de texto de Prometheus (colectores en core.metrics.REGISTRY)."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/loop")
+def loop_status():
+    """Lag del event loop y sitios que lo bloquearon (pila capturada durante el bloqueo)."""
+    if LOOPWATCH is None:
+        raise HTTPException(status_code=503, detail="vigilante del loop no disponible")
+    return {"ok": True, **LOOPWATCH.stats()}
+
+def _describe(v):
+    # los arrays (frames, profundidad) no viajan por HTTP: solo su forma
+    if isinstance(v, np.ndarray):
+        return {"shape": list(v.shape), "dtype": str(v.dtype)}
+    return v
+
+@router.get("/sensors")
+def sensors_status():
+    """Streams de la historia de sensores: muestras, ventana cubierta y memoria."""
+    if SENSORS is None:
+        raise HTTPException(status_code=503, detail="historia de sensores no disponible")
+    return {"ok": True, "now": time.monotonic(), **SENSORS.stats()}
+
+@router.get("/sensors/at")
+def sensors_at(streams: Optional[str] = None, t: Optional[float] = None, ago: float = 0.0,
+               mode: str = "at", tol: Optional[float] = None):
+    """
+    Muestra de cada stream en un instante: `t` en time.monotonic() del servidor
+    (p. ej. el `ts` de un resultado vision/*) o `ago` segundos antes de ahora.
+    """
+    if SENSORS is None:
+        raise HTTPException(status_code=503, detail="historia de sensores no disponible")
+    names = [n.strip() for n in streams.split(",") if n.strip()] if streams else None
+    unknown = [n for n in names or () if SENSORS.get(n) is None]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Streams desconocidos: {unknown}. Usa {SENSORS.names()}")
+    when = t if t is not None else time.monotonic() - max(0.0, ago)
+    try:
+        fused = SENSORS.fuse(when, names, mode=mode, tol=tol)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"ok": True, "t": when, "mode": mode, "samples": {
+        n: None if smp is None else {"t": smp.t, "dt_s": round(smp.t - when, 4), "value": _describe(smp.value)}
+        for n, smp in fused.items()}}
+
+@router.get("/lidar")
+def lidar_status():
+    scan = BUS.last("lidar/scan") if BUS else None
+    return {"ok": lidar.enabled, "lidar": lidar.stats(), "map": lidar_map.stats(), "scan": scan}
+
+@router.get("/vision/heatmap")
+def vision_heatmap(grid: str = "16x12", rois: Optional[str] = None, max_side: int = 320):
+    """
+    Mapa de color del frame actual: % por celda de la rejilla para cada color y,
+    con `rois=x,y,w,h;x,y,w,h...` (píxeles del frame), la fracción de cada color
+    en cada ROI. Las máscaras se calculan una vez; cada ROI cuesta O(1).
+    Con VISION_WORKERS=heatmap lo mismo sale por el bus en `vision/heatmap`.
+    """
+    try:
+        cols, rows = (int(v) for v in grid.lower().split("x"))
+        boxes = [tuple(int(v) for v in r.split(",")) for r in rois.split(";") if r.strip()] if rois else []
+    except ValueError:
+        raise HTTPException(status_code=400, detail="grid debe ser CxF (p. ej. 16x12) y rois x,y,w,h;...")
+    if not (1 <= cols <= 64 and 1 <= rows <= 64):
+        raise HTTPException(status_code=400, detail="grid entre 1x1 y 64x64")
+    if any(len(b) != 4 or b[2] <= 0 or b[3] <= 0 for b in boxes) or len(boxes) > 1024:
+        raise HTTPException(status_code=400, detail="rois: hasta 1024 cajas x,y,w,h con w,h > 0")
+    cm = _HEAT.color_map(camera.read(), max_side=max(16, max_side))
+    out = {"ok": True, "ts": camera.frame_ts, **cm.summary(cols, rows)}
+    if boxes:
+        q = cm.query(boxes)
+        out["rois"] = [{"roi": list(b), **{c: round(float(q[c][i]), 4) for c in cm.colors}}
+                       for i, b in enumerate(boxes)]
+    return out
+
 @router.get("/snapshot.jpg")
 def snapshot_jpg(quality: int = 85):
     jpg = camera.snapshot_jpeg(quality=quality)
@@ -1,8 +1,12 @@
 # app/web/routes_stream.py
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
-from ..streaming import mjpeg_generator 
+from starlette.concurrency import iterate_in_threadpool
+from ..streaming import CHROMA, MJPEG, SESSIONS, mjpeg_generator, lidar_map_generator
+from ..sensors.lidar import lidar
+from ..sensors.lidar_map import lidar_map
 from typing import Optional
+import threading
 
 router = APIRouter()
 
@@ -12,7 +16,11 @@ def stream_mjpg(
     mode: Optional[str] = None,
     color: Optional[str] = None,
     overlay: bool = True,
-    quality: int = 80
+    quality: int = 80,
+    static: float = 0.0,
+    heartbeat: float = 2.0,
+    crop: Optional[str] = None,
+    chroma: str = "full",
 ):
     if mode is not None:
         mode = mode.lower()
@@ -27,19 +35,63 @@ def stream_mjpg(
             raise HTTPException(status_code=400, detail="param 'color' solo aplica con mode=color")
     if not (10 <= quality <= 95):
         raise HTTPException(status_code=400, detail="quality debe estar entre 10 y 95")
+    if not (0.0 <= static <= 64.0):
+        raise HTTPException(status_code=400, detail="static debe estar entre 0 y 64")
+    if not (0.2 <= heartbeat <= 60.0):
+        raise HTTPException(status_code=400, detail="heartbeat debe estar entre 0.2 y 60 s")
+    chroma = chroma.lower()
+    if chroma not in CHROMA:
+        raise HTTPException(status_code=400, detail=f"chroma inválido. Usa {list(CHROMA)}")
+    box = None
+    if crop:
+        try:
+            box = tuple(float(v) for v in crop.split(","))
+        except ValueError:
+            box = ()
+        if len(box) != 4 or not (0 <= box[0] < 1 and 0 <= box[1] < 1 and box[2] > 0 and box[3] > 0
+                                 and box[0] + box[2] <= 1.0001 and box[1] + box[3] <= 1.0001):
+            raise HTTPException(status_code=400, detail="crop debe ser x,y,w,h en fracciones (0..1) del frame")
 
-    gen = mjpeg_generator(mode=mode, color=color, overlay=overlay, quality=quality)
+    stop = threading.Event()
+    gen = mjpeg_generator(mode=mode, color=color, overlay=overlay, quality=quality,
+                          static=static, heartbeat=heartbeat, crop=box, chroma=chroma, stop=stop)
 
     async def _stream():
+        # el generador corre en el threadpool; el servidor no siempre falla el send
+        # tras una desconexión, así que se comprueba en cada parte (con escena
+        # estática, como mucho cada `heartbeat`) y se avisa al hilo con `stop`
         try:
-            async for chunk in gen:
+            async for chunk in iterate_in_threadpool(gen):
                 if await request.is_disconnected():
                     break
                 yield chunk
-        except Exception:
-            pass
+        finally:
+            stop.set()
+
+    return StreamingResponse(_stream(), media_type="multipart/x-mixed-replace; boundary=frame")
 
-    return StreamingResponse(gen, media_type="multipart/x-mixed-replace; boundary=frame")
+@router.get("/stream/stats")
+def stream_stats():
+    """Visores activos de /stream.mjpg con frames suprimidos y bytes ahorrados por stream."""
+    return {"ok": True, "totals": {"frames": MJPEG.frames["camera"].value, "skipped": MJPEG.skipped.value,
+                                   "bytes_sent": MJPEG.bytes["camera"].value, "bytes_saved": MJPEG.saved.value},
+            "streams": [sess.stats() for sess in sorted(SESSIONS, key=lambda x: x.id)]}
+
+@router.get("/stream/lidar_map")
+def stream_lidar_map(fps: float = 8.0, size: Optional[str] = None):
+    if not lidar.enabled:
+        raise HTTPException(status_code=503, detail="LiDAR desactivado (LIDAR_BACKEND)")
+    dims = None
+    if size:
+        try:
+            w, h = (int(v) for v in size.lower().split("x"))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="size debe ser WxH")
+        if not (32 <= w <= 2048 and 32 <= h <= 2048):
+            raise HTTPException(status_code=400, detail="size fuera de rango (32..2048)")
+        dims = (w, h)
+    return StreamingResponse(lidar_map_generator(lidar_map, fps, dims),
+                             media_type="multipart/x-mixed-replace; boundary=frame")
 
 
 from fastapi import APIRouter, Request, HTTPException
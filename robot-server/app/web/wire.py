@@ -0,0 +1,190 @@
+# app/web/wire.py
+"""
+Serialización compartida para el WebSocket: cada (tópico, versión) se
+codifica una sola vez por codec y los bytes se reutilizan en todas las
+conexiones. Los lotes se arman concatenando mensajes ya codificados (sin
+volver a serializar) y los tópicos de estado pueden ir como deltas.
+
+Codecs: "json" (orjson si está instalado; si no, json estándar; frames de
+texto, se cachea ya como str) y "msgpack" (opcional, frames binarios).
+Los campos `bytes` (p. ej. la rejilla de `lidar/map`) viajan como binario en
+msgpack y como base64 en JSON.
+"""
+import base64, json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+    _ORJSON_OK = True
+except Exception:
+    _ORJSON_OK = False
+
+try:
+    import msgpack
+    _MSGPACK_OK = True
+except Exception:
+    _MSGPACK_OK = False
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, (bytes, bytearray, memoryview)):
+        return base64.b64encode(v).decode("ascii")
+    return str(v)
+
+def _json_dumps(obj: Any) -> str:
+    if _ORJSON_OK:
+        return orjson.dumps(obj, default=_json_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+def _msgpack_dumps(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True, default=str)
+
+def _json_loads(buf: Union[str, bytes]) -> Any:
+    return orjson.loads(buf) if _ORJSON_OK else json.loads(buf)
+
+def _msgpack_loads(buf: bytes) -> Any:
+    return msgpack.unpackb(buf, raw=False)
+
+def _msgpack_array_header(n: int) -> bytes:
+    if n < 16:
+        return bytes((0x90 | n,))
+    if n < 0x10000:
+        return b"\xdc" + n.to_bytes(2, "big")
+    return b"\xdd" + n.to_bytes(4, "big")
+
+class Codec:
+    def __init__(self, name: str):
+        if name == "msgpack" and not _MSGPACK_OK:
+            raise ValueError("msgpack no está instalado")
+        if name not in ("json", "msgpack"):
+            raise ValueError(f"codec desconocido: {name}")
+        self.name = name
+        self.binary = name == "msgpack"
+        self.dumps = _msgpack_dumps if self.binary else _json_dumps
+
+    def loads(self, text: Optional[str], data: Optional[bytes]) -> Any:
+        """Decodifica un frame entrante; un cliente msgpack puede enviar también JSON de texto."""
+        if data is not None and self.binary:
+            return _msgpack_loads(data)
+        return _json_loads(text if text is not None else data)
+
+    def batch(self, parts: List[Union[str, bytes]]) -> Union[str, bytes]:
+        """Arreglo de mensajes ya codificados, sin re-serializar."""
+        if self.binary:
+            return _msgpack_array_header(len(parts)) + b"".join(parts)
+        return "[" + ",".join(parts) + "]"
+
+def available_codecs() -> List[str]:
+    return ["json"] + (["msgpack"] if _MSGPACK_OK else [])
+
+def _dict_delta(prev: dict, cur: dict) -> Tuple[dict, List[str]]:
+    changed = {k: v for k, v in cur.items() if k not in prev or prev[k] != v}
+    removed = [k for k in prev if k not in cur]
+    return changed, removed
+
+def apply_delta(state: Dict[str, dict], msg: dict) -> Optional[dict]:
+    """
+    Lado cliente: estado del tópico tras un mensaje `full` ({"data","v"}) o
+    `delta` ({"delta","del","v"}). `state` guarda el último estado por tópico;
+    un delta sin estado previo devuelve None (hay que esperar al siguiente full).
+    """
+    topic = msg.get("topic")
+    if "delta" not in msg:
+        data = msg.get("data")
+        if "v" in msg and isinstance(data, dict):
+            state[topic] = dict(data)
+        return data
+    cur = state.get(topic)
+    if cur is None:
+        return None
+    cur.update(msg["delta"])
+    for k in msg.get("del") or ():
+        cur.pop(k, None)
+    return cur
+
+class _TopicCache:
+    __slots__ = ("ver", "data", "prev_ver", "prev_data", "encoded")
+
+    def __init__(self):
+        self.ver = -1
+        self.data = None
+        self.prev_ver = -1
+        self.prev_data = None
+        self.encoded: Dict[Tuple[str, str], Union[str, bytes]] = {}   # (codec, "full"|"delta"|"plain")
+
+class Broadcaster:
+    """
+    Caché de codificación por tópico. La versión la asigna el Bus al publicar;
+    si el dato pedido ya no es el último del Bus (consumidor atrasado) se
+    codifica sin caché.
+    """
+    def __init__(self, bus=None):
+        self.bus = bus
+        self._topics: Dict[str, _TopicCache] = {}
+        self.encodes = 0
+        self.hits = 0
+        self.deltas = 0
+
+    def _entry(self, topic: str, data: Any) -> Tuple[Optional[_TopicCache], int]:
+        bus = self.bus
+        if bus is None or bus.last(topic) is not data:
+            return None, -1
+        ver = bus.version(topic)
+        tc = self._topics.get(topic)
+        if tc is None:
+            tc = self._topics[topic] = _TopicCache()
+        if tc.ver != ver:
+            if tc.ver == ver - 1:
+                tc.prev_ver, tc.prev_data = tc.ver, tc.data
+            else:
+                tc.prev_ver, tc.prev_data = -1, None
+            tc.ver, tc.data = ver, data
+            tc.encoded = {}
+        return tc, ver
+
+    def _encode(self, tc: Optional[_TopicCache], codec: Codec, kind: str, build) -> Union[str, bytes]:
+        key = (codec.name, kind)
+        if tc is not None:
+            buf = tc.encoded.get(key)
+            if buf is not None:
+                self.hits += 1
+                return buf
+        buf = codec.dumps(build())
+        self.encodes += 1
+        if tc is not None:
+            tc.encoded[key] = buf
+        return buf
+
+    def message(self, topic: str, data: Any, codec: Codec,
+                last_ver: Optional[Dict[str, int]] = None) -> Union[str, bytes]:
+        """
+        Mensaje codificado para una conexión. Si `last_ver` (versión enviada por
+        tópico a esa conexión) no es None, el tópico es dict y la conexión tiene
+        la versión anterior, se envía delta: {"topic","delta","del","v"}.
+        """
+        tc, ver = self._entry(topic, data)
+        if last_ver is None:
+            return self._encode(tc, codec, "plain", lambda: {"topic": topic, "data": data})
+
+        if (tc is not None and isinstance(data, dict) and isinstance(tc.prev_data, dict)
+                and last_ver.get(topic) == tc.prev_ver):
+            def build():
+                changed, removed = _dict_delta(tc.prev_data, data)
+                return {"topic": topic, "delta": changed, "del": removed, "v": ver}
+            buf = self._encode(tc, codec, "delta", build)
+            self.deltas += 1
+        else:
+            buf = self._encode(tc, codec, "full", lambda: {"topic": topic, "data": data, "v": ver})
+        last_ver[topic] = ver
+        return buf
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.encodes + self.hits
+        return {
+            "encodes": self.encodes,
+            "hits": self.hits,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "deltas": self.deltas,
+            "codecs": available_codecs(),
+            "orjson": _ORJSON_OK,
+        }
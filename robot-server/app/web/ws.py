@@ -1,13 +1,24 @@
 # app/web/ws.py
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 import asyncio, time
-from typing import Optional
-from ..core.bus import Bus
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+from ..core.bus import Bus, LATEST, topic_matches
+from ..core.metrics import Counter, Histogram
 from ..core.settings import WS_RATE_HZ
 from ..motion.controller_vel import MotionControllerVel
+from ..sensors.lidar_map import lidar_map
+from .wire import Broadcaster, Codec
 
 ws_app = FastAPI()
 BUS: Optional[Bus] = None
+BROADCAST = Broadcaster()   # caché de codificación compartida por todas las conexiones
+
+TOPICS = ["telemetry", "alert", "mode", "ui_event", "vision/*", "motion/plan", "motion/reflex", "lidar/scan"]
+# Estado (se coalesce: solo interesa el último); los eventos (alert, ui_event) no se pierden
+COALESCED = {"telemetry": LATEST, "mode": LATEST, "vision/*": LATEST, "motion/plan": LATEST,
+             "lidar/scan": LATEST}
+IN_HZ = 30.0   # rate limit suave para publicaciones genéricas del cliente al bus
 
 # Singleton perezoso del controlador (por si el lifespan no lo inyecta)
 _controller: Optional[MotionControllerVel] = None
@@ -19,96 +30,254 @@ def ctl() -> MotionControllerVel:
         _controller.start(asyncio.get_event_loop())
     return _controller
 
+CONNECTIONS: Set["WsConnection"] = set()
+# métricas del módulo (un único escritor: el event loop)
+OPENED = Counter()
+SEND_MS = Histogram()
+SEND_BYTES = Counter()
+# captura del frame (ts de vision/*) → mensaje enviado al cliente
+LATENCY_MS = Histogram((5, 10, 20, 33, 50, 66, 100, 150, 200, 300, 500, 1000, 2000))
+
+def _is_state(topic: str) -> bool:
+    return any(topic_matches(p, topic) for p in COALESCED)
+
+def _flag(v: Optional[str]) -> bool:
+    return (v or "").lower() in ("1", "true", "yes", "on")
+
+class WsConnection:
+    """
+    Una conexión = dos tareas de vida larga:
+    - reader: recibe del cliente; los setpoints van al controlador al instante.
+    - writer: drena la suscripción (outbox coalesced por tópico) a WS_RATE_HZ;
+      las respuestas directas (motion/ack) salen sin esperar la cadencia.
+    Ambas esperan sobre un único asyncio.Event compartido con la suscripción.
+
+    Negociación por query string: `?enc=json|msgpack&batch=1&delta=1&map=1`.
+    - batch: todos los tópicos de un flush en un solo frame (arreglo de mensajes).
+    - delta: los tópicos de estado dict viajan como {"topic","delta","del","v"}
+      cuando el cliente ya tiene la versión anterior; si no, {"topic","data","v"}.
+    - map: añade `lidar/map` (rejilla uint8 cruda, ver sensors/lidar_map.py).
+    """
+    def __init__(self, ws: WebSocket, bus: Bus, rate_hz: float = WS_RATE_HZ,
+                 codec: Optional[Codec] = None, batch: bool = False, delta: bool = False,
+                 lidar_grid: bool = False):
+        self.ws = ws
+        self.bus = bus
+        self.codec = codec or Codec("json")
+        self.batch = batch
+        self._last_ver: Optional[Dict[str, int]] = {} if delta else None
+        self.interval = 1.0 / max(rate_hz, 0.1)
+        self._wake = asyncio.Event()
+        self.lidar_grid = lidar_grid
+        topics = TOPICS + ["lidar/map"] if lidar_grid else TOPICS
+        self.sub = bus.subscribe(topics, policies={**COALESCED, "lidar/map": LATEST}, event=self._wake)
+        self._direct: Deque[Tuple[str, Any]] = deque()
+        self._next_flush = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+        self.t_open = time.time()
+        # contadores
+        self.received = 0
+        self.setpoints = 0
+        self.published = 0
+        self.sent = 0
+        self.frames = 0
+        self.bytes_sent = 0
+        self.send_errors = 0
+        self.send_ms_last = 0.0
+        self.send_ms_max = 0.0
+        self._send_ms_total = 0.0
+
+    # ------- ciclo de vida -------
+    async def run(self):
+        CONNECTIONS.add(self)
+        OPENED.inc()
+        if self.lidar_grid:
+            lidar_map.raw_clients += 1
+        reader = asyncio.create_task(self._reader())
+        writer = asyncio.create_task(self._writer())
+        try:
+            await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._closed = True
+            self.sub.close()
+            if self._timer is not None:
+                self._timer.cancel()
+            for t in (reader, writer):
+                t.cancel()
+            await asyncio.gather(reader, writer, return_exceptions=True)
+            CONNECTIONS.discard(self)
+            if self.lidar_grid:
+                lidar_map.raw_clients -= 1
+
+    # ------- entrada -------
+    async def _reader(self):
+        last_pub = 0.0
+        min_dt = 1.0 / IN_HZ
+        try:
+            while True:
+                frame = await self.ws.receive()
+                if frame["type"] == "websocket.disconnect":
+                    return
+                msg = self.codec.loads(frame.get("text"), frame.get("bytes"))
+                self.received += 1
+                if not isinstance(msg, dict):
+                    continue
+                mtype = msg.get("type") or msg.get("topic")
+                if mtype == "motion_setpoint":
+                    self._on_setpoint(msg)
+                    continue
+                topic, data = msg.get("topic"), msg.get("data")
+                now = time.monotonic()
+                if topic and data is not None and (now - last_pub) >= min_dt:
+                    last_pub = now
+                    self.bus.publish_nowait(topic, data)
+                    self.published += 1
+        except (WebSocketDisconnect, RuntimeError, ValueError, TypeError):
+            # desconexión o algo no-JSON: se cierra la conexión
+            return
+
+    def _on_setpoint(self, msg: dict):
+        # Contrato: { type: "motion_setpoint", x, y, z, speed? }
+        try:
+            x = int(msg.get("x", 0))
+            y = int(msg.get("y", 0))
+            z = int(msg.get("z", 0))
+            speed = msg.get("speed", None)
+            speed = int(speed) if speed is not None else None
+        except (TypeError, ValueError):
+            return  # Ignora valores inválidos
+        # Actualiza setpoint (latest-wins) en este mismo tick; el controlador hace el move()
+        ctl().set_vel(x, y, z, speed)
+        self.setpoints += 1
+        ack = {"x": x, "y": y, "z": z, "speed": speed}
+        if "seq" in msg:
+            ack["seq"] = msg["seq"]
+        self._direct.append(("motion/ack", ack))
+        self._wake.set()
+
+    # ------- salida -------
+    def _on_timer(self):
+        self._timer = None
+        self._wake.set()
+
+    async def _writer(self):
+        loop = asyncio.get_running_loop()
+        while not self.sub.closed:
+            self._wake.clear()
+            if self._direct:
+                parts = []
+                while self._direct:
+                    topic, data = self._direct.popleft()
+                    parts.append(self.codec.dumps({"topic": topic, "data": data}))
+                await self._send(parts)
+
+            if self.sub.qsize():
+                now = time.monotonic()
+                if now >= self._next_flush:
+                    self._next_flush = now + self.interval
+                    parts, captured = [], []
+                    while True:
+                        item = self.sub.get_nowait()
+                        if item is None:
+                            break
+                        parts.append(self._encode(*item))
+                        if item[0].startswith("vision/") and isinstance(item[1], dict) and "ts" in item[1]:
+                            captured.append(item[1]["ts"])
+                    await self._send(parts)
+                    now = time.monotonic()
+                    for ts in captured:
+                        LATENCY_MS.observe((now - ts) * 1000.0)
+                elif self._timer is None:
+                    self._timer = loop.call_later(self._next_flush - now, self._on_timer)
+
+            if self._direct or (self.sub.qsize() and time.monotonic() >= self._next_flush):
+                continue
+            await self._wake.wait()
+
+    def _encode(self, topic: str, data: Any):
+        # deltas solo para tópicos de estado; los eventos van siempre completos
+        last_ver = self._last_ver if self._last_ver is not None and _is_state(topic) else None
+        return BROADCAST.message(topic, data, self.codec, last_ver)
+
+    async def _send(self, parts: list):
+        if not parts:
+            return
+        frames = [self.codec.batch(parts)] if self.batch else parts
+        t0 = time.perf_counter()
+        try:
+            for f in frames:
+                if self.codec.binary:
+                    await self.ws.send_bytes(f)
+                else:
+                    await self.ws.send_text(f)
+                self.bytes_sent += len(f)
+                SEND_BYTES.inc(len(f))
+        except Exception:
+            self.send_errors += 1
+            raise
+        dt = (time.perf_counter() - t0) * 1000.0
+        SEND_MS.observe(dt)
+        self.sent += len(parts)
+        self.frames += len(frames)
+        self.send_ms_last = dt
+        self._send_ms_total += dt
+        if dt > self.send_ms_max:
+            self.send_ms_max = dt
+
+    def stats(self) -> Dict[str, Any]:
+        client = self.ws.client
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "uptime_s": round(time.time() - self.t_open, 1),
+            "received": self.received,
+            "setpoints": self.setpoints,
+            "published": self.published,
+            "coalesced": self.sub.dropped,
+            "queued": self.sub.qsize(),
+            "codec": self.codec.name,
+            "batch": self.batch,
+            "delta": self._last_ver is not None,
+            "sent": self.sent,
+            "frames": self.frames,
+            "bytes_sent": self.bytes_sent,
+            "send_errors": self.send_errors,
+            "send_ms_last": round(self.send_ms_last, 3),
+            "send_ms_mean": round(self._send_ms_total / self.frames, 3) if self.frames else 0.0,
+            "send_ms_max": round(self.send_ms_max, 3),
+        }
+
+def collect_metrics(m) -> None:
+    conns = list(CONNECTIONS)
+    m.gauge("ws_connections", len(conns), "Conexiones WebSocket abiertas")
+    m.counter("ws_connections_opened", OPENED.value, "Conexiones WebSocket aceptadas")
+    m.gauge("ws_queue_depth", sum(c.sub.qsize() + len(c._direct) for c in conns),
+            "Mensajes pendientes en las colas de salida (suma)")
+    m.gauge("ws_queue_depth_max", max((c.sub.qsize() + len(c._direct) for c in conns), default=0),
+            "Cola de salida más larga")
+    m.counter("ws_bytes_sent", SEND_BYTES.value, "Bytes enviados por WebSocket")
+    m.counter("ws_coalesced", sum(c.sub.dropped for c in conns),
+              "Mensajes coalescidos en conexiones abiertas")
+    m.histogram("ws_send", SEND_MS, "Envío de un flush por WebSocket")
+    m.histogram("capture_to_send", LATENCY_MS, "Latencia captura → envío", path="ws_vision")
+
+@ws_app.get("/stats")
+def ws_stats():
+    return {"ok": True, "broadcast": BROADCAST.stats(),
+            "connections": [c.stats() for c in list(CONNECTIONS)]}
+
 @ws_app.websocket("/")
 async def ws_endpoint(ws: WebSocket):
+    qp = ws.query_params
+    try:
+        codec = Codec((qp.get("enc") or "json").lower())
+    except ValueError:
+        await ws.close(code=1003)
+        return
     await ws.accept()
     if BUS is None:
         await ws.close()
         return
-
-    sub = BUS.subscribe(["telemetry", "alert", "mode", "ui_event"]) 
-
-    send_interval = 1.0 / max(WS_RATE_HZ, 0.1) 
-    last_send = 0.0
-    last_msgs = {}
-
-    IN_HZ = 30.0
-    min_recv_dt = 1.0 / IN_HZ
-    last_recv_ts = 0.0
-
-    try:
-        while True:
-            recv_task = asyncio.create_task(ws.receive_json())
-            bus_task  = asyncio.create_task(sub.get())
-
-            done, pending = await asyncio.wait(
-                {recv_task, bus_task},
-                return_when=asyncio.FIRST_COMPLETED,
-                timeout=send_interval
-            )
-
-            now = time.time()
-
-            # ───── Mensaje desde el cliente ─────
-            if recv_task in done:
-                try:
-                    msg = recv_task.result()  # dict
-                except Exception:
-                    # cliente envió algo no-JSON o cerró abruptamente
-                    for p in pending: p.cancel()
-                    break
-
-                # Rate limit suave de entrada
-                if (now - last_recv_ts) >= min_recv_dt:
-                    last_recv_ts = now
-                    # Contrato: { type: "motion_setpoint", x, y, z, speed? }
-                    mtype = msg.get("type") or msg.get("topic")
-                    if mtype == "motion_setpoint":
-                        try:
-                            x = int(msg.get("x", 0))
-                            y = int(msg.get("y", 0))
-                            z = int(msg.get("z", 0))
-                            speed = msg.get("speed", None)
-                            speed = int(speed) if speed is not None else None
-                            # Actualiza setpoint (latest-wins). El bucle del controlador se encarga del move()
-                            ctl().set_vel(x, y, z, speed)
-                            # (opcional) mandar ACK local al cliente
-                            await ws.send_json({"topic": "motion/ack", "data": {"x": x, "y": y, "z": z, "speed": speed}})
-                        except Exception:
-                            # Ignora valores inválidos
-                            pass
-                    else:
-                        topic = msg.get("topic")
-                        data  = msg.get("data")
-                        if topic and (data is not None):
-                            await BUS.publish(topic, data)
-
-            # ───── Mensaje desde el BUS (para enviar a cliente) ─────
-            if bus_task in done:
-                try:
-                    topic, data = bus_task.result()
-                    last_msgs[topic] = data  # coalescing: se queda el último por tópico
-                except Exception:
-                    pass
-
-            # ───── Flush hacia el cliente, coalesced + throttled ─────
-            if (now - last_send) >= send_interval and last_msgs:
-                try:
-                    # envía cada tópico y vacía
-                    for topic, data in list(last_msgs.items()):
-                        await ws.send_json({"topic": topic, "data": data})
-                    last_msgs.clear()
-                    last_send = now
-                except Exception:
-                    # cliente desconectado
-                    for p in pending: p.cancel()
-                    break
-
-            # Limpieza de tareas pendientes
-            for p in pending: 
-                p.cancel()
-
-    except WebSocketDisconnect:
-        pass
-    finally:
-        sub.close()
+    BROADCAST.bus = BUS
+    await WsConnection(ws, BUS, codec=codec, batch=_flag(qp.get("batch")),
+                       delta=_flag(qp.get("delta")), lidar_grid=_flag(qp.get("map"))).run()
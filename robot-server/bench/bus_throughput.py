@@ -0,0 +1,88 @@
+# bench/bus_throughput.py
+"""
+Throughput del Bus: publica a ritmo fijo (1 kHz por defecto) con 1 y 50
+suscriptores consumiendo en paralelo y reporta coste de publish, entregas,
+descartes y CPU del proceso.
+
+    python -m bench.bus_throughput [--hz 1000] [--seconds 3] [--subs 1,50] [--json]
+"""
+import argparse, asyncio, json, statistics, time
+
+from app.core.bus import Bus, LATEST
+
+async def _consumer(sub, counter: list):
+    while True:
+        topic, _ = await sub.get()
+        if topic == "__CLOSE__":
+            return
+        counter[0] += 1
+
+async def run_case(n_subs: int, hz: float, seconds: float, policy: str) -> dict:
+    bus = Bus(maxsize=256)
+    policies = {"telemetry": LATEST} if policy == LATEST else None
+    subs = [bus.subscribe(["telemetry", "alert"], policies=policies) for _ in range(n_subs)]
+    counters = [[0] for _ in subs]
+    tasks = [asyncio.create_task(_consumer(s, c)) for s, c in zip(subs, counters)]
+
+    period = 1.0 / hz
+    payload = {"fps": 30.0, "resolution": [640, 480], "backend": "opencv", "depth_min_m": None}
+    pub_ns = []
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    deadline = t0
+    n_pub = 0
+    while True:
+        deadline += period
+        if deadline - t0 > seconds:
+            break
+        a = time.perf_counter_ns()
+        await bus.publish("telemetry", payload)
+        pub_ns.append(time.perf_counter_ns() - a)
+        n_pub += 1
+        delay = deadline - time.perf_counter()
+        # cede siempre el loop para que los consumidores drenen
+        await asyncio.sleep(delay if delay > 0 else 0)
+    await asyncio.sleep(0.05)
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    for s in subs:
+        s.close()
+    await asyncio.gather(*tasks)
+
+    pub_ns.sort()
+    delivered = sum(c[0] for c in counters)
+    return {
+        "subscribers": n_subs,
+        "policy": policy,
+        "target_hz": hz,
+        "published": n_pub,
+        "publish_rate_hz": round(n_pub / wall, 1),
+        "delivered": delivered,
+        "dropped": sum(s.dropped for s in subs),
+        "publish_us_p50": round(pub_ns[len(pub_ns) // 2] / 1e3, 2),
+        "publish_us_p99": round(pub_ns[int(len(pub_ns) * 0.99)] / 1e3, 2),
+        "publish_us_mean": round(statistics.fmean(pub_ns) / 1e3, 2),
+        "cpu_pct": round(100.0 * cpu / wall, 1),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--hz", type=float, default=1000.0)
+    ap.add_argument("--seconds", type=float, default=3.0)
+    ap.add_argument("--subs", default="1,50")
+    ap.add_argument("--policy", choices=["drop_oldest", LATEST], default="drop_oldest")
+    ap.add_argument("--json", action="store_true", help="salida JSON (una línea)")
+    args = ap.parse_args(argv)
+
+    results = [asyncio.run(run_case(int(n), args.hz, args.seconds, args.policy))
+               for n in args.subs.split(",")]
+    if args.json:
+        print(json.dumps(results))
+        return
+    for r in results:
+        print(f"subs={r['subscribers']:>3} policy={r['policy']:<11} "
+              f"rate={r['publish_rate_hz']:>7}Hz delivered={r['delivered']:>7} dropped={r['dropped']:>5} "
+              f"publish p50={r['publish_us_p50']}us p99={r['publish_us_p99']}us cpu={r['cpu_pct']}%")
+
+if __name__ == "__main__":
+    main()
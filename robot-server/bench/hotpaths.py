@@ -0,0 +1,363 @@
+# bench/hotpaths.py
+"""
+Benchmarks de rutas calientes con frames sintéticos deterministas (sin
+cámara ni robot): cada ruta aislada y pipelines compuestos, a varias
+resoluciones. Reporta ms/frame (p50/p90) y memoria por frame
+(tracemalloc: pico de trabajo y KiB que quedan retenidos), guarda baselines JSON y falla si algo
+empeora más que el umbral.
+
+    python -m bench.hotpaths                                 # todo, 320x240/640x480/1280x720
+    python -m bench.hotpaths --res 640x480 --only color,stream
+    python -m bench.hotpaths --save bench/baselines/jetson.json
+    python -m bench.hotpaths --compare bench/baselines/jetson.json --threshold 0.15
+
+Código de salida 1 si algún caso supera la baseline en más de --threshold
+(tiempo p50 o pico de memoria) y además en más que su ruido: NOISE_K veces el
+rango intercuartílico de la baseline (cada muestra repite el caso hasta durar al menos
+MIN_SAMPLE_MS, así los casos de microsegundos no miden el reloj). Un caso
+marcado por tiempo se vuelve a medir hasta --confirm veces y cuenta la mejor
+medida: una regresión real se repite, un mal momento del host no. Las baselines son por máquina: compáralas en
+el mismo equipo (o una Jetson contra sí misma antes y después del cambio).
+"""
+import argparse, fnmatch, gc, json, os, platform, sys, time, tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+DEFAULT_RES = "320x240,640x480,1280x720"
+SEED = 1234
+
+# ---------------- frames sintéticos ----------------
+def synthetic_frame(w: int, h: int, dark: bool = False, seed: int = SEED) -> np.ndarray:
+    """Degradado + ruido + bloques de color (rojo/verde/azul/amarillo) en el centro."""
+    rng = np.random.default_rng(seed)
+    gx = np.linspace(30, 220, w, dtype=np.float32)
+    gy = np.linspace(20, 160, h, dtype=np.float32)[:, None]
+    f = np.empty((h, w, 3), np.float32)
+    f[:, :, 0] = gx * 0.5 + gy * 0.5
+    f[:, :, 1] = gy
+    f[:, :, 2] = 255 - gx * 0.7
+    f += rng.normal(0, 8, f.shape).astype(np.float32)
+    s = max(8, min(w, h) // 10)
+    cx, cy = w // 2, h // 2
+    for (dx, dy), bgr in zip(((-1, -1), (0, -1), (-1, 0), (0, 0)),
+                             ((0, 0, 220), (0, 200, 0), (220, 60, 0), (0, 220, 220))):
+        f[cy + dy * s:cy + (dy + 1) * s, cx + dx * s:cx + (dx + 1) * s] = bgr
+    if dark:
+        f *= 0.08
+    return np.clip(f, 0, 255).astype(np.uint8)
+
+def synthetic_depth(w: int, h: int) -> np.ndarray:
+    d = np.full((h, w), 2500, np.uint16)
+    d[h // 3:, : w // 4] = 400
+    d[::17, ::13] = 0
+    return d
+
+# ---------------- casos ----------------
+# Un caso es (nombre, fábrica(w, h) -> callable sin argumentos). La fábrica
+# prepara estado (frames, objetos) fuera de la medición; ImportError = skip.
+Case = Tuple[str, Callable[[int, int], Callable[[], object]]]
+# casos que no dependen de la resolución del frame: se miden una vez ("@-")
+FIXED = {"bus/publish_1", "bus/publish_50", "lidar/map_update_render"}
+# versión del código medido por caso (1 si no figura): se sube cuando el caso
+# pasa a medir otra cosa y --compare ignora la baseline guardada con otra versión
+# (stream/* v2: mismo _render que el servidor, sin la ida y vuelta JPEG→imdecode;
+#  stream/low_chroma v3: croma en el codificador, sin pasar por YCrCb)
+VERSIONS = {"stream/": 2, "stream/low_chroma": 3}
+
+def _version(name: str) -> int:
+    return max((v for p, v in VERSIONS.items() if name.startswith(p)), default=1)
+
+def _camera(force: bool):
+    from app.sensors.camera import Camera
+    cam = Camera(use_shm=False)
+    cam.lowlight_force, cam.lowlight_auto = force, True
+    return cam
+
+def _lowlight_dark(w, h):
+    cam, frame = _camera(False), synthetic_frame(w, h, dark=True)
+    return lambda: cam._postprocess_lowlight(frame)
+
+def _lowlight_bright(w, h):
+    cam, frame = _camera(False), synthetic_frame(w, h)
+    return lambda: cam._postprocess_lowlight(frame)
+
+def _jpeg(w, h):
+    frame = synthetic_frame(w, h)
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
+    return lambda: cv2.imencode(".jpg", frame, params)[1].tobytes()
+
+def _color(w, h):
+    from app.IA.color_recognition import ColorRecognizer
+    rec, frame = ColorRecognizer(), synthetic_frame(w, h)
+    return lambda: rec.process_frame(frame)
+
+def _heatmap(w, h):
+    from app.IA.color_recognition import ColorRecognizer
+    rec, frame = ColorRecognizer(), synthetic_frame(w, h)
+    return lambda: rec.color_map(frame, max_side=320).summary(16, 12)
+
+def _face(w, h):
+    from app.IA.face_recognition import FaceDetector
+    det, frame = FaceDetector(), synthetic_frame(w, h)
+    return lambda: det.process_frame(frame, draw=True)
+
+def _mjpeg_part(w, h):
+    from app.streaming import _part
+    ok, buf = cv2.imencode(".jpg", synthetic_frame(w, h), [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+    payload = buf.tobytes()
+    return lambda: _part(payload)
+
+def _bus(n_subs: int):
+    def factory(w, h):
+        from app.core.bus import Bus, LATEST
+        bus = Bus(maxsize=256)
+        subs = [bus.subscribe(["telemetry", "vision/*"], policies={"telemetry": LATEST}) for _ in range(n_subs)]
+        payload = {"fps": 30.0, "resolution": [w, h], "backend": "synthetic", "depth_min_m": None}
+        def run():
+            bus.publish_nowait("telemetry", payload)
+            for s in subs:                # el consumidor drena (LATEST deja 1)
+                s.get_nowait()
+        return run
+    return factory
+
+def _reflex_depth(w, h):
+    from app.motion.reflex import ObstacleReflex
+    r, d = ObstacleReflex(), synthetic_depth(w, h)
+    return lambda: r.feed_depth(d)
+
+def _lidar_map(w, h):
+    from app.sensors.lidar import LidarScan, _Geometry
+    from app.sensors.lidar_map import OccupancyGrid
+    n = 3200                              # S2 a 10 Hz
+    s = LidarScan()
+    s.n = n
+    s._angle[:n] = np.linspace(0, 360, n, endpoint=False)
+    s._dist[:n] = np.random.default_rng(SEED).uniform(300, 8000, n)
+    _Geometry(0, 0, 0, 0.1, 8.0).apply(s)
+    g = OccupancyGrid(size=640)
+    def run():
+        g.update(s)
+        return g.jpeg()
+    return run
+
+def _stream(mode: Optional[str], crop=None, chroma: str = "full", static: bool = False):
+    """
+    Pipeline de /stream.mjpg por parte enviada (streaming._render, el mismo código):
+    baja luz → [recorte] → [comparación de escena estática] → análisis → croma →
+    un JPEG → parte; con recorte/croma, el JPEG completo de referencia cada BASELINE_EVERY.
+    """
+    def factory(w, h):
+        from app.streaming import BASELINE_EVERY, _crop_box, _part, _render, _static_small
+        cam = _camera(False)
+        src = synthetic_frame(w, h)
+        variant = crop is not None or chroma != "full"
+        ref = _static_small(src)
+        n = [0]
+        def run():
+            full = cam._postprocess_lowlight(src)
+            frame = full
+            if crop is not None:
+                x0, y0, x1, y1 = _crop_box(full.shape, crop)
+                frame = full[y0:y1, x0:x1]
+            if static:                    # el frame "cambia": se mide el camino que sí envía
+                cv2.absdiff(_static_small(frame), ref).mean()
+            payload = _render(frame, mode, True, chroma, 80)
+            if variant and n[0] % BASELINE_EVERY == 0:
+                _render(full, None, True, "full", 80)
+            n[0] += 1
+            return _part(payload)
+        return run
+    return factory
+
+CASES: List[Case] = [
+    ("lowlight/dark", _lowlight_dark),
+    ("lowlight/bright", _lowlight_bright),
+    ("jpeg/encode", _jpeg),
+    ("vision/color", _color),
+    ("vision/heatmap", _heatmap),
+    ("vision/face", _face),
+    ("mjpeg/part", _mjpeg_part),
+    ("bus/publish_1", _bus(1)),
+    ("bus/publish_50", _bus(50)),
+    ("reflex/depth", _reflex_depth),
+    ("lidar/map_update_render", _lidar_map),
+    ("stream/none", _stream(None)),
+    ("stream/color", _stream("color")),
+    ("stream/face", _stream("face")),
+    ("stream/static", _stream(None, static=True)),
+    ("stream/crop_gray", _stream(None, crop=(0.25, 0.25, 0.5, 0.5), chroma="gray")),
+    ("stream/low_chroma", _stream(None, chroma="low")),
+]
+
+# ---------------- medición ----------------
+MIN_SAMPLE_MS = 1.0       # cada muestra de tiempo agrupa repeticiones hasta durar esto
+NOISE_K = 2.0             # una regresión de tiempo debe superar NOISE_K × IQR (p75 - p25) de la baseline
+
+def _reps(fn: Callable[[], object]) -> int:
+    """Repeticiones por muestra para que una muestra dure >= MIN_SAMPLE_MS."""
+    reps = 1
+    while reps < 100000:
+        t0 = time.perf_counter_ns()
+        for _ in range(reps):
+            fn()
+        if (time.perf_counter_ns() - t0) / 1e6 >= MIN_SAMPLE_MS:
+            break
+        reps *= 2
+    return reps
+
+def _pct(v: List[float], q: float) -> float:
+    return v[min(len(v) - 1, int(q * len(v)))]
+
+def measure(fn: Callable[[], object], budget_s: float, min_iter: int, alloc_iter: int) -> Dict[str, float]:
+    for _ in range(3):                    # calentamiento (cachés, JIT de OpenCV, tablas perezosas)
+        fn()
+    times: List[float] = []
+    reps = _reps(fn)
+    gc_was = gc.isenabled()
+    gc.disable()                          # sin pausas del GC dentro de la medición
+    try:
+        t_end = time.perf_counter() + budget_s
+        while len(times) < min_iter or time.perf_counter() < t_end:
+            t0 = time.perf_counter_ns()
+            for _ in range(reps):
+                fn()
+            times.append((time.perf_counter_ns() - t0) / 1e6 / reps)
+            if len(times) >= 100000:
+                break
+    finally:
+        if gc_was:
+            gc.enable()
+    times.sort()
+    # asignaciones aparte: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    try:
+        fn()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        snap0 = tracemalloc.take_snapshot()
+        for _ in range(alloc_iter):
+            fn()
+        snap1 = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        # pico = memoria de trabajo de un frame; retenido = lo que queda vivo (fugas, cachés)
+        retained = sum(max(0, s.size_diff) for s in snap1.compare_to(snap0, "filename"))
+    finally:
+        tracemalloc.stop()
+    return {
+        "iters": len(times) * reps, "reps": reps,
+        "ms_p25": round(_pct(times, 0.25), 4),
+        "ms_p50": round(_pct(times, 0.50), 4),
+        "ms_p75": round(_pct(times, 0.75), 4),
+        "ms_p90": round(_pct(times, 0.90), 4),
+        "ms_mean": round(sum(times) / len(times), 4),
+        "alloc_peak_kib": round(max(0, peak - base) / 1024, 1),
+        "retained_kib": round(retained / 1024 / max(1, alloc_iter), 2),
+    }
+
+def run(args, keys: Optional[set] = None) -> dict:
+    """Mide los casos de --only a cada --res; `keys` restringe a claves concretas (re-medición)."""
+    resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in args.res.split(",") if r]
+    only = [p.strip() for p in args.only.split(",")] if args.only else None
+    results: Dict[str, dict] = {}
+    skipped: Dict[str, str] = {}
+    for name, factory in CASES:
+        if only and not any(p in name or fnmatch.fnmatch(name, p) for p in only):
+            continue
+        for w, h in (resolutions[:1] if name in FIXED else resolutions):
+            key = f"{name}@-" if name in FIXED else f"{name}@{w}x{h}"
+            if keys is not None and key not in keys:
+                continue
+            try:
+                fn = factory(w, h)
+            except ImportError as e:
+                skipped[key] = f"falta dependencia: {e}"
+                continue
+            r = measure(fn, args.budget, args.min_iter, args.alloc_iter)
+            r["version"] = _version(name)
+            results[key] = r
+            if not args.quiet:
+                print(f"{key:38s} p50={r['ms_p50']:9.3f} ms  p90={r['ms_p90']:9.3f} ms  "
+                      f"pico={r['alloc_peak_kib']:9.1f} KiB  n={r['iters']}", file=sys.stderr)
+    return {"meta": _meta(args), "results": results, "skipped": skipped}
+
+def _meta(args) -> dict:
+    return {
+        "host": platform.node(), "machine": platform.machine(), "python": platform.python_version(),
+        "numpy": np.__version__, "opencv": cv2.__version__, "cpus": os.cpu_count(),
+        "opencv_threads": cv2.getNumThreads(), "budget_s": args.budget, "ts": time.time(),
+    }
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[dict]:
+    """Casos que empeoran más que `threshold` (fracción) y más que su ruido, en p50 o en pico de memoria."""
+    out = []
+    for key, cur in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if base is None or base.get("version", 1) != cur.get("version", 1):
+            continue              # caso nuevo, o baseline de otra versión del caso: re-guardar con --save
+        for metric, floor in (("ms_p50", 0.01), ("alloc_peak_kib", 4.0)):
+            b, c = base.get(metric), cur.get(metric)
+            if b is None or c is None:
+                continue
+            if metric == "ms_p50":
+                # ruido: dispersión de la baseline (las guardadas sin p25/p75 solo usan el suelo)
+                floor = max(floor, NOISE_K * (base.get("ms_p75", 0) - base.get("ms_p25", 0)))
+            # suelo absoluto: no falla por ruido en casos de microsegundos / pocos KiB
+            if c > b * (1 + threshold) and c - b > floor:
+                out.append({"case": key, "metric": metric, "baseline": b, "current": c,
+                            "change": round(c / b - 1, 3) if b else None})
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--res", default=DEFAULT_RES)
+    ap.add_argument("--only", help="filtro por nombre (subcadena o glob, separados por coma)")
+    ap.add_argument("--budget", type=float, default=0.5, help="segundos de medición por caso")
+    ap.add_argument("--min-iter", type=int, default=10)
+    ap.add_argument("--alloc-iter", type=int, default=5)
+    ap.add_argument("--threads", type=int, help="cv2.setNumThreads (por defecto, el de la build)")
+    ap.add_argument("--save", help="guarda el resultado como baseline JSON")
+    ap.add_argument("--compare", help="baseline JSON contra la que comparar")
+    ap.add_argument("--threshold", type=float, default=float(os.getenv("BENCH_THRESHOLD", "0.20")))
+    ap.add_argument("--confirm", type=int, default=2,
+                    help="re-mediciones de un caso que parece regresión de tiempo antes de darla por buena")
+    ap.add_argument("--json", action="store_true", help="imprime el resultado JSON en stdout")
+    ap.add_argument("--quiet", action="store_true")
+    args = ap.parse_args(argv)
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    result = run(args)
+    for key, why in result["skipped"].items():
+        print(f"{key:38s} SKIP ({why})", file=sys.stderr)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for _ in range(max(0, args.confirm)):
+            keys = {g["case"] for g in regressions if g["metric"] == "ms_p50"}
+            if not keys:
+                break
+            print(f"confirmando {len(keys)} caso(s): {', '.join(sorted(keys))}", file=sys.stderr)
+            for k, again in run(args, keys)["results"].items():
+                if again["ms_p50"] < result["results"][k]["ms_p50"]:
+                    result["results"][k] = again      # cuenta la mejor medida
+            regressions = compare(result, baseline, args.threshold)
+        result["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESIÓN {r['case']} {r['metric']}: {r['baseline']} → {r['current']} "
+                  f"({r['change']:+.0%})" if r["change"] is not None else f"REGRESIÓN {r}", file=sys.stderr)
+        if not regressions:
+            print(f"sin regresiones (umbral {args.threshold:.0%})", file=sys.stderr)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# bench/loadtest.py
+"""
+Prueba de carga de WebSocket + MJPEG con latencias extremo a extremo.
+
+Modos de servidor:
+  --spawn    lanza `uvicorn app.main:app` como subproceso con cámara sintética
+             (o CAMERA_BACKEND=replay + CAMERA_REPLAY) y mide su CPU
+  --inproc   corre uvicorn en un hilo de este proceso (la CPU incluye clientes)
+  --url URL  servidor ya levantado (CPU solo si se pasa --pid)
+
+Clientes:
+  N WebSockets que envían `motion_setpoint` a --setpoint-hz y consumen `telemetry`
+  M visores MJPEG (/stream.mjpg)
+
+Salida: JSON con p50/p99 de setpoint→motion/ack, publicación→recepción de
+telemetría (usa `ts` del payload; mismo host), intervalo entre frames MJPEG y
+CPU del servidor. Con --ws-query el cliente negocia igual que la UI: decodifica
+`enc=msgpack` y, con `delta=1`, aplica cada delta sobre el último estado
+completo del tópico, así todos los mensajes de telemetría cuentan en la latencia.
+
+    python -m bench.loadtest --spawn --ws 20 --mjpeg 2 --seconds 15 --out run.json
+"""
+import argparse, asyncio, json, os, socket, subprocess, sys, threading, time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import httpx
+import websockets
+
+from app.web.wire import Codec, apply_delta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _pct(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"n": 0}
+    v = sorted(values)
+    q = lambda p: v[min(len(v) - 1, int(p * len(v)))]
+    return {"n": len(v), "p50": round(q(0.50), 3), "p90": round(q(0.90), 3),
+            "p99": round(q(0.99), 3), "max": round(v[-1], 3)}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _proc_cpu_s(pid: int) -> Optional[float]:
+    """utime+stime de /proc/<pid>/stat (Linux)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            parts = f.read().rsplit(")", 1)[1].split()
+        tck = os.sysconf("SC_CLK_TCK")
+        return (int(parts[11]) + int(parts[12])) / tck
+    except (OSError, IndexError, ValueError):
+        return None
+
+# ---------------- servidor ----------------
+def _server_env(args) -> dict:
+    env = dict(os.environ)
+    env.setdefault("CAMERA_BACKEND", "replay" if args.replay else "synthetic")
+    env.setdefault("MOTION_BACKEND", "sim")
+    if args.replay:
+        env["CAMERA_REPLAY"] = args.replay
+    return env
+
+def spawn_server(args, port: int) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=ROOT, env=_server_env(args))
+
+def inproc_server(args, port: int):
+    os.environ.update(_server_env(args))
+    import uvicorn
+    sys.path.insert(0, ROOT)
+    from app.main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    t = threading.Thread(target=server.run, name="loadtest-uvicorn", daemon=True)
+    t.start()
+    return server, t
+
+async def wait_ready(base: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as c:
+        while time.monotonic() < deadline:
+            try:
+                if (await c.get(base + "/health", timeout=1.0)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"el servidor no respondió en {timeout}s")
+
+# ---------------- clientes ----------------
+class Stats:
+    def __init__(self):
+        self.ack_ms: List[float] = []
+        self.tel_ms: List[float] = []
+        self.frame_ms: List[float] = []
+        self.frames = 0
+        self.mjpeg_bytes = 0
+        self.ws_msgs = 0
+        self.errors: Dict[str, int] = {}
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+async def ws_client(url: str, hz: float, stop: asyncio.Event, st: Stats, idx: int, codec: Codec):
+    sent: Dict[int, float] = {}
+    state: Dict[str, dict] = {}       # último estado por tópico, base de los deltas
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            async def sender():
+                period, seq, nxt = 1.0 / hz, 0, time.monotonic()
+                while not stop.is_set():
+                    seq += 1
+                    x = (seq + idx) % 21 - 10
+                    sent[seq] = time.perf_counter()
+                    await ws.send(json.dumps({"type": "motion_setpoint", "x": x, "y": 0, "z": 0, "seq": seq}))
+                    nxt += period
+                    await asyncio.sleep(max(0.0, nxt - time.monotonic()))
+
+            async def receiver():
+                while not stop.is_set():
+                    raw = await ws.recv()
+                    now_pc, now_wall = time.perf_counter(), time.time()
+                    msgs = codec.loads(raw if isinstance(raw, str) else None,
+                                       raw if isinstance(raw, bytes) else None)
+                    for m in (msgs if isinstance(msgs, list) else [msgs]):
+                        st.ws_msgs += 1
+                        topic, data = m.get("topic"), apply_delta(state, m)
+                        if not isinstance(data, dict):
+                            if "delta" in m:
+                                st.error("ws:delta_sin_base")
+                            continue
+                        if topic == "motion/ack":
+                            t0 = sent.pop(data.get("seq"), None)
+                            if t0 is not None:
+                                st.ack_ms.append((now_pc - t0) * 1000)
+                        elif topic == "telemetry" and "ts" in data:
+                            st.tel_ms.append((now_wall - data["ts"]) * 1000)
+
+            tasks = [asyncio.create_task(sender()), asyncio.create_task(receiver())]
+            await stop.wait()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except Exception as e:
+        st.error(f"ws:{type(e).__name__}")
+
+async def mjpeg_client(url: str, stop: asyncio.Event, st: Stats):
+    try:
+        async with httpx.AsyncClient(timeout=None) as c:
+            async with c.stream("GET", url) as r:
+                buf, last = b"", None
+                async for chunk in r.aiter_bytes():
+                    st.mjpeg_bytes += len(chunk)
+                    buf += chunk
+                    # cada parte termina en el JPEG EOI; basta con contar fronteras
+                    while True:
+                        i = buf.find(b"--frame", 1)
+                        if i < 0:
+                            break
+                        buf = buf[i:]
+                        now = time.perf_counter()
+                        if last is not None:
+                            st.frame_ms.append((now - last) * 1000)
+                        last = now
+                        st.frames += 1
+                    if stop.is_set():
+                        break
+    except Exception as e:
+        st.error(f"mjpeg:{type(e).__name__}")
+
+# ---------------- orquestación ----------------
+async def run(args) -> dict:
+    proc = server = None
+    pid = args.pid
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        if args.inproc:
+            server, _ = inproc_server(args, port)
+            pid = os.getpid()
+        else:
+            proc = spawn_server(args, port)
+            pid = proc.pid
+    try:
+        await wait_ready(base)
+        await asyncio.sleep(args.warmup)
+        ws_url = base.replace("http", "ws", 1) + "/ws/" + (f"?{args.ws_query}" if args.ws_query else "")
+        st, stop = Stats(), asyncio.Event()
+        cpu0, t0 = (_proc_cpu_s(pid) if pid else None), time.monotonic()
+        codec = Codec(args.enc)
+        tasks = [asyncio.create_task(ws_client(ws_url, args.setpoint_hz, stop, st, i, codec))
+                 for i in range(args.ws)]
+        tasks += [asyncio.create_task(mjpeg_client(f"{base}/stream.mjpg?quality={args.quality}", stop, st))
+                  for _ in range(args.mjpeg)]
+        await asyncio.sleep(args.seconds)
+        stop.set()
+        wall = time.monotonic() - t0
+        cpu1 = _proc_cpu_s(pid) if pid else None
+        await asyncio.wait(tasks, timeout=3.0)
+        for t in tasks:
+            t.cancel()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if server is not None:
+            server.should_exit = True
+
+    return {
+        "config": {"mode": "url" if args.url else ("inproc" if args.inproc else "spawn"),
+                   "ws_clients": args.ws, "mjpeg_viewers": args.mjpeg, "seconds": args.seconds,
+                   "setpoint_hz": args.setpoint_hz, "ws_query": args.ws_query,
+                   "camera": "replay" if args.replay else os.getenv("CAMERA_BACKEND", "synthetic")},
+        "ws": {
+            "setpoint_ack_ms": _pct(st.ack_ms),
+            "telemetry_latency_ms": _pct(st.tel_ms),
+            "messages_per_s": round(st.ws_msgs / wall, 1),
+        },
+        "mjpeg": {
+            "frame_interval_ms": _pct(st.frame_ms),
+            "fps_per_viewer": round(st.frames / wall / max(1, args.mjpeg), 2),
+            "mbit_s": round(st.mjpeg_bytes * 8 / wall / 1e6, 3),
+        },
+        "server_cpu_pct": round(100.0 * (cpu1 - cpu0) / wall, 1) if cpu0 is not None and cpu1 is not None else None,
+        "cpu_includes_clients": bool(args.inproc),
+        "errors": st.errors,
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--spawn", action="store_true", help="(por defecto) uvicorn en subproceso")
+    mode.add_argument("--inproc", action="store_true")
+    mode.add_argument("--url")
+    ap.add_argument("--pid", type=int, help="PID del servidor para medir CPU con --url")
+    ap.add_argument("--replay", help="vídeo o directorio de frames para CAMERA_BACKEND=replay")
+    ap.add_argument("--ws", type=int, default=10)
+    ap.add_argument("--mjpeg", type=int, default=1)
+    ap.add_argument("--setpoint-hz", type=float, default=30.0)
+    ap.add_argument("--ws-query", default="", help="p. ej. 'batch=1&delta=1&enc=msgpack'")
+    ap.add_argument("--quality", type=int, default=80)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--warmup", type=float, default=1.0)
+    ap.add_argument("--out", help="fichero JSON de salida (por defecto stdout)")
+    args = ap.parse_args(argv)
+    args.enc = (parse_qs(args.ws_query).get("enc") or ["json"])[-1].lower()
+    try:
+        Codec(args.enc)
+    except ValueError as e:
+        ap.error(f"--ws-query enc={args.enc}: {e}")
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench/motion_sim.py
+"""
+Ruta de control sobre el hexápodo simulado (SimDriver): tasa de comandos,
+latencia setpoint→actuación, jitter del bucle y reacción del dead-man.
+
+    python -m bench.motion_sim [--hz 15] [--setpoint-hz 30] [--seconds 5]
+                               [--latency-ms 2] [--baud 115200] [--json]
+"""
+import argparse, json, time
+
+from app.motion.controller_vel import MotionControllerVel
+from app.motion.drivers import SimDriver
+
+def run(args) -> dict:
+    drv = SimDriver(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, baud=args.baud, seed=1)
+    ctl = MotionControllerVel(hz=args.hz, deadman_s=args.deadman, driver=drv)
+    ctl.start()
+
+    period, nxt, n = 1.0 / args.setpoint_hz, time.monotonic(), 0
+    t_end = nxt + args.seconds
+    t_last = nxt
+    while time.monotonic() < t_end:
+        n += 1
+        ctl.set_vel(15, 0, (n % 11) - 5)
+        t_last = ctl.sp.t_mono            # instante del último setpoint (el que vigila el dead-man)
+        nxt += period
+        time.sleep(max(0.0, nxt - time.monotonic()))
+
+    # dead-man: sin setpoints, espera a que llegue stay_put
+    time.sleep(args.deadman + 3.0 / args.hz + 0.2)
+    ctl.stop_loop()
+
+    calls = list(drv.calls)
+    moves = [t for t, c, _, _ in calls if c == "move" and t <= t_last]
+    stops = [t for t, c, _, _ in calls if c == "stay_put" and t > t_last]
+    span = (moves[-1] - moves[0]) if len(moves) > 1 else 0.0
+    st = ctl.loop_stats()
+    return {
+        "config": vars(args),
+        "setpoints_sent": n,
+        "move_rate_hz": round((len(moves) - 1) / span, 2) if span > 0 else 0.0,
+        "actuation_ms": st["actuation_ms"],
+        "jitter_ms": st["jitter_ms"],
+        "write_ms": st["write_ms"],
+        "overruns": st["overruns"],
+        "missed": st["missed"],
+        "suppressed": st["suppressed"],
+        "deadman_reaction_ms": round((stops[0] - t_last) * 1000, 2) if stops else None,
+        "driver": drv.stats(),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--hz", type=float, default=15.0)
+    ap.add_argument("--setpoint-hz", type=float, default=30.0)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--deadman", type=float, default=0.8)
+    ap.add_argument("--latency-ms", type=float, default=2.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.5)
+    ap.add_argument("--baud", type=int, default=115200)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+    r = run(args)
+    if args.json:
+        print(json.dumps(r))
+        return
+    print(f"move rate {r['move_rate_hz']} Hz | actuación p50={r['actuation_ms']['p50']}ms "
+          f"p99={r['actuation_ms']['p99']}ms | jitter p99={r['jitter_ms']['p99']}ms | "
+          f"overruns={r['overruns']} | dead-man {r['deadman_reaction_ms']} ms "
+          f"(umbral {args.deadman * 1000:.0f} ms) | línea {r['driver']['line_utilization'] * 100:.1f}%")
+
+if __name__ == "__main__":
+    main()
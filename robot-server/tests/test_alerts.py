@@ -0,0 +1,142 @@
+# tests/test_alerts.py
+import asyncio, json
+
+import pytest
+
+from app.core.alerts import AlertEngine, Rule, load_rules
+from app.core.bus import Bus
+
+def engine(*rules):
+    bus = Bus()
+    sub = bus.subscribe(["alert"])
+    return AlertEngine(bus, list(rules)), sub
+
+def alerts(sub):
+    out = []
+    while (m := sub.get_nowait()) is not None:
+        out.append(m[1])
+    return out
+
+def test_threshold_raises_once_and_clears_with_hysteresis():
+    rule = Rule(code="NEAR", topic="t", field="d", op="<", threshold=0.35, clear=0.45)
+    e, sub = engine(rule)
+    e.evaluate(rule, {"d": 0.30}, now=0.0)
+    e.evaluate(rule, {"d": 0.20}, now=0.1)          # sigue activa: sin duplicado
+    e.evaluate(rule, {"d": 0.40}, now=0.2)          # entre threshold y clear: no despeja
+    assert [a["state"] for a in alerts(sub)] == ["raise"]
+    assert e.active() == ["NEAR"]
+    e.evaluate(rule, {"d": 0.50}, now=0.3)
+    out = alerts(sub)
+    assert [(a["state"], a["value"], a["stale"]) for a in out] == [("clear", 0.5, False)]
+    assert e.active() == []
+
+def test_for_s_requires_condition_to_hold():
+    rule = Rule(code="LOW_FPS", topic="t", field="fps", op="<", threshold=5, clear=8, for_s=3)
+    e, sub = engine(rule)
+    e.evaluate(rule, {"fps": 2}, now=0.0)
+    e.evaluate(rule, {"fps": 3}, now=2.0)
+    e.evaluate(rule, {"fps": 9}, now=2.5)           # se recupera antes de 3 s: se cancela
+    e.evaluate(rule, {"fps": 2}, now=3.0)
+    e.evaluate(rule, {"fps": 1}, now=5.9)
+    assert alerts(sub) == []
+    e.evaluate(rule, {"fps": 2}, now=6.0)
+    assert [(a["state"], a["value"]) for a in alerts(sub)] == [("raise", 2.0)]
+
+def test_stable_value_is_skipped():
+    rule = Rule(code="R", topic="t", field="v", op=">", threshold=10)
+    e, _ = engine(rule)
+    for _ in range(5):
+        e.evaluate(rule, {"v": 1}, now=0.0)
+    st = e.state["R"]
+    assert (st.evaluations, st.skipped) == (1, 4)
+
+def test_missing_value_clears_active_alert_as_stale():
+    rule = Rule(code="NEAR", topic="t", field="d", op="<", threshold=0.35, clear=0.45)
+    e, sub = engine(rule)
+    e.evaluate(rule, {"d": 0.2}, now=0.0)
+    e.evaluate(rule, {"d": None}, now=0.1)
+    out = alerts(sub)
+    assert [(a["state"], a["stale"], a["value"]) for a in out] == [("raise", False, 0.2), ("clear", True, None)]
+    e.evaluate(rule, {"other": 1}, now=0.2)         # sigue sin dato: nada nuevo
+    assert alerts(sub) == []
+
+def test_missing_value_cancels_pending_duration():
+    rule = Rule(code="LOW_FPS", topic="t", field="fps", op="<", threshold=5, for_s=1)
+    e, sub = engine(rule)
+    e.evaluate(rule, {"fps": 1}, now=0.0)
+    e.evaluate(rule, {"fps": "n/a"}, now=0.5)
+    e.evaluate(rule, {"fps": 1}, now=1.2)           # la duración vuelve a empezar aquí
+    assert alerts(sub) == [] and e.state["LOW_FPS"].pending_since == 1.2
+
+def test_rate_rule_compares_units_per_second():
+    rule = Rule(code="DROP", topic="t", field="v", op="<", threshold=-10, clear=-1, kind="rate")
+    e, sub = engine(rule)
+    e.evaluate(rule, {"v": 100}, now=0.0)           # primera muestra: sin tasa
+    e.evaluate(rule, {"v": 95}, now=1.0)            # -5/s
+    assert alerts(sub) == []
+    e.evaluate(rule, {"v": 75}, now=2.0)            # -20/s
+    out = alerts(sub)
+    assert out[0]["state"] == "raise" and out[0]["value"] == -20.0
+    assert e.state["DROP"].last_metric == -20.0 and e.state["DROP"].last_value == 75.0
+
+def test_rate_reference_resets_after_stale():
+    rule = Rule(code="DROP", topic="t", field="v", op="<", threshold=-10, kind="rate")
+    e, sub = engine(rule)
+    e.evaluate(rule, {"v": 100}, now=0.0)
+    e.evaluate(rule, {"v": None}, now=1.0)
+    e.evaluate(rule, {"v": 0}, now=2.0)             # sin referencia: no compara contra v=100
+    assert alerts(sub) == [] and e.state["DROP"].last_metric is None
+
+def test_timer_raise_reports_rate_not_raw_value():
+    rule = Rule(code="DROP", topic="t", field="v", op="<", threshold=-10, kind="rate", for_s=1)
+    e, sub = engine(rule)
+    e.evaluate(rule, {"v": 100}, now=0.0)
+    e.evaluate(rule, {"v": 80}, now=1.0)            # -20/s: pendiente
+    e._on_timer(rule)                               # el tópico calla: confirma el timer
+    out = alerts(sub)
+    assert out[0]["state"] == "raise" and out[0]["value"] == -20.0
+
+# ------- validación de reglas -------
+@pytest.mark.parametrize("bad, match", [
+    ({"op": "!="}, "op inválido"),
+    ({"kind": "delta"}, "kind inválido"),
+    ({"threshold": "cinco"}, "numéricos"),
+    ({"op": "<", "threshold": 5, "clear": 3}, "clear"),
+    ({"op": ">", "threshold": 5, "clear": 8}, "clear"),
+    ({"message": "{valor}"}, "message"),
+    ({"umbral": 3}, "regla #0"),
+])
+def test_load_rules_rejects_bad_config(tmp_path, bad, match):
+    p = tmp_path / "alerts.json"
+    p.write_text(json.dumps([{"code": "X", "topic": "t", "field": "v", **bad}]))
+    with pytest.raises(ValueError, match=match):
+        load_rules(str(p))
+
+def test_duplicate_codes_rejected(tmp_path):
+    p = tmp_path / "alerts.json"
+    p.write_text(json.dumps([{"code": "X", "topic": "t", "field": "a"}, {"code": "X", "topic": "u", "field": "b"}]))
+    with pytest.raises(ValueError, match="duplicado"):
+        load_rules(str(p))
+    with pytest.raises(ValueError, match="duplicado"):
+        AlertEngine(Bus(), [Rule(code="X", topic="t", field="a"), Rule(code="X", topic="t", field="b")])
+
+def test_shipped_rules_are_valid():
+    assert {r.code for r in load_rules()} >= {"LOW_FPS", "OBSTACLE_NEAR"}
+
+def test_failing_rule_does_not_stop_engine():
+    bad = Rule(code="BAD", topic="t", field="v", op=">", threshold=1)
+    good = Rule(code="GOOD", topic="t", field="v", op=">", threshold=1)
+    bus = Bus()
+    sub = bus.subscribe(["alert"])
+    e = AlertEngine(bus, [bad, good])
+    bad.op = "!="                                    # se rompe después de validar
+
+    async def main():
+        task = asyncio.create_task(e.run())
+        await asyncio.sleep(0)
+        bus.publish_nowait("t", {"v": 5})
+        await asyncio.sleep(0.01)
+        task.cancel()
+    asyncio.run(main())
+    assert e.state["BAD"].errors == 1
+    assert [a["code"] for a in alerts(sub)] == ["GOOD"]
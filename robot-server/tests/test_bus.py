@@ -0,0 +1,69 @@
+# tests/test_bus.py
+from app.core.bus import Bus, DROP_OLDEST, LATEST, topic_matches
+
+def drain(sub):
+    out = []
+    while (m := sub.get_nowait()) is not None:
+        out.append(m)
+    return out
+
+def test_topic_patterns():
+    assert topic_matches("*", "telemetry")
+    assert topic_matches("motion/*", "motion/ack")
+    assert not topic_matches("motion/*", "vision/face")
+    assert topic_matches("sensor.?", "sensor.1")
+    assert not topic_matches("telemetry", "telemetry2")
+
+def test_fanout_to_matching_subscribers_only():
+    bus = Bus()
+    a, b = bus.subscribe(["vision/*"]), bus.subscribe(["telemetry"])
+    assert bus.publish_nowait("vision/face", {"n": 1}) == 1
+    assert drain(a) == [("vision/face", {"n": 1})]
+    assert drain(b) == []
+
+def test_drop_oldest_keeps_newest_and_counts():
+    bus = Bus()
+    sub = bus.subscribe(["t"], maxsize=3)
+    for i in range(5):
+        bus.publish_nowait("t", i)
+    assert [d for _, d in drain(sub)] == [2, 3, 4]
+    assert sub.dropped == 2
+    assert bus.overflow == {"t": 2}
+
+def test_latest_coalesces_pending_value():
+    bus = Bus()
+    sub = bus.subscribe(["state", "event"], policies={"state": LATEST, "event": DROP_OLDEST})
+    bus.publish_nowait("state", 1)
+    bus.publish_nowait("event", "a")
+    bus.publish_nowait("state", 2)
+    bus.publish_nowait("state", 3)
+    # una sola posición para "state", en el orden de su primera publicación, con el último valor
+    assert drain(sub) == [("state", 3), ("event", "a")]
+    assert bus.coalesced == {"state": 2}
+    bus.publish_nowait("state", 4)       # entregado: vuelve a ocupar sitio
+    assert drain(sub) == [("state", 4)]
+
+def test_latest_slot_evicted_on_overflow():
+    bus = Bus()
+    sub = bus.subscribe(["s", "e"], maxsize=2, policies={"s": LATEST})
+    bus.publish_nowait("s", 1)
+    bus.publish_nowait("e", 1)
+    bus.publish_nowait("e", 2)           # expulsa el pendiente de "s"
+    bus.publish_nowait("s", 2)           # expulsa e=1; "s" vuelve a entrar
+    assert drain(sub) == [("e", 2), ("s", 2)]
+
+def test_versions_and_last():
+    bus = Bus()
+    assert bus.version("t") == 0 and bus.last("t") is None
+    d = {"x": 1}
+    bus.publish_nowait("t", {"x": 0})
+    bus.publish_nowait("t", d)
+    assert bus.version("t") == 2
+    assert bus.last("t") is d            # por referencia: la caché de wire lo compara con `is`
+
+def test_closed_subscriber_stops_receiving():
+    bus = Bus()
+    sub = bus.subscribe(["t"])
+    sub.close()
+    assert bus.publish_nowait("t", 1) == 0
+    assert bus.subscriber_count() == 0
@@ -0,0 +1,55 @@
+# tests/test_color_map.py
+import cv2
+import numpy as np
+import pytest
+
+from app.IA.color_recognition import ColorRecognizer
+
+@pytest.fixture(scope="module")
+def scene():
+    # fondo gris con parches saturados de colores HSV conocidos
+    img = np.full((240, 320, 3), 128, np.uint8)
+    for (x, y, w, h), hue in (((20, 30, 80, 60), 0), ((150, 40, 60, 120), 60),
+                              ((60, 150, 120, 50), 120), ((240, 170, 50, 50), 30)):
+        patch = np.full((h, w, 3), (hue, 230, 220), np.uint8)
+        img[y:y + h, x:x + w] = cv2.cvtColor(patch, cv2.COLOR_HSV2BGR)
+    return img
+
+ROIS = [(0, 0, 320, 240), (20, 30, 80, 60), (10, 20, 100, 90), (150, 40, 30, 30), (140, 100, 130, 120)]
+
+@pytest.mark.parametrize("roi", ROIS)
+def test_count_matches_mask_sum(scene, roi):
+    rec = ColorRecognizer()
+    cm = rec.color_map(scene)
+    hsv = cv2.cvtColor(scene, cv2.COLOR_BGR2HSV)
+    x, y, w, h = roi
+    total = 0
+    for color in cm.colors:
+        expected = int((rec._mask_for_color(hsv, color)[y:y + h, x:x + w] > 0).sum())
+        assert cm.count(color, roi) == expected, color
+        total += expected
+    assert total > 0 or roi == (150, 40, 30, 30)
+
+def test_scores_and_fraction(scene):
+    cm = ColorRecognizer().color_map(scene)
+    roi = (20, 30, 80, 60)
+    scores = cm.scores(roi)
+    best = max(scores, key=scores.get)
+    assert cm.fraction(best, roi) == pytest.approx(scores[best] / (80 * 60))
+    q = cm.query([roi, (0, 0, 320, 240)])
+    assert q[best][0] == pytest.approx(cm.fraction(best, roi))
+
+def test_downscaled_map_approximates_full(scene):
+    rec = ColorRecognizer()
+    full, small = rec.color_map(scene), rec.color_map(scene, max_side=160)
+    assert small.scale == 0.5
+    for color in full.colors:
+        a, b = full.count(color, (0, 0, 320, 240)), small.count(color, (0, 0, 320, 240))
+        assert abs(a - b) <= max(200, 0.1 * a), color
+
+def test_heatmap_peak_in_patch(scene):
+    s = ColorRecognizer().color_map(scene).summary(cols=16, rows=12)
+    assert s["grid"] == [16, 12] and s["size"] == [320, 240]
+    for color, p in s["peak"].items():
+        if p["pct"] > 0:
+            assert 0 <= p["col"] < 16 and 0 <= p["row"] < 12
@@ -0,0 +1,56 @@
+# tests/test_history.py
+import math
+
+import pytest
+
+from app.core.history import MAX_BUCKETS, TelemetryHistory
+
+def filled(n, dt=1.0, t0=1000.0, capacity=None, **extra):
+    h = TelemetryHistory(fields=("fps", "depth_min_m"), capacity=capacity or n)
+    for i in range(n):
+        h.record({"fps": i, **extra}, ts=t0 + i * dt)
+    return h
+
+def test_buckets_min_mean_max():
+    h = filled(10)
+    q = h.query(step=5)
+    assert q["t"] == [1000.0, 1005.0]
+    assert q["count"] == [5, 5]
+    assert q["fields"]["fps"] == {"min": [0.0, 5.0], "mean": [2.0, 7.0], "max": [4.0, 9.0]}
+    # campo nunca informado: NaN → None (JSON válido)
+    assert q["fields"]["depth_min_m"]["mean"] == [None, None]
+
+def test_auto_step_never_exceeds_max_buckets():
+    h = filled(3 * MAX_BUCKETS, dt=0.37)
+    q = h.query()
+    assert len(q["t"]) <= MAX_BUCKETS
+    assert sum(q["count"]) == 3 * MAX_BUCKETS
+
+def test_explicit_step_at_limit_is_clipped():
+    # step = span/MAX_BUCKETS exacto: la última muestra caería en el bucket MAX_BUCKETS
+    h = filled(MAX_BUCKETS + 1)
+    q = h.query(step=1.0)
+    assert len(q["t"]) == MAX_BUCKETS
+    assert q["count"][-1] == 2
+
+def test_small_step_is_widened_to_cap():
+    h = filled(5 * MAX_BUCKETS)
+    q = h.query(step=0.001)
+    assert q["step"] >= (5 * MAX_BUCKETS - 1) / MAX_BUCKETS
+    assert len(q["t"]) <= MAX_BUCKETS
+
+def test_t_rounded_to_step_resolution():
+    h = filled(100, dt=0.0123, t0=1700000000.123456)
+    q = h.query(step=0.05)
+    digits = 1 - math.floor(math.log10(0.05))
+    assert all(round(t, digits) == t for t in q["t"])
+
+def test_since_and_ring_wraparound():
+    h = filled(50, capacity=20)            # solo quedan las 20 últimas, en orden
+    q = h.query(since=1040.0, step=100)
+    assert q["count"] == [10]
+    assert q["fields"]["fps"]["min"] == [40.0] and q["fields"]["fps"]["max"] == [49.0]
+
+def test_unknown_field_rejected():
+    with pytest.raises(KeyError):
+        filled(3).query(fields=["nope"])
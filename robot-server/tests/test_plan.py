@@ -0,0 +1,36 @@
+# tests/test_plan.py
+import pytest
+
+from app.motion.plan import MAX_SEGMENTS, MotionPlan, Segment
+
+def test_sample_with_ramps():
+    plan = MotionPlan([Segment(x=10, duration_ms=1000, ramp_ms=500),
+                       Segment(x=-10, z=20, duration_ms=1000, ramp_ms=1000, speed=3)])
+    assert plan.total_s == 2.0
+    assert plan.sample(0.0) == (0, 0, 0, None, 0)          # la primera rampa parte de 0
+    assert plan.sample(0.25) == (5, 0, 0, None, 0)
+    assert plan.sample(0.5) == (10, 0, 0, None, 0)         # fin de rampa: objetivo
+    assert plan.sample(0.9) == (10, 0, 0, None, 0)
+    assert plan.sample(1.0) == (10, 0, 0, 3, 1)            # la segunda parte del objetivo anterior
+    assert plan.sample(1.5) == (0, 0, 10, 3, 1)
+    assert plan.sample(1.999)[:3] == (-10, 0, 20)
+    assert plan.sample(2.0) is None
+
+def test_without_ramp_is_a_step():
+    plan = MotionPlan([Segment(x=5, duration_ms=200), Segment(y=-5, duration_ms=200)])
+    assert plan.sample(0.0)[:3] == (5, 0, 0)
+    assert plan.sample(0.2)[:3] == (0, -5, 0)
+
+def test_values_are_clamped():
+    plan = MotionPlan([Segment(x=99, y=-99, duration_ms=100, ramp_ms=500, speed=9)])
+    s = plan.segments[0]
+    assert (s.x, s.y, s.ramp_ms, s.speed) == (30, -30, 100, 5)
+
+@pytest.mark.parametrize("segments", [
+    [],
+    [Segment(duration_ms=0)],
+    [Segment(duration_ms=1000)] * (MAX_SEGMENTS + 1),
+])
+def test_invalid_plans_rejected(segments):
+    with pytest.raises(ValueError):
+        MotionPlan(segments)
@@ -0,0 +1,56 @@
+# tests/test_sensor_history.py
+import pytest
+
+from app.core.sensor_history import SensorHistory, SensorRing
+
+def ring(ts, capacity=None):
+    r = SensorRing(capacity or len(ts))
+    for t in ts:
+        r.append(f"v{t}", t)
+    return r
+
+def test_at_is_last_sample_not_after_t():
+    r = ring([1.0, 2.0, 3.0])
+    assert r.at(0.5) is None
+    assert r.at(2.0).value == "v2.0"
+    assert r.at(2.9).value == "v2.0"
+    assert r.at(10).value == "v3.0"
+
+def test_nearest_with_tolerance():
+    r = ring([1.0, 2.0, 3.0])
+    assert r.nearest(2.4).value == "v2.0"
+    assert r.nearest(2.6).value == "v3.0"
+    assert r.nearest(1.5).value == "v1.0"         # empate → la anterior
+    assert r.nearest(5.0, tol=1.0) is None
+    assert SensorRing(3).nearest(1.0) is None
+
+def test_range_inclusive():
+    r = ring([1.0, 2.0, 3.0, 4.0])
+    assert [s.t for s in r.range(2.0, 3.0)] == [2.0, 3.0]
+    assert r.range(5.0, 6.0) == []
+
+def test_wraparound_keeps_order():
+    r = ring([float(i) for i in range(10)], capacity=4)
+    assert len(r) == 4
+    assert [s.t for s in r.range(0, 100)] == [6.0, 7.0, 8.0, 9.0]
+    assert r.at(5.0) is None and r.at(6.5).t == 6.0
+
+def test_out_of_order_sample_rejected():
+    r = ring([1.0, 2.0])
+    assert r.append("old", 1.5) is False
+    assert r.reordered == 1 and r.latest().t == 2.0
+
+def test_history_fuse_and_undeclared_streams():
+    h = SensorHistory(seconds=10, frames=2)
+    h.stream("setpoint")
+    h.array_stream("depth")
+    h.record("setpoint", (1, 0, 0), 1.0)
+    h.record("setpoint", (2, 0, 0), 2.0)
+    h.record("ghost", 1, 1.0)                     # no declarado: se ignora
+    assert h.names() == ["depth", "setpoint"]
+    fused = h.fuse(1.9, ["setpoint", "depth"])
+    assert fused["setpoint"].value == (1, 0, 0) and fused["depth"] is None
+    assert h.fuse(5.0, ["setpoint"], tol=1.0)["setpoint"] is None
+    assert h.fuse(2.1, ["setpoint"], mode="nearest")["setpoint"].t == 2.0
+    with pytest.raises(ValueError):
+        h.fuse(1.0, mode="bogus")
@@ -0,0 +1,55 @@
+# tests/test_wire.py
+import pytest
+
+from app.core.bus import Bus
+from app.web.wire import Broadcaster, Codec, apply_delta, available_codecs
+
+@pytest.mark.parametrize("enc", available_codecs())
+def test_delta_roundtrip_rebuilds_every_state(enc):
+    bus, codec = Bus(), Codec(enc)
+    b = Broadcaster(bus)
+    last_ver, state = {}, {}
+    states = [
+        {"fps": 30, "ts": 1.0, "mode": "auto", "obs": None},
+        {"fps": 29, "ts": 2.0, "mode": "auto", "obs": None},
+        {"fps": 29, "ts": 3.0, "mode": "manual"},            # "obs" eliminado
+        {"fps": 30, "ts": 4.0, "mode": "manual", "extra": [1, 2]},
+    ]
+    kinds = []
+    for d in states:
+        bus.publish_nowait("telemetry", d)
+        buf = b.message("telemetry", d, codec, last_ver)
+        msg = codec.loads(buf if isinstance(buf, str) else None, buf if isinstance(buf, bytes) else None)
+        kinds.append("delta" if "delta" in msg else "full")
+        assert apply_delta(state, msg) == d
+    assert kinds == ["full", "delta", "delta", "delta"]
+    assert b.deltas == 3
+
+def test_skipped_version_falls_back_to_full():
+    bus, codec = Bus(), Codec("json")
+    b, last_ver = Broadcaster(bus), {}
+    d1 = {"a": 1}
+    bus.publish_nowait("t", d1)
+    b.message("t", d1, codec, last_ver)
+    bus.publish_nowait("t", {"a": 2})        # la conexión no lo recibe
+    d3 = {"a": 3}
+    bus.publish_nowait("t", d3)
+    msg = codec.loads(b.message("t", d3, codec, last_ver), None)
+    assert "data" in msg and msg["v"] == 3
+
+def test_delta_without_base_is_ignored():
+    assert apply_delta({}, {"topic": "t", "delta": {"a": 1}, "del": [], "v": 2}) is None
+
+def test_encoded_once_per_version_and_codec():
+    bus, codec = Bus(), Codec("json")
+    b = Broadcaster(bus)
+    d = {"x": 1}
+    bus.publish_nowait("t", d)
+    first = b.message("t", d, codec)
+    assert all(b.message("t", d, codec) is first for _ in range(3))
+    assert (b.encodes, b.hits) == (1, 3)
+
+def test_batch_is_a_valid_array():
+    codec = Codec("json")
+    parts = [codec.dumps({"topic": "a"}), codec.dumps({"topic": "b"})]
+    assert [m["topic"] for m in codec.loads(codec.batch(parts), None)] == ["a", "b"]